@@ -0,0 +1,118 @@
+import collections
+import functools
+import threading
+import weakref
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from gt7dashboard.gt7channel import Channel
+
+# Upper bound of the memory of all values in the lap cache
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Estimated size of values which are not arrays
+OBJECT_SIZE = 64
+
+
+def get_size(value) -> int:
+    """
+    Returns an estimate of the memory used by a cached value in bytes.
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, Channel):
+        return value.array.nbytes + OBJECT_SIZE
+    if isinstance(value, dict):
+        return sum(get_size(item) for item in value.values()) + OBJECT_SIZE
+    if isinstance(value, tuple):
+        return sum(get_size(item) for item in value) + OBJECT_SIZE
+    if isinstance(value, list):
+        # Lists of numbers
+        return len(value) * 8 + OBJECT_SIZE
+    return OBJECT_SIZE
+
+
+def get_lap_version(lap) -> tuple:
+    """
+    Returns the content version of a lap, it changes when data points are added or channels are replaced.
+    data_time is appended last for every tick, so a tick logged on another thread changes it again when completed.
+    """
+    return (len(lap.data_speed), len(lap.data_time)) + tuple(id(value) for key, value in vars(lap).items() if key.startswith("data_"))
+
+
+class LapCache:
+    """
+    Values derived from laps, such as derived metrics, data dicts, distance axes, speed peaks and race lines,
+    shared by all figures and sessions. A value is kept until its lap changes or is collected.
+    The least recently used values are evicted when all values exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # (id of lap, kind) to (reference to lap, version of lap, value, size), least recently used first
+        self._entries = collections.OrderedDict()
+        # Reentrant, since a collected lap removes its values from whatever code is running
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, lap, kind: str, compute: Callable[[Optional[Any]], Any]) -> Any:
+        """
+        Returns the value of kind for lap. If it is not cached for the current version of the lap,
+        it is computed by compute, which gets the value of an older version or None to extend it.
+        """
+        key = (id(lap), kind)
+        version = get_lap_version(lap)
+        previous = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0]() is lap:
+                if entry[1] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                previous = entry[2]
+            self.misses += 1
+
+        value = compute(previous)
+        self._put(key, lap, version, value)
+        return value
+
+    def _put(self, key, lap, version, value):
+        size = get_size(value)
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                return
+            reference = weakref.ref(lap, functools.partial(self._remove_collected, key))
+            self._entries[key] = (reference, version, value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry[3]
+
+    def _remove_collected(self, key, reference: weakref.ref):
+        with self._lock:
+            entry = self._entries.get(key)
+            # The id of a collected lap might be used by a new lap already
+            if entry is not None and entry[0] is reference:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+# Shared by all figures and Bokeh sessions of the process
+lap_cache = LapCache()
@@ -0,0 +1,81 @@
+import os
+import struct
+from typing import Iterator, Tuple
+
+# A capture file starts with a header of magic and version followed by records.
+# Each record is the receive timestamp, the length of the datagram and the raw encrypted datagram.
+CAPTURE_MAGIC = b"GT7CAP"
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = struct.Struct("<6sH")
+RECORD_HEADER = struct.Struct("<dH")
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+
+
+class CaptureFormatError(Exception):
+    pass
+
+
+def _check_header(header: bytes, path: str):
+    if len(header) < CAPTURE_HEADER.size:
+        raise CaptureFormatError("%s is too short to be a capture file" % path)
+    magic, version = CAPTURE_HEADER.unpack(header)
+    if magic != CAPTURE_MAGIC:
+        raise CaptureFormatError("%s is not a capture file" % path)
+    if version != CAPTURE_VERSION:
+        raise CaptureFormatError("%s has unsupported capture version %d" % (path, version))
+
+
+class CaptureWriter:
+    """
+    Appends raw datagrams with their receive timestamp to a capture file.
+    Writes are buffered, so recording does not cost a system call per packet.
+    """
+
+    def __init__(self, path: str, buffer_size: int = DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.number_of_records = 0
+
+        is_new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new_file:
+            with open(path, "rb") as f:
+                _check_header(f.read(CAPTURE_HEADER.size), path)
+
+        self._file = open(path, "ab", buffering=buffer_size)
+        if is_new_file:
+            self._file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+
+    def write(self, data: bytes, timestamp: float):
+        self._file.write(RECORD_HEADER.pack(timestamp, len(data)))
+        self._file.write(data)
+        self.number_of_records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, bytes]]:
+    """
+    Yields the receive timestamp and the raw datagram of every record in a capture file.
+    A record cut off at the end of the file, e.g. after a crash, is ignored.
+    """
+    with open(path, "rb") as f:
+        _check_header(f.read(CAPTURE_HEADER.size), path)
+        while True:
+            record_header = f.read(RECORD_HEADER.size)
+            if len(record_header) < RECORD_HEADER.size:
+                return
+            timestamp, length = RECORD_HEADER.unpack(record_header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield timestamp, data
@@ -0,0 +1,180 @@
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Iterator, List
+
+import numpy as np
+
+from gt7dashboard import gt7helper, gt7lapfile
+from gt7dashboard.gt7helper import LapFile, LAP_FILE_EXTENSIONS
+from gt7dashboard.gt7lap import Lap
+
+CATALOG_FILENAME = "lap_catalog.sqlite3"
+# Increase when the table changes, the catalog is rebuilt then
+CATALOG_SCHEMA_VERSION = 1
+
+# Race lines are rounded to this many meters for the track fingerprint
+TRACK_FINGERPRINT_RESOLUTION = 100
+
+logger = logging.getLogger(__name__)
+
+
+def get_track_fingerprint(lap: Lap) -> str:
+    """
+    Returns a fingerprint of the track of a lap, the extent of its race line rounded to 100 m.
+    Complete laps on the same track layout have the same fingerprint.
+    """
+    if len(lap.data_position_x) == 0 or len(lap.data_position_z) == 0:
+        return ""
+    x = np.asarray(lap.data_position_x)
+    z = np.asarray(lap.data_position_z)
+    extent = [x.min(), x.max(), z.min(), z.max()]
+    return ":".join("%d" % round(value / TRACK_FINGERPRINT_RESOLUTION) for value in extent)
+
+
+class LapCatalog:
+    """
+    Index of the lap files below a folder with the metadata of their laps, stored in SQLite in that folder.
+    Listing and searching lap files only reads the index, update() reads lap files which are new or changed.
+    """
+
+    def __init__(self, root: str, path: str = None):
+        self.root = root
+        self.path = path or os.path.join(root, CATALOG_FILENAME)
+        # Concurrent updates would read the same changed lap files
+        self._update_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as connection:
+            if connection.execute("PRAGMA user_version").fetchone()[0] != CATALOG_SCHEMA_VERSION:
+                connection.execute("DROP TABLE IF EXISTS lap_files")
+                connection.execute(
+                    """
+                    CREATE TABLE lap_files (
+                        path TEXT PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        mtime REAL NOT NULL,
+                        car_id INTEGER,
+                        car_name TEXT,
+                        number_of_laps INTEGER NOT NULL,
+                        best_lap_time REAL,
+                        date TEXT,
+                        track_fingerprint TEXT,
+                        replay_laps INTEGER NOT NULL,
+                        manual_laps INTEGER NOT NULL
+                    )
+                    """
+                )
+                connection.execute("PRAGMA user_version = %d" % CATALOG_SCHEMA_VERSION)
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection for every operation, so the catalog can be used from every thread
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def update(self) -> int:
+        """
+        Indexes new and changed lap files and removes deleted ones. Returns the number of lap files read.
+        """
+        with self._update_lock:
+            return self._update()
+
+    def _update(self) -> int:
+        with self._connect() as connection:
+            indexed = {path: (size, mtime) for path, size, mtime in
+                       connection.execute("SELECT path, size, mtime FROM lap_files")}
+
+        found = set()
+        number_of_read_files = 0
+        for path, sub_dirs, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(LAP_FILE_EXTENSIONS):
+                    continue
+                file_path = os.path.join(path, name)
+                stat = os.stat(file_path)
+                found.add(file_path)
+                if indexed.get(file_path) != (stat.st_size, stat.st_mtime):
+                    self.add_lap_file(file_path)
+                    number_of_read_files += 1
+
+        deleted = [(path,) for path in indexed if path not in found]
+        if deleted:
+            with self._connect() as connection:
+                connection.executemany("DELETE FROM lap_files WHERE path = ?", deleted)
+
+        return number_of_read_files
+
+    def add_lap_file(self, path: str, laps: List[Lap] = None):
+        """
+        Indexes a lap file. Pass its laps if they are known, e.g. after saving them, so it is not read.
+        """
+        stat = os.stat(path)
+        if laps is None:
+            try:
+                laps = gt7lapfile.load_laps_from_file(path)
+            except Exception as e:
+                # Indexed without laps, so it is not read again until it changes
+                logger.warning("Could not read lap file %s: %s" % (path, e))
+                laps = []
+
+        finished_laps = [lap for lap in laps if lap.lap_finish_time > 0]
+        best_lap = gt7helper.get_best_lap(finished_laps) or (laps[0] if laps else None)
+        car_id = int(laps[0].car_id) if laps and hasattr(laps[0], "car_id") else None
+        start_timestamp = getattr(laps[0], "lap_start_timestamp", None) if laps else None
+        if isinstance(start_timestamp, datetime):
+            date = start_timestamp.isoformat()
+        else:
+            date = datetime.fromtimestamp(stat.st_mtime).isoformat()
+
+        row = (
+            path,
+            os.path.basename(path),
+            stat.st_size,
+            stat.st_mtime,
+            car_id,
+            gt7helper.get_car_name_for_car_id(car_id) if car_id is not None else None,
+            len(laps),
+            best_lap.lap_finish_time if best_lap and best_lap.lap_finish_time > 0 else None,
+            date,
+            get_track_fingerprint(best_lap) if best_lap else "",
+            sum(1 for lap in laps if getattr(lap, "is_replay", False)),
+            sum(1 for lap in laps if getattr(lap, "is_manual", False)),
+        )
+        with self._connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO lap_files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def get_lap_files(self, search: str = "", limit: int = None) -> List[LapFile]:
+        """
+        Returns the indexed lap files, newest first by the date of their laps.
+        search matches the file name, car name or track fingerprint.
+        """
+        query = "SELECT path, name, size, car_id, car_name, number_of_laps, best_lap_time, date, " \
+                "track_fingerprint, replay_laps, manual_laps FROM lap_files"
+        parameters = []
+        if search:
+            query += " WHERE name LIKE ? OR car_name LIKE ? OR track_fingerprint = ?"
+            parameters = ["%" + search + "%", "%" + search + "%", search]
+        query += " ORDER BY date DESC, mtime DESC, path DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        with self._connect() as connection:
+            rows = connection.execute(query, parameters).fetchall()
+
+        lap_files = []
+        for row in rows:
+            lap_file = LapFile()
+            (lap_file.path, lap_file.name, lap_file.size, lap_file.car_id, lap_file.car_name,
+             lap_file.number_of_laps, lap_file.best_lap_time, lap_file.date, lap_file.track_fingerprint,
+             lap_file.replay_laps, lap_file.manual_laps) = row
+            lap_files.append(lap_file)
+        return lap_files
@@ -0,0 +1,174 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Capacity of a channel after its first append, it doubles every time it is full
+MIN_CAPACITY = 64
+
+
+class Channel:
+    """
+    Growable typed buffer for one channel of a lap, e.g. the speed of every tick.
+
+    Values are stored contiguously in a NumPy array that grows by doubling, so appends are amortised O(1).
+    It behaves like a list for existing code and np.asarray(channel) returns a view without copying.
+    """
+
+    __slots__ = ("_data", "_length")
+
+    def __init__(self, dtype, values=()):
+        self._data = np.empty(0, dtype=dtype)
+        self._length = 0
+        if len(values) > 0:
+            self.extend(values)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> "Channel":
+        """
+        Returns a channel with the values of array without copying them, e.g. of a memory-mapped file.
+        The array is only copied when values are appended.
+        """
+        channel = cls.__new__(cls)
+        channel._data = array
+        channel._length = len(array)
+        return channel
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def array(self) -> np.ndarray:
+        """
+        View on the values of the channel. It stays valid but does not see values appended later.
+        """
+        return self._data[:self._length]
+
+    def _reserve(self, capacity: int):
+        if capacity <= len(self._data):
+            return
+        new_data = np.empty(max(capacity, 2 * len(self._data), MIN_CAPACITY), dtype=self._data.dtype)
+        new_data[:self._length] = self._data[:self._length]
+        # Views handed out before keep the old buffer alive, so it is never resized in place
+        self._data = new_data
+
+    def append(self, value):
+        if self._length == len(self._data):
+            self._reserve(self._length + 1)
+        self._data[self._length] = value
+        self._length += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        new_length = self._length + len(values)
+        self._reserve(new_length)
+        self._data[self._length:new_length] = values
+        self._length = new_length
+
+    def clear(self):
+        self._data = np.empty(0, dtype=self._data.dtype)
+        self._length = 0
+
+    def tolist(self) -> list:
+        return self.array.tolist()
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.array[index].tolist()
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("channel index out of range")
+        return self._data[index].item()
+
+    def __setitem__(self, index, value):
+        self.array[index] = value
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        if copy:
+            return np.array(self.array, dtype=dtype)
+        if dtype is None:
+            return self.array
+        return self.array.astype(dtype, copy=False)
+
+    def __eq__(self, other):
+        if not isinstance(other, (Channel, list, tuple, np.ndarray)):
+            return NotImplemented
+        if len(other) != self._length:
+            return False
+        # Compare with the precision of the channel, values compared to were likely rounded when stored
+        try:
+            other = np.asarray(other, dtype=self._data.dtype)
+        except (TypeError, ValueError):
+            return False
+        return bool(np.array_equal(self.array, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Channel(%s, %s)" % (self._data.dtype, self.tolist())
+
+    def __reduce__(self):
+        # Only pickle the values, not the unused capacity
+        return Channel, (self._data.dtype, self.array.copy())
+
+
+class RecordedChannel(namedtuple("RecordedChannel", ["name", "source", "dtype", "transform"], defaults=[None])):
+    """
+    A channel GT7Communication records for every tick of a lap.
+    source is the attribute of GTData to record, transform is an optional function applied to its value.
+    gt7packets.lap_from_packets applies transform to the values of many packets at once, so it should work on arrays.
+    The values are stored in the lap attribute data_<name>.
+    """
+
+    __slots__ = ()
+
+    @property
+    def attribute(self) -> str:
+        return "data_" + self.name
+
+
+# Channels recorded for every lap, the dashboard depends on them.
+# Ticks and time are recorded by _log_data, coasting, tires and yaw rate are derived when read, see Lap.get_derived_metrics.
+DEFAULT_CHANNELS = [
+    RecordedChannel("throttle", "throttle", np.float32),
+    RecordedChannel("braking", "brake", np.float32),
+    RecordedChannel("speed", "car_speed", np.float32),
+    RecordedChannel("rpm", "rpm", np.float32),
+    RecordedChannel("gear", "current_gear", np.uint8),
+    RecordedChannel("position_x", "position_x", np.float32),
+    RecordedChannel("position_y", "position_y", np.float32),
+    RecordedChannel("position_z", "position_z", np.float32),
+    RecordedChannel("boost", "boost", np.float32),
+    RecordedChannel("rotation_yaw", "rotation_yaw", np.float32),
+    RecordedChannel("tyre_temp_fl", "tyre_temp_FL", np.float32),
+    RecordedChannel("tyre_temp_fr", "tyre_temp_FR", np.float32),
+    RecordedChannel("tyre_temp_rl", "tyre_temp_rl", np.float32),
+    RecordedChannel("tyre_temp_rr", "tyre_temp_rr", np.float32),
+    RecordedChannel("tyre_speed_fl", "type_speed_FL", np.float32),
+    RecordedChannel("tyre_speed_fr", "type_speed_FR", np.float32),
+    RecordedChannel("tyre_speed_rl", "type_speed_RL", np.float32),
+    RecordedChannel("tyre_speed_rr", "tyre_speed_RR", np.float32),
+]
+
+# Additional channels for engineering sessions, they are decoded anyway but cost time and memory to record
+ENGINEERING_CHANNELS = [
+    RecordedChannel("suspension_fl", "suspension_fl", np.float32),
+    RecordedChannel("suspension_fr", "suspension_fr", np.float32),
+    RecordedChannel("suspension_rl", "suspension_rl", np.float32),
+    RecordedChannel("suspension_rr", "suspension_rr", np.float32),
+    RecordedChannel("ride_height", "ride_height", np.float32),
+    RecordedChannel("oil_pressure", "oil_pressure", np.float32),
+    RecordedChannel("oil_temp", "oil_temp", np.float32),
+    RecordedChannel("water_temp", "water_temp", np.float32),
+    RecordedChannel("fuel", "current_fuel", np.float32),
+    RecordedChannel("clutch", "clutch", np.float32),
+    RecordedChannel("clutch_engaged", "clutch_engaged", np.float32),
+    RecordedChannel("rpm_after_clutch", "rpm_after_clutch", np.float32),
+]
@@ -1,20 +1,149 @@
+import asyncio
+import concurrent.futures
 import datetime
 import json
 import logging
 import math
+import os
+import operator
 import socket
 import struct
 import time
 import copy
 import traceback
+from collections import namedtuple
 from datetime import timedelta
-from threading import Thread
-from typing import List
+from threading import Thread, Lock, Condition
+from typing import List, Optional
 
 from Crypto.Cipher import Salsa20
 
-from gt7dashboard.gt7helper import seconds_to_lap_time
+from gt7dashboard.gt7capture import CaptureWriter, read_capture
+from gt7dashboard.gt7channel import RecordedChannel, DEFAULT_CHANNELS
+from gt7dashboard.gt7helper import seconds_to_lap_time, get_tick_delta
+from gt7dashboard.gt7journal import SessionJournal, compact_journal, get_journal_path
 from gt7dashboard.gt7lap import Lap
+from gt7dashboard.gt7ringbuffer import PacketRingBuffer
+from gt7dashboard.gt7statistics import ConnectionStatistics
+from gt7dashboard.gt7window import LiveIndicators
+
+
+# Layout of the decrypted 0x128 byte packet. Offsets are taken from
+# https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs
+# Every field is decoded with one precompiled struct, unknown ranges are skipped as padding.
+PACKET_SIZE = 0x128
+PACKET_FIELDS = [
+    # (name, offset, struct format)
+    ("position_x", 0x04, "f"),
+    ("position_y", 0x08, "f"),
+    ("position_z", 0x0C, "f"),
+    ("velocity_x", 0x10, "f"),
+    ("velocity_y", 0x14, "f"),
+    ("velocity_z", 0x18, "f"),
+    ("rotation_pitch", 0x1C, "f"),
+    ("rotation_yaw", 0x20, "f"),
+    ("rotation_roll", 0x24, "f"),
+    ("angular_velocity_x", 0x2C, "f"),
+    ("angular_velocity_y", 0x30, "f"),
+    ("angular_velocity_z", 0x34, "f"),
+    ("ride_height", 0x38, "f"),
+    ("rpm", 0x3C, "f"),
+    ("current_fuel", 0x44, "f"),
+    ("fuel_capacity", 0x48, "f"),
+    ("car_speed", 0x4C, "f"),
+    ("boost", 0x50, "f"),
+    ("oil_pressure", 0x54, "f"),
+    ("water_temp", 0x58, "f"),
+    ("oil_temp", 0x5C, "f"),
+    ("tyre_temp_FL", 0x60, "f"),
+    ("tyre_temp_FR", 0x64, "f"),
+    ("tyre_temp_rl", 0x68, "f"),
+    ("tyre_temp_rr", 0x6C, "f"),
+    ("package_id", 0x70, "i"),
+    ("current_lap", 0x74, "h"),
+    ("total_laps", 0x76, "h"),
+    ("best_lap", 0x78, "i"),
+    ("last_lap", 0x7C, "i"),
+    ("time_on_track", 0x80, "i"),
+    ("current_position", 0x84, "h"),
+    ("total_positions", 0x86, "h"),
+    ("rpm_rev_warning", 0x88, "H"),
+    ("rpm_rev_limiter", 0x8A, "H"),
+    ("estimated_top_speed", 0x8C, "h"),
+    ("flags", 0x8E, "B"),
+    ("gears", 0x90, "B"),
+    ("throttle", 0x91, "B"),
+    ("brake", 0x92, "B"),
+    ("wheel_rps_FL", 0xA4, "f"),
+    ("wheel_rps_FR", 0xA8, "f"),
+    ("wheel_rps_RL", 0xAC, "f"),
+    ("wheel_rps_RR", 0xB0, "f"),
+    ("tyre_diameter_FL", 0xB4, "f"),
+    ("tyre_diameter_FR", 0xB8, "f"),
+    ("tyre_diameter_RL", 0xBC, "f"),
+    ("tyre_diameter_RR", 0xC0, "f"),
+    ("suspension_fl", 0xC4, "f"),
+    ("suspension_fr", 0xC8, "f"),
+    ("suspension_rl", 0xCC, "f"),
+    ("suspension_rr", 0xD0, "f"),
+    ("clutch", 0xF4, "f"),
+    ("clutch_engaged", 0xF8, "f"),
+    ("rpm_after_clutch", 0xFC, "f"),
+    ("gear_1", 0x104, "f"),
+    ("gear_2", 0x108, "f"),
+    ("gear_3", 0x10C, "f"),
+    ("gear_4", 0x110, "f"),
+    ("gear_5", 0x114, "f"),
+    ("gear_6", 0x118, "f"),
+    ("gear_7", 0x11C, "f"),
+    ("gear_8", 0x120, "f"),
+    ("car_id", 0x124, "i"),
+]
+
+
+def _build_packet_struct(fields) -> struct.Struct:
+    fmt = "<"
+    position = 0
+    for name, offset, field_format in fields:
+        if offset > position:
+            fmt += "%dx" % (offset - position)
+        fmt += field_format
+        position = offset + struct.calcsize("<" + field_format)
+    if position < PACKET_SIZE:
+        fmt += "%dx" % (PACKET_SIZE - position)
+    return struct.Struct(fmt)
+
+
+PACKET_STRUCT = _build_packet_struct(PACKET_FIELDS)
+GTPacket = namedtuple("GTPacket", [name for name, _, _ in PACKET_FIELDS])
+PACKAGE_ID_STRUCT = struct.Struct("<i")
+
+
+def decode_packet(ddata) -> GTPacket:
+    """
+    Decodes a decrypted packet with a single unpack into a GTPacket record of raw values.
+    """
+    return GTPacket._make(PACKET_STRUCT.unpack_from(ddata))
+
+
+# Attributes of GTData converted from raw packet fields, the one place these conversions are defined.
+# They read the raw fields as attributes of p and only use operators, so they work on the values of a GTPacket
+# as well as on the columns of many packets at once, see gt7packets.get_packet_values.
+FIELD_CONVERSIONS = {
+    "current_gear": lambda p: p.gears & 0b00001111,
+    "suggested_gear": lambda p: p.gears >> 4,
+    "boost": lambda p: p.boost - 1,
+    "type_speed_FL": lambda p: abs(3.6 * p.tyre_diameter_FL * p.wheel_rps_FL),
+    "type_speed_FR": lambda p: abs(3.6 * p.tyre_diameter_FR * p.wheel_rps_FR),
+    "type_speed_RL": lambda p: abs(3.6 * p.tyre_diameter_RL * p.wheel_rps_RL),
+    "tyre_speed_RR": lambda p: abs(3.6 * p.tyre_diameter_RR * p.wheel_rps_RR),
+    "car_speed": lambda p: 3.6 * p.car_speed,
+    "throttle": lambda p: p.throttle / 2.55,
+    "brake": lambda p: p.brake / 2.55,
+    "ride_height": lambda p: 1000 * p.ride_height,
+    "is_paused": lambda p: p.flags & 0b10 != 0,
+    "in_race": lambda p: p.flags & 0b01 != 0,
+}
 
 
 class GTData:
@@ -22,27 +151,29 @@ class GTData:
         if not ddata:
             return
 
-        self.package_id = struct.unpack('i', ddata[0x70:0x70 + 4])[0]
-        self.best_lap = struct.unpack('i', ddata[0x78:0x78 + 4])[0]
-        self.last_lap = struct.unpack('i', ddata[0x7C:0x7C + 4])[0]
-        self.current_lap = struct.unpack('h', ddata[0x74:0x74 + 2])[0]
-        self.current_gear = struct.unpack('B', ddata[0x90:0x90 + 1])[0] & 0b00001111
-        self.suggested_gear = struct.unpack('B', ddata[0x90:0x90 + 1])[0] >> 4
-        self.fuel_capacity = struct.unpack('f', ddata[0x48:0x48 + 4])[0]
-        self.current_fuel = struct.unpack('f', ddata[0x44:0x44 + 4])[0]  # fuel
-        self.boost = struct.unpack('f', ddata[0x50:0x50 + 4])[0] - 1
+        p = decode_packet(ddata)
 
-        self.tyre_diameter_FL = struct.unpack('f', ddata[0xB4:0xB4 + 4])[0]
-        self.tyre_diameter_FR = struct.unpack('f', ddata[0xB8:0xB8 + 4])[0]
-        self.tyre_diameter_RL = struct.unpack('f', ddata[0xBC:0xBC + 4])[0]
-        self.tyre_diameter_RR = struct.unpack('f', ddata[0xC0:0xC0 + 4])[0]
+        self.package_id = p.package_id
+        self.best_lap = p.best_lap
+        self.last_lap = p.last_lap
+        self.current_lap = p.current_lap
+        self.current_gear = FIELD_CONVERSIONS["current_gear"](p)
+        self.suggested_gear = FIELD_CONVERSIONS["suggested_gear"](p)
+        self.fuel_capacity = p.fuel_capacity
+        self.current_fuel = p.current_fuel  # fuel
+        self.boost = FIELD_CONVERSIONS["boost"](p)  # boost
 
-        self.type_speed_FL = abs(3.6 * self.tyre_diameter_FL * struct.unpack('f', ddata[0xA4:0xA4 + 4])[0])
-        self.type_speed_FR = abs(3.6 * self.tyre_diameter_FR * struct.unpack('f', ddata[0xA8:0xA8 + 4])[0])
-        self.type_speed_RL = abs(3.6 * self.tyre_diameter_RL * struct.unpack('f', ddata[0xAC:0xAC + 4])[0])
-        self.tyre_speed_RR = abs(3.6 * self.tyre_diameter_RR * struct.unpack('f', ddata[0xB0:0xB0 + 4])[0])
+        self.tyre_diameter_FL = p.tyre_diameter_FL
+        self.tyre_diameter_FR = p.tyre_diameter_FR
+        self.tyre_diameter_RL = p.tyre_diameter_RL
+        self.tyre_diameter_RR = p.tyre_diameter_RR
 
-        self.car_speed = 3.6 * struct.unpack('f', ddata[0x4C:0x4C + 4])[0]
+        self.type_speed_FL = FIELD_CONVERSIONS["type_speed_FL"](p)
+        self.type_speed_FR = FIELD_CONVERSIONS["type_speed_FR"](p)
+        self.type_speed_RL = FIELD_CONVERSIONS["type_speed_RL"](p)
+        self.tyre_speed_RR = FIELD_CONVERSIONS["tyre_speed_RR"](p)
+
+        self.car_speed = FIELD_CONVERSIONS["car_speed"](p)
 
         if self.car_speed > 0:
             self.tyre_slip_ratio_FL = '{:6.2f}'.format(self.type_speed_FL / self.car_speed)
@@ -50,103 +181,180 @@ class GTData:
             self.tyre_slip_ratio_RL = '{:6.2f}'.format(self.type_speed_RL / self.car_speed)
             self.tyre_slip_ratio_RR = '{:6.2f}'.format(self.tyre_speed_RR / self.car_speed)
 
-        self.time_on_track = timedelta(
-            seconds=round(struct.unpack('i', ddata[0x80:0x80 + 4])[0] / 1000))  # time of day on track
+        self.time_on_track = timedelta(seconds=round(p.time_on_track / 1000))  # time of day on track
+
+        self.total_laps = p.total_laps  # total laps
+
+        self.current_position = p.current_position  # current position
+        self.total_positions = p.total_positions  # total positions
+
+        self.car_id = p.car_id  # car id
+
+        self.throttle = FIELD_CONVERSIONS["throttle"](p)  # throttle
+        self.rpm = p.rpm  # rpm
+        self.rpm_rev_warning = p.rpm_rev_warning  # rpm rev warning
+
+        self.brake = FIELD_CONVERSIONS["brake"](p)  # brake
+
+        self.rpm_rev_limiter = p.rpm_rev_limiter  # rpm rev limiter
+
+        self.estimated_top_speed = p.estimated_top_speed  # estimated top speed
+
+        self.clutch = p.clutch  # clutch
+        self.clutch_engaged = p.clutch_engaged  # clutch engaged
+        self.rpm_after_clutch = p.rpm_after_clutch  # rpm after clutch
+
+        self.oil_temp = p.oil_temp  # oil temp
+        self.water_temp = p.water_temp  # water temp
+
+        self.oil_pressure = p.oil_pressure  # oil pressure
+        self.ride_height = FIELD_CONVERSIONS["ride_height"](p)  # ride height
 
-        self.total_laps = struct.unpack('h', ddata[0x76:0x76 + 2])[0]  # total laps
+        self.tyre_temp_FL = p.tyre_temp_FL  # tyre temp FL
+        self.tyre_temp_FR = p.tyre_temp_FR  # tyre temp FR
 
-        self.current_position = struct.unpack('h', ddata[0x84:0x84 + 2])[0]  # current position
-        self.total_positions = struct.unpack('h', ddata[0x86:0x86 + 2])[0]  # total positions
+        self.suspension_fl = p.suspension_fl  # suspension FL
+        self.suspension_fr = p.suspension_fr  # suspension FR
 
-        self.car_id = struct.unpack('i', ddata[0x124:0x124 + 4])[0]  # car id
+        self.tyre_temp_rl = p.tyre_temp_rl  # tyre temp RL
+        self.tyre_temp_rr = p.tyre_temp_rr  # tyre temp RR
 
-        self.throttle = struct.unpack('B', ddata[0x91:0x91 + 1])[0] / 2.55  # throttle
-        self.rpm = struct.unpack('f', ddata[0x3C:0x3C + 4])[0]  # rpm
-        self.rpm_rev_warning = struct.unpack('H', ddata[0x88:0x88 + 2])[0]  # rpm rev warning
+        self.suspension_rl = p.suspension_rl  # suspension RL
+        self.suspension_rr = p.suspension_rr  # suspension RR
 
-        self.brake = struct.unpack('B', ddata[0x92:0x92 + 1])[0] / 2.55  # brake
+        self.gear_1 = p.gear_1  # 1st gear
+        self.gear_2 = p.gear_2  # 2nd gear
+        self.gear_3 = p.gear_3  # 3rd gear
+        self.gear_4 = p.gear_4  # 4th gear
+        self.gear_5 = p.gear_5  # 5th gear
+        self.gear_6 = p.gear_6  # 6th gear
+        self.gear_7 = p.gear_7  # 7th gear
+        self.gear_8 = p.gear_8  # 8th gear
 
-        self.boost = struct.unpack('f', ddata[0x50:0x50 + 4])[0] - 1  # boost
+        # 0x100 ??? gear
 
-        self.rpm_rev_limiter = struct.unpack('H', ddata[0x8A:0x8A + 2])[0]  # rpm rev limiter
+        self.position_x = p.position_x  # pos X
+        self.position_y = p.position_y  # pos Y
+        self.position_z = p.position_z  # pos Z
 
-        self.estimated_top_speed = struct.unpack('h', ddata[0x8C:0x8C + 2])[0]  # estimated top speed
+        self.velocity_x = p.velocity_x  # velocity X
+        self.velocity_y = p.velocity_y  # velocity Y
+        self.velocity_z = p.velocity_z  # velocity Z
 
-        self.clutch = struct.unpack('f', ddata[0xF4:0xF4 + 4])[0]  # clutch
-        self.clutch_engaged = struct.unpack('f', ddata[0xF8:0xF8 + 4])[0]  # clutch engaged
-        self.rpm_after_clutch = struct.unpack('f', ddata[0xFC:0xFC + 4])[0]  # rpm after clutch
+        self.rotation_pitch = p.rotation_pitch  # rot Pitch
+        self.rotation_yaw = p.rotation_yaw  # rot Yaw
+        self.rotation_roll = p.rotation_roll  # rot Roll
 
-        self.oil_temp = struct.unpack('f', ddata[0x5C:0x5C + 4])[0]  # oil temp
-        self.water_temp = struct.unpack('f', ddata[0x58:0x58 + 4])[0]  # water temp
+        self.angular_velocity_x = p.angular_velocity_x  # angular velocity X
+        self.angular_velocity_y = p.angular_velocity_y  # angular velocity Y
+        self.angular_velocity_z = p.angular_velocity_z  # angular velocity Z
 
-        self.oil_pressure = struct.unpack('f', ddata[0x54:0x54 + 4])[0]  # oil pressure
-        self.ride_height = 1000 * struct.unpack('f', ddata[0x38:0x38 + 4])[0]  # ride height
+        self.is_paused = FIELD_CONVERSIONS["is_paused"](p)
+        self.in_race = FIELD_CONVERSIONS["in_race"](p)
 
-        self.tyre_temp_FL = struct.unpack('f', ddata[0x60:0x60 + 4])[0]  # tyre temp FL
-        self.tyre_temp_FR = struct.unpack('f', ddata[0x64:0x64 + 4])[0]  # tyre temp FR
+        # 0x28 = rot ???
 
-        self.suspension_fl = struct.unpack('f', ddata[0xC4:0xC4 + 4])[0]  # suspension FL
-        self.suspension_fr = struct.unpack('f', ddata[0xC8:0xC8 + 4])[0]  # suspension FR
+        # 0x8E various flags (see https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs)
+        # 0x8F various flags (see https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs)
+        # 0x93 = ???
 
-        self.tyre_temp_rl = struct.unpack('f', ddata[0x68:0x68 + 4])[0]  # tyre temp RL
-        self.tyre_temp_rr = struct.unpack('f', ddata[0x6C:0x6C + 4])[0]  # tyre temp RR
+        # 0x94, 0x98, 0x9C, 0xA0 = ???
+        # 0xD4, 0xD8, 0xDC, 0xE0 = ???
+        # 0xE4, 0xE8, 0xEC, 0xF0 = ???
 
-        self.suspension_rl = struct.unpack('f', ddata[0xCC:0xCC + 4])[0]  # suspension RL
-        self.suspension_rr = struct.unpack('f', ddata[0xD0:0xD0 + 4])[0]  # suspension RR
+    def to_json(self):
+        return json.dumps(vars(self), indent=4, sort_keys=True, default=str)
+
+_PACKET_FIELD_LAYOUT = {name: (offset, field_format) for name, offset, field_format in PACKET_FIELDS}
+
+
+def _field_decoder(name):
+    offset, field_format = _PACKET_FIELD_LAYOUT[name]
+    field_struct = struct.Struct("<" + field_format)
+    return lambda data: field_struct.unpack_from(data._ddata, offset)[0]
+
+
+FLAGS_OFFSET = _PACKET_FIELD_LAYOUT["flags"][0]
+_RAW_DECODERS = {name: _field_decoder(name) for name in _PACKET_FIELD_LAYOUT}
 
-        self.gear_1 = struct.unpack('f', ddata[0x104:0x104 + 4])[0]  # 1st gear
-        self.gear_2 = struct.unpack('f', ddata[0x108:0x108 + 4])[0]  # 2nd gear
-        self.gear_3 = struct.unpack('f', ddata[0x10C:0x10C + 4])[0]  # 3rd gear
-        self.gear_4 = struct.unpack('f', ddata[0x110:0x110 + 4])[0]  # 4th gear
-        self.gear_5 = struct.unpack('f', ddata[0x114:0x114 + 4])[0]  # 5th gear
-        self.gear_6 = struct.unpack('f', ddata[0x118:0x118 + 4])[0]  # 6th gear
-        self.gear_7 = struct.unpack('f', ddata[0x11C:0x11C + 4])[0]  # 7th gear
-        self.gear_8 = struct.unpack('f', ddata[0x120:0x120 + 4])[0]  # 8th gear
 
-        # self.struct.unpack('f', ddata[0x100:0x100+4])[0]					# ??? gear
+class _RawFields:
+    """
+    Decodes the raw fields of a LazyGTData as attributes, for FIELD_CONVERSIONS.
+    """
 
-        self.position_x = struct.unpack('f', ddata[0x04:0x04 + 4])[0]  # pos X
-        self.position_y = struct.unpack('f', ddata[0x08:0x08 + 4])[0]  # pos Y
-        self.position_z = struct.unpack('f', ddata[0x0C:0x0C + 4])[0]  # pos Z
+    __slots__ = ("_data",)
 
-        self.velocity_x = struct.unpack('f', ddata[0x10:0x10 + 4])[0]  # velocity X
-        self.velocity_y = struct.unpack('f', ddata[0x14:0x14 + 4])[0]  # velocity Y
-        self.velocity_z = struct.unpack('f', ddata[0x18:0x18 + 4])[0]  # velocity Z
+    def __init__(self, data):
+        self._data = data
 
-        self.rotation_pitch = struct.unpack('f', ddata[0x1C:0x1C + 4])[0]  # rot Pitch
-        self.rotation_yaw = struct.unpack('f', ddata[0x20:0x20 + 4])[0]  # rot Yaw
-        self.rotation_roll = struct.unpack('f', ddata[0x24:0x24 + 4])[0]  # rot Roll
+    def __getattr__(self, name):
+        return _RAW_DECODERS[name](self._data)
 
-        self.angular_velocity_x = struct.unpack('f', ddata[0x2C:0x2C + 4])[0]  # angular velocity X
-        self.angular_velocity_y = struct.unpack('f', ddata[0x30:0x30 + 4])[0]  # angular velocity Y
-        self.angular_velocity_z = struct.unpack('f', ddata[0x34:0x34 + 4])[0]  # angular velocity Z
 
-        self.is_paused = bin(struct.unpack('B', ddata[0x8E:0x8E + 1])[0])[-2] == '1'
-        self.in_race = bin(struct.unpack('B', ddata[0x8E:0x8E + 1])[0])[-1] == '1'
+def _converted_field_decoder(conversion):
+    return lambda data: conversion(_RawFields(data))
 
-        # struct.unpack('f', ddata[0x28:0x28+4])[0]					# rot ???
 
-        # bin(struct.unpack('B', ddata[0x8E:0x8E+1])[0])[2:]	# various flags (see https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs)
-        # bin(struct.unpack('B', ddata[0x8F:0x8F+1])[0])[2:]	# various flags (see https://github.com/Nenkai/PDTools/blob/master/PDTools.SimulatorInterface/SimulatorPacketG7S0.cs)
-        # bin(struct.unpack('B', ddata[0x93:0x93+1])[0])[2:]	# 0x93 = ???
+def _slip_ratio_decoder(tyre_speed_name):
+    def decode(data):
+        # Like GTData, there is no slip ratio while standing
+        if not data.car_speed > 0:
+            raise AttributeError("tyre slip ratio is not defined for a car speed of 0")
+        return '{:6.2f}'.format(getattr(data, tyre_speed_name) / data.car_speed)
+    return decode
 
-        # struct.unpack('f', ddata[0x94:0x94+4])[0]			# 0x94 = ???
-        # struct.unpack('f', ddata[0x98:0x98+4])[0]			# 0x98 = ???
-        # struct.unpack('f', ddata[0x9C:0x9C+4])[0]			# 0x9C = ???
-        # struct.unpack('f', ddata[0xA0:0xA0+4])[0]			# 0xA0 = ???
 
-        # struct.unpack('f', ddata[0xD4:0xD4+4])[0]			# 0xD4 = ???
-        # struct.unpack('f', ddata[0xD8:0xD8+4])[0]			# 0xD8 = ???
-        # struct.unpack('f', ddata[0xDC:0xDC+4])[0]			# 0xDC = ???
-        # struct.unpack('f', ddata[0xE0:0xE0+4])[0]			# 0xE0 = ???
+# Decodes every attribute of GTData for LazyGTData, raw fields which GTData does not expose are left out
+_LAZY_DECODERS = {
+    name: decoder for name, decoder in _RAW_DECODERS.items()
+    if name not in ("flags", "gears") and not name.startswith("wheel_rps_")
+}
+_LAZY_DECODERS.update({name: _converted_field_decoder(conversion) for name, conversion in FIELD_CONVERSIONS.items()})
+_LAZY_DECODERS.update({
+    "tyre_slip_ratio_FL": _slip_ratio_decoder("type_speed_FL"),
+    "tyre_slip_ratio_FR": _slip_ratio_decoder("type_speed_FR"),
+    "tyre_slip_ratio_RL": _slip_ratio_decoder("type_speed_RL"),
+    "tyre_slip_ratio_RR": _slip_ratio_decoder("tyre_speed_RR"),
+    "time_on_track": lambda data: timedelta(seconds=round(_RAW_DECODERS["time_on_track"](data) / 1000)),
+})
 
-        # struct.unpack('f', ddata[0xE4:0xE4+4])[0]			# 0xE4 = ???
-        # struct.unpack('f', ddata[0xE8:0xE8+4])[0]			# 0xE8 = ???
-        # struct.unpack('f', ddata[0xEC:0xEC+4])[0]			# 0xEC = ???
-        # struct.unpack('f', ddata[0xF0:0xF0+4])[0]			# 0xF0 = ???
+
+class LazyGTData:
+    """
+    Variant of GTData which keeps the decrypted packet and decodes every field on first access.
+    Decoded fields are cached in slots, so consumers reading only a few fields do not pay for the others.
+    """
+
+    __slots__ = ("_ddata",) + tuple(_LAZY_DECODERS)
+
+    def __init__(self, ddata):
+        self._ddata = ddata if ddata else None
+
+    def __getattr__(self, name):
+        # Only called for slots not decoded yet
+        decoder = _LAZY_DECODERS.get(name)
+        if decoder is None or self._ddata is None:
+            raise AttributeError("'LazyGTData' object has no attribute '%s'" % name)
+        value = decoder(self)
+        setattr(self, name, value)
+        return value
+
+    def to_dict(self) -> dict:
+        """
+        Decodes all fields, the result has the same keys and values as vars(GTData(ddata)).
+        """
+        data = {}
+        for name in _LAZY_DECODERS:
+            try:
+                data[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        return data
 
     def to_json(self):
-        return json.dumps(self, indent=4, sort_keys=True, default=str)
+        return json.dumps(self.to_dict(), indent=4, sort_keys=True, default=str)
+
 
 class Session():
     def __init__(self):
@@ -159,6 +367,32 @@ class Session():
     def __eq__(self, other):
         return other is not None and self.best_lap == other.best_lap and self.min_body_height == other.min_body_height and self.max_speed == other.max_speed
 
+# Number of datagrams the receiving thread can buffer, about 17 seconds of packets
+RING_BUFFER_CAPACITY = 1024
+
+# Markers of the receiving thread in the ring buffer, the processing thread resets its state when it peeks them
+CONNECTION_STARTED = "connection started"
+CONNECTION_LOST = "connection lost"
+
+# Seconds without a packet until a heartbeat is sent again, like the socket timeout in GT7Communication.run
+ASYNC_RECEIVE_TIMEOUT = 10
+
+
+class GT7DatagramProtocol(asyncio.DatagramProtocol):
+    """
+    Receives packets on an asyncio event loop and hands them to GT7Communication, see GT7Communication.start_async
+    """
+
+    def __init__(self, gt7comm):
+        self.gt7comm = gt7comm
+
+    def datagram_received(self, data, addr):
+        self.gt7comm._on_async_datagram(data)
+
+    def error_received(self, exc):
+        logging.warning("Error while receiving from %s: %s" % (self.gt7comm.playstation_ip, exc))
+
+
 class GT7Communication(Thread):
     def __init__(self, playstation_ip):
         # Thread control
@@ -176,19 +410,68 @@ class GT7Communication(Thread):
         self.receive_port = 33740
         self._last_time_data_received = 0
 
+        # Channels recorded for every tick, see set_recorded_channels
+        self.recorded_channels = list(DEFAULT_CHANNELS)
+        self._channel_recorder = None
+
         self.current_lap = Lap()
         self.session = Session()
         self.laps = []
         self.last_data = GTData(None)
+        # Rolling indicators of the last seconds, updated with every recorded tick
+        self.live_indicators = LiveIndicators()
 
         # This is used to record race data in any case. This will override the "in_race" flag.
         # When recording data. Useful when recording replays.
         self.always_record_data = False
 
+        # Raw datagram capture, see start_capture
+        self._capture_writer = None
+        self._capture_lock = Lock()
+
+        # Journal of the finished laps of this session, see start_journal
+        self._journal = None
+        self._journal_lock = Lock()
+        # Laps are encoded and synced to the journal on this thread, one at a time in the order they were finished
+        self._journal_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="gt7journal")
+
+        # If set, the thread replays this capture file instead of connecting to the PlayStation
+        self.replay_path = None
+        self.replay_speed = 1.0
+
+        # Callbacks which are called with every processed GTData, see subscribe
+        self._subscribers = []
+
+        # Notified with every processed GTData, see wait_for_data and wait_for_data_async
+        self._data_condition = Condition()
+        # Tuples of package id, event loop and future of wait_for_data_async
+        self._data_waiters = []
+
+        # asyncio ingest, see start_async
+        self._transport = None
+        self._heartbeat_timer = None
+        self._async_package_nr = 0
+        self._last_time_datagram_received = 0
+
+        # Received datagrams are buffered here until the processing thread decodes and logs them
+        self._ring_buffer = PacketRingBuffer(capacity=RING_BUFFER_CAPACITY)
+        self._processing_thread = None
+
+        # Packet loss, reordering and jitter of the current connection
+        self._reset_connection()
+
 
     def stop(self):
         self._shall_run = False
+        self._close_async()
+        self.stop_capture()
+        self.stop_journal()
+
     def run(self):
+        if self.replay_path:
+            self.replay(self.replay_path, self.replay_speed)
+            return
+
         while self._shall_run:
             s = None
             try:
@@ -199,57 +482,32 @@ class GT7Communication(Thread):
                     s.setsockopt (socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 
                 s.bind(('0.0.0.0', self.receive_port))
+                # Statistics and ids are reset by the processing thread, which is still using them.
+                # Datagrams still buffered from before are stale then.
+                self._ring_buffer.commit_marker(CONNECTION_STARTED, discard=True)
+                self._start_processing_thread()
                 self._send_hb(s)
                 s.settimeout(10)
-                previous_lap = -1
-                package_id = 0
                 package_nr = 0
                 while not self._shall_restart and self._shall_run:
                     try:
-                        data, address = s.recvfrom(4096)
-                        package_nr = package_nr + 1
-                        ddata = salsa20_dec(data)
-                        if len(ddata) > 0 and struct.unpack('i', ddata[0x70:0x70 + 4])[0] > package_id:
-
-                            self.last_data = GTData(ddata)
-                            self._last_time_data_received = time.time()
-
-                            package_id = struct.unpack('i', ddata[0x70:0x70 + 4])[0]
-
-                            bstlap = struct.unpack('i', ddata[0x78:0x78 + 4])[0]
-                            lstlap = struct.unpack('i', ddata[0x7C:0x7C + 4])[0]
-                            curlap = struct.unpack('h', ddata[0x74:0x74 + 2])[0]
-
-                            if curlap == 0:
-                                self.session.special_packet_time = 0
-
-                            if curlap > 0 and (self.last_data.in_race or self.always_record_data):
-
-                                if curlap != previous_lap:
-                                    # New lap
-                                    previous_lap = curlap
-
-                                    self.session.special_packet_time += lstlap - self.current_lap.lap_ticks * 1000.0 / 60.0
-                                    self.session.best_lap = bstlap
+                        # Only receive here, decoding and logging is done by the processing thread
+                        slot = self._ring_buffer.write_slot()
+                        if slot is None:
+                            s.recv_into(self._ring_buffer.overflow_slot)
+                            self._ring_buffer.overflow()
+                        else:
+                            self._ring_buffer.commit(s.recv_into(slot), time.time())
 
-                                    self.finish_lap()
-
-                            else:
-                                curLapTime = 0
-                                # Reset lap
-                                self.current_lap = Lap()
-
-                            self._log_data(self.last_data)
-
-                            if package_nr > 100:
-                                self._send_hb(s)
-                                package_nr = 0
+                        package_nr = package_nr + 1
+                        if package_nr > 100:
+                            self._send_hb(s)
+                            package_nr = 0
                     except (OSError, TimeoutError) as e:
                         # Handler for package exceptions
                         self._send_hb(s)
                         package_nr = 0
-                        # Reset package id for new connections
-                        package_id = 0
+                        self._ring_buffer.commit_marker(CONNECTION_LOST)
 
             except Exception as e:
                 # Handler for general socket exceptions
@@ -259,25 +517,360 @@ class GT7Communication(Thread):
                 # Wait before reconnect
                 time.sleep(5)
 
+    def _start_processing_thread(self):
+        if self._processing_thread and self._processing_thread.is_alive():
+            return
+        self._processing_thread = Thread(target=self._process_ring_buffer, name="gt7processing", daemon=True)
+        self._processing_thread.start()
+
+    def _process_ring_buffer(self):
+        while self._shall_run:
+            item = self._ring_buffer.peek(timeout=1)
+            if item is None:
+                continue
+            if item is CONNECTION_STARTED:
+                self._reset_connection()
+                continue
+            if item is CONNECTION_LOST:
+                self._reset_lost_connection()
+                continue
+            data, timestamp = item
+            # Overflows are counted by the receiving thread, the gap they leave shows up here
+            overflows = self._ring_buffer.overflows
+            if overflows != self._recorded_overflows:
+                self.statistics.record_overflows(overflows - self._recorded_overflows)
+                self._recorded_overflows = overflows
+            try:
+                self._record_datagram(data, timestamp)
+                self._process_datagram(data, timestamp)
+            except Exception as e:
+                logging.error("Error while processing packet: %s" % e)
+                traceback.print_exc()
+            finally:
+                self._ring_buffer.release()
+
+    def get_ingest_counters(self) -> dict:
+        """
+        Returns the counters of the receiving and the processing stage.
+        """
+        return {
+            "received": self._ring_buffer.received,
+            "overflows": self._ring_buffer.overflows,
+            "discarded": self._ring_buffer.discarded,
+            "buffered": len(self._ring_buffer),
+            "processed": self.statistics.packets_processed,
+            "dropped": self.statistics.packets_out_of_order
+                       + self.statistics.packets_duplicated
+                       + self.statistics.decrypt_failures,
+        }
+
+    def get_statistics(self) -> ConnectionStatistics:
+        return self.statistics
+
+    def _reset_stream(self):
+        self._previous_lap = -1
+        self._reset_lost_connection()
+        self.live_indicators.clear()
+
+    def _reset_connection(self):
+        self.statistics = ConnectionStatistics()
+        # Overflows before belong to the previous connection
+        self._recorded_overflows = self._ring_buffer.overflows
+        self._reset_stream()
+
+    def _reset_lost_connection(self):
+        # Package ids start over for new connections
+        self._package_id = 0
+        # Package id of the last packet logged to a lap
+        self._logged_package_id = 0
+
+    def _process_datagram(self, data, timestamp: float = None) -> bool:
+        """
+        Decrypts and decodes a datagram received at timestamp and logs its data.
+        Returns False if the datagram was dropped, because it could not be decrypted or is older than the last one.
+        """
+        self.statistics.record_datagram(timestamp or time.time())
+
+        ddata = salsa20_dec(data)
+        if len(ddata) == 0:
+            self.statistics.record_decrypt_failure()
+            return False
+
+        if not self.statistics.record_package_id(PACKAGE_ID_STRUCT.unpack_from(ddata, 0x70)[0], self._package_id):
+            return False
+
+        # Recording reads most fields, decoding them at once is faster than one by one.
+        # Packets which are not recorded, e.g. in menus or while paused, are only decoded as far as they are read.
+        flags = ddata[FLAGS_OFFSET]
+        if (flags & 0b01 or self.always_record_data) and not flags & 0b10:
+            self.last_data = GTData(ddata)
+        else:
+            self.last_data = LazyGTData(ddata)
+        self._last_time_data_received = time.time()
+
+        self._package_id = self.last_data.package_id
+
+        bstlap = self.last_data.best_lap
+        lstlap = self.last_data.last_lap
+        curlap = self.last_data.current_lap
+
+        if curlap == 0:
+            self.session.special_packet_time = 0
+
+        if curlap > 0 and (self.last_data.in_race or self.always_record_data):
+
+            if curlap != self._previous_lap:
+                # New lap
+                self._previous_lap = curlap
+
+                self.session.special_packet_time += lstlap - self.current_lap.lap_ticks * 1000.0 / 60.0
+                self.session.best_lap = bstlap
+
+                self.finish_lap()
+
+        else:
+            # Reset lap
+            self.current_lap = self._new_lap()
+
+        self._log_data(self.last_data)
+
+        for subscriber in self._subscribers:
+            subscriber(self.last_data)
+
+        self._notify_data(self.last_data)
+
+        return True
+
+    def _notify_data(self, data):
+        with self._data_condition:
+            self._data_condition.notify_all()
+            if not self._data_waiters:
+                return
+            waiters = []
+            for waiter in self._data_waiters:
+                newer_than, loop, future = waiter
+                if data.package_id > newer_than:
+                    try:
+                        loop.call_soon_threadsafe(_set_future_result, future, data)
+                    except RuntimeError:
+                        # Event loop of the waiter is closed
+                        pass
+                else:
+                    waiters.append(waiter)
+            self._data_waiters = waiters
+
+    def _has_data_newer_than(self, package_id: int) -> bool:
+        return getattr(self.last_data, "package_id", 0) > package_id
+
+    def wait_for_data(self, newer_than: int = 0, timeout: float = 5) -> Optional[GTData]:
+        """
+        Blocks until a packet with a package id greater than newer_than was processed and returns it.
+        Pass the package id of the last returned data to follow the stream packet by packet.
+        Returns None on timeout. After a reconnect, package ids may start lower again.
+        """
+        with self._data_condition:
+            if self._data_condition.wait_for(lambda: self._has_data_newer_than(newer_than), timeout):
+                return self.last_data
+        return None
+
+    async def wait_for_data_async(self, newer_than: int = 0, timeout: float = 5) -> Optional[GTData]:
+        """
+        Awaitable variant of wait_for_data for asyncio consumers, it works with start and start_async.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (newer_than, loop, future)
+        with self._data_condition:
+            if self._has_data_newer_than(newer_than):
+                return self.last_data
+            self._data_waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            with self._data_condition:
+                if waiter in self._data_waiters:
+                    self._data_waiters.remove(waiter)
+
+    def subscribe(self, callback):
+        """
+        Calls callback with every processed GTData.
+        Callbacks run on the thread that receives the packets. With start_async this is the event loop.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def start_async(self, loop: asyncio.AbstractEventLoop = None) -> asyncio.Task:
+        """
+        Alternative to start() which receives packets on an asyncio event loop instead of an own thread.
+        Use this to share the event loop of the Bokeh server. Defaults to the running event loop.
+        """
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        return loop.create_task(self.run_async())
+
+    async def run_async(self):
+        loop = asyncio.get_running_loop()
+        self._shall_run = True
+        self._reset_connection()
+        self._async_package_nr = 0
+        self._last_time_datagram_received = time.time()
+
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: GT7DatagramProtocol(self),
+            local_addr=('0.0.0.0', self.receive_port),
+            allow_broadcast=self.playstation_ip == "255.255.255.255",
+        )
+        self._send_hb(self._transport)
+        self._heartbeat_timer = loop.call_later(ASYNC_RECEIVE_TIMEOUT, self._check_async_connection)
+
+    def _on_async_datagram(self, data):
+        self._last_time_datagram_received = time.time()
+        self._async_package_nr += 1
+        self._record_datagram(data, self._last_time_datagram_received)
+        if self._process_datagram(data, self._last_time_datagram_received) and self._async_package_nr > 100:
+            self._send_hb(self._transport)
+            self._async_package_nr = 0
+
+    def _check_async_connection(self):
+        """
+        Timer equivalent of the socket timeout in run().
+        Sends a heartbeat when no packet was received for ASYNC_RECEIVE_TIMEOUT seconds.
+        """
+        if not self._transport or self._transport.is_closing():
+            return
+
+        since_last_datagram = time.time() - self._last_time_datagram_received
+        if since_last_datagram >= ASYNC_RECEIVE_TIMEOUT:
+            self._send_hb(self._transport)
+            self._async_package_nr = 0
+            self._reset_lost_connection()
+            self._last_time_datagram_received = time.time()
+            since_last_datagram = 0
+
+        self._heartbeat_timer = asyncio.get_running_loop().call_later(
+            ASYNC_RECEIVE_TIMEOUT - since_last_datagram, self._check_async_connection
+        )
+
+    def _close_async(self):
+        if self._heartbeat_timer:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        if self._transport:
+            self._transport.close()
+            self._transport = None
+
+    def start_capture(self, path: str):
+        """
+        Appends every received datagram with its receive timestamp to a capture file at path.
+        """
+        with self._capture_lock:
+            if self._capture_writer:
+                self._capture_writer.close()
+            self._capture_writer = CaptureWriter(path)
+
+    def stop_capture(self):
+        with self._capture_lock:
+            if self._capture_writer:
+                self._capture_writer.close()
+            self._capture_writer = None
+
+    def start_journal(self, path: str):
+        """
+        Appends every finished lap to a session journal at path, so laps survive a crash.
+        A running journal is compacted first.
+        """
+        self.stop_journal()
+        with self._journal_lock:
+            self._journal = SessionJournal(path)
+
+    def stop_journal(self) -> Optional[str]:
+        """
+        Closes the session journal and compacts it into a lap file, after the laps still being appended.
+        Returns the path of the lap file, None if there was no journal or no finished lap.
+        """
+        with self._journal_lock:
+            journal = self._journal
+            self._journal = None
+        if not journal:
+            return None
+        return self._journal_executor.submit(self._close_journal, journal).result()
+
+    def flush_journal(self):
+        """
+        Waits until all finished laps are appended to the session journal.
+        """
+        self._journal_executor.submit(lambda: None).result()
+
+    def _journal_lap(self, lap: Lap):
+        # Appending syncs to disk, so it must not hold up the packets or the Bokeh event loop
+        with self._journal_lock:
+            if self._journal:
+                self._journal_executor.submit(self._append_to_journal, self._journal, lap)
+
+    @staticmethod
+    def _append_to_journal(journal: SessionJournal, lap: Lap):
+        try:
+            journal.append_lap(lap)
+        except Exception as e:
+            logging.error("Could not append lap to journal %s: %s" % (journal.path, e))
+
+    @staticmethod
+    def _close_journal(journal: SessionJournal) -> Optional[str]:
+        journal.close()
+        return compact_journal(journal.path)
+
+    def _record_datagram(self, data, timestamp: float):
+        if not self._capture_writer:
+            return
+        with self._capture_lock:
+            if self._capture_writer:
+                self._capture_writer.write(data, timestamp)
+
+    def replay(self, path: str, speed: float = 1.0):
+        """
+        Feeds a capture file through the same decoding and logging as live datagrams.
+        A speed of 1 replays in real time, 10 replays ten times faster and 0 replays as fast as possible.
+        """
+        self._reset_connection()
+        first_timestamp = None
+        replay_start = time.time()
+        for timestamp, data in read_capture(path):
+            if not self._shall_run:
+                break
+
+            if speed and speed > 0:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+                wait = replay_start + (timestamp - first_timestamp) / speed - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+
+            self._process_datagram(data, timestamp)
+
     def restart(self):
         self._shall_restart = True
+        if self._transport:
+            self._send_hb(self._transport)
+            self._reset_stream()
 
     def is_connected(self) -> bool:
         return self._last_time_data_received > 0 and (time.time() - self._last_time_data_received) <= 1
 
     def _send_hb(self, s):
+        self.statistics.record_heartbeat(time.time())
         send_data = 'A'
         s.sendto(send_data.encode('utf-8'), (self.playstation_ip, self.send_port))
 
-    def get_last_data(self) -> GTData:
-        timeout = time.time() + 5  # 5 seconds timeout
-        while True:
-
-            if self.last_data is not None:
-                return self.last_data
-
-            if time.time() > timeout:
-                break
+    def get_last_data(self, timeout: float = 5) -> GTData:
+        """
+        Returns the last processed data. Waits for the first packet if none was processed yet.
+        """
+        return self.wait_for_data(0, timeout) or self.last_data
 
     def get_laps(self) -> List[Lap]:
         return self.laps
@@ -304,72 +897,19 @@ class GT7Communication(Thread):
         if data.car_speed > self.session.max_speed:
             self.session.max_speed = data.car_speed
 
-        if data.throttle == 100:
-            self.current_lap.full_throttle_ticks += 1
-
-        if data.brake == 100:
-            self.current_lap.full_brake_ticks += 1
-
-        if data.brake == 0 and data.throttle == 0:
-            self.current_lap.no_throttle_and_no_brake_ticks += 1
-            self.current_lap.data_coasting.append(1)
-        else:
-            self.current_lap.data_coasting.append(0)
-
-        if data.brake > 0 and data.throttle > 0:
-            self.current_lap.throttle_and_brake_ticks += 1
-
-        self.current_lap.lap_ticks += 1
-
-        if data.tyre_temp_FL > 100 or data.tyre_temp_FR > 100 or data.tyre_temp_rl > 100 or data.tyre_temp_rr > 100:
-            self.current_lap.tires_overheated_ticks += 1
-
-        self.current_lap.data_braking.append(data.brake)
-        self.current_lap.data_throttle.append(data.throttle)
-        self.current_lap.data_speed.append(data.car_speed)
-
-        delta_divisor = data.car_speed
-        if data.car_speed == 0:
-            delta_divisor = 1
-
-        delta_fl = data.type_speed_FL / delta_divisor
-        delta_fr = data.type_speed_FR / delta_divisor
-        delta_rl = data.type_speed_RL / delta_divisor
-        delta_rr = data.type_speed_FR / delta_divisor
-
-        if delta_fl > 1.1 or delta_fr > 1.1 or delta_rl > 1.1 or delta_rr > 1.1:
-            self.current_lap.tires_spinning_ticks += 1
+        self.current_lap.lap_ticks += get_tick_delta(self._logged_package_id, data.package_id)
+        self._logged_package_id = data.package_id
+        self.current_lap.data_ticks.append(self.current_lap.lap_ticks)
 
-        self.current_lap.data_tires.append(delta_fl + delta_fr + delta_rl + delta_rr)
-
-        ## RPM and shifting
-
-        self.current_lap.data_rpm.append(data.rpm)
-        self.current_lap.data_gear.append(data.current_gear)
-
-        ## Log Position
-
-        self.current_lap.data_position_x.append(data.position_x)
-        self.current_lap.data_position_y.append(data.position_y)
-        self.current_lap.data_position_z.append(data.position_z)
-
-        ## Log Boost
-
-        self.current_lap.data_boost.append(data.boost)
-
-        ## Log Yaw Rate
-
-        # This is the interval to collection yaw rate
-        interval = 1 * 60 # 1 second has 60 fps and 60 data ticks
-        self.current_lap.data_rotation_yaw.append(data.rotation_yaw)
-
-        # Collect yaw rate, skip first interval with all zeroes
-        if len(self.current_lap.data_rotation_yaw) > interval:
-            yaw_rate_per_second = data.rotation_yaw - self.current_lap.data_rotation_yaw[-interval]
-        else:
-            yaw_rate_per_second = 0
+        # Only raw channels are recorded, coasting, tires, yaw rate and the aggregated ticks
+        # are derived from them when read, see Lap.get_derived_metrics
+        if self._channel_recorder is None or self._channel_recorder[0] is not self.current_lap:
+            self._channel_recorder = self._get_channel_recorder(self.current_lap)
+        _, read_sources, appends = self._channel_recorder
+        for append, value in zip(appends, read_sources(data)):
+            append(value)
 
-        self.current_lap.data_absolute_yaw_rate_per_second.append(abs(yaw_rate_per_second))
+        self.live_indicators.update(data.rotation_yaw, data.throttle, data.car_speed)
 
         # Adapted from https://www.gtplanet.net/forum/threads/gt7-is-compatible-with-motion-rig.410728/post-13810797
         self.current_lap.lap_live_time = (self.current_lap.lap_ticks * 1. / 60.) - (self.session.special_packet_time / 1000.)
@@ -414,43 +954,110 @@ class GT7Communication(Thread):
         # TODO Correct this comment, this is about Laptime not lap numbers
         if self.current_lap.lap_finish_time > 0 and len(self.current_lap.data_speed) > 0:
             self.laps.insert(0, self.current_lap)
+            self._journal_lap(self.current_lap)
 
             # Make a copy of this lap and call the callback function if set
             if self.lap_callback_function:
                 self.lap_callback_function(copy.deepcopy(self.current_lap))
 
         # Reset current lap with an empty one
-        self.current_lap = Lap()
+        self.current_lap = self._new_lap()
         self.current_lap.fuel_at_start = self.last_data.current_fuel
 
 
-    def reset(self):
+    def reset(self) -> Optional[str]:
         """
         Resets the current lap, all stored laps and the current session.
+        A session journal is compacted and a new one is started next to it, the path of its lap file is returned.
         """
-        self.current_lap = Lap()
+        lap_file_path = None
+        if self._journal:
+            folder = os.path.dirname(self._journal.path)
+            lap_file_path = self.stop_journal()
+            self.start_journal(get_journal_path(folder))
+        self.current_lap = self._new_lap()
         self.session = Session()
         self.last_data = GTData(None)
         self.laps = []
+        return lap_file_path
+
+    def _new_lap(self) -> Lap:
+        lap = Lap()
+        lap.add_channels(self.recorded_channels)
+        return lap
+
+    def _get_channel_recorder(self, lap: Lap) -> tuple:
+        """
+        Returns the lap, a function reading the sources of all recorded channels from GTData at once
+        and the append functions of the channels of the lap, so _log_data does not look them up every tick.
+        """
+        appends = []
+        for channel in self.recorded_channels:
+            append = getattr(lap, channel.attribute).append
+            if channel.transform is not None:
+                append = _transformed(append, channel.transform)
+            appends.append(append)
+        return lap, operator.attrgetter(*[channel.source for channel in self.recorded_channels]), appends
+
+    def set_recorded_channels(self, channels: List[RecordedChannel]):
+        """
+        Sets the channels recorded for every tick, e.g. DEFAULT_CHANNELS + ENGINEERING_CHANNELS.
+        The default channels are always recorded, the dashboard depends on them.
+        """
+        self.recorded_channels = list(DEFAULT_CHANNELS) + [c for c in channels if c not in DEFAULT_CHANNELS]
+        self.current_lap.add_channels(self.recorded_channels)
+        self._channel_recorder = None
 
     def set_lap_callback(self, new_lap_callback):
         self.lap_callback_function = new_lap_callback
 
 
+def _set_future_result(future: asyncio.Future, data):
+    if not future.done():
+        future.set_result(data)
+
+
+def _transformed(append, transform):
+    return lambda value: append(transform(value))
+
+
 # data stream decoding
-def salsa20_dec(dat):
-    key = b'Simulator Interface Packet GT7 ver 0.0'
+SALSA20_KEY = b'Simulator Interface Packet GT7 ver 0.0'[0:32]
+SALSA20_MAGIC = struct.pack('<I', 0x47375330)
+SALSA20_IV_SEED_OFFSET = 0x40
+_SALSA20_IV_STRUCT = struct.Struct('<II')
+_SALSA20_IV_SEED_STRUCT = struct.Struct('<I')
+
+
+def _salsa20_cipher(dat):
     # Seed IV is always located here
-    oiv = dat[0x40:0x44]
-    iv1 = int.from_bytes(oiv, byteorder='little')
+    iv1 = _SALSA20_IV_SEED_STRUCT.unpack_from(dat, SALSA20_IV_SEED_OFFSET)[0]
     # Notice DEADBEAF, not DEADBEEF
     iv2 = iv1 ^ 0xDEADBEAF
-    iv = bytearray()
-    iv.extend(iv2.to_bytes(4, 'little'))
-    iv.extend(iv1.to_bytes(4, 'little'))
-    cipher = Salsa20.new(key[0:32], bytes(iv))
-    ddata = cipher.decrypt(dat)
-    magic = int.from_bytes(ddata[0:4], byteorder='little')
-    if magic != 0x47375330:
+    return Salsa20.new(SALSA20_KEY, _SALSA20_IV_STRUCT.pack(iv2, iv1))
+
+
+def salsa20_dec(dat):
+    if len(dat) < SALSA20_IV_SEED_OFFSET + 4:
+        return bytearray(b'')
+    ddata = _salsa20_cipher(dat).decrypt(dat)
+    if ddata[0:4] != SALSA20_MAGIC:
         return bytearray(b'')
     return ddata
+
+
+def salsa20_dec_batch(datagrams) -> bytes:
+    """
+    Decrypts many datagrams in one call, e.g. of a capture file.
+    Returns one buffer of the concatenated packets of PACKET_SIZE bytes, invalid datagrams are left out.
+    Use gt7packets.packets_from_buffer to view the buffer as packets.
+    """
+    packets = []
+    for dat in datagrams:
+        if len(dat) < PACKET_SIZE:
+            continue
+        # Only the known packet layout is decrypted, newer heartbeat types send longer packets
+        ddata = _salsa20_cipher(dat).decrypt(dat[0:PACKET_SIZE])
+        if ddata[0:4] == SALSA20_MAGIC:
+            packets.append(ddata)
+    return b"".join(packets)
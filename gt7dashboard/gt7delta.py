@@ -0,0 +1,63 @@
+from typing import Optional
+
+import numpy as np
+
+from gt7dashboard import gt7helper
+from gt7dashboard.gt7lap import Lap
+
+
+class LiveTimeDelta:
+    """
+    Time difference of the lap in progress to a reference lap, updated with every tick.
+    Like gt7helper.get_time_diff_by_distance, both laps are compared at the same distance travelled.
+
+    Distances and times come from gt7helper.get_x_axis_for_distance and gt7helper.get_time_at_distance.
+    They are kept in the lap cache, so an update only extends the distance of the lap in progress by the new ticks.
+    """
+
+    def __init__(self):
+        self._reference_lap = None
+
+        self.delta_ms: Optional[float] = None
+
+    def set_reference_lap(self, reference_lap: Optional[Lap]):
+        if reference_lap is None or len(reference_lap.data_speed) == 0 or \
+                len(reference_lap.data_time) != len(reference_lap.data_speed):
+            self._reference_lap = None
+            self.delta_ms = None
+            return
+
+        # Assigned at once, so it can be replaced while update() runs on the packet thread
+        self._reference_lap = reference_lap
+
+    def get_reference_time(self, distance: float) -> Optional[float]:
+        """
+        Returns the time in seconds the reference lap took to travel distance, None if it is not long enough.
+        """
+        reference_lap = self._reference_lap
+        if reference_lap is None:
+            return None
+
+        reference_time = gt7helper.get_time_at_distance(reference_lap, np.array([distance]))[0]
+        if np.isnan(reference_time):
+            return None
+        return reference_time / 1000
+
+    def update(self, lap: Lap) -> Optional[float]:
+        """
+        Updates the delta with the ticks added to lap since the last call and returns it in ms.
+        Positive values mean the lap in progress is slower than the reference lap.
+        """
+        distance = gt7helper.get_x_axis_for_distance(lap)
+        # data_time is logged last for every tick, see GT7Communication._log_data
+        number_of_samples = min(len(distance), len(lap.data_time))
+        if number_of_samples == 0:
+            self.delta_ms = None
+            return None
+
+        reference_time = self.get_reference_time(distance[number_of_samples - 1])
+        if reference_time is None:
+            self.delta_ms = None
+        else:
+            self.delta_ms = (lap.data_time[number_of_samples - 1] - reference_time) * 1000
+        return self.delta_ms
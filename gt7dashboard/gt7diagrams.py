@@ -1,12 +1,13 @@
 from typing import List
 
 import bokeh
+import numpy as np
 from bokeh.layouts import layout
 from bokeh.models import ColumnDataSource, Label, Scatter, Column, Line, TableColumn, DataTable, Range1d
 from bokeh.plotting import figure
 
 from gt7dashboard import gt7helper
-from gt7dashboard.gt7lap import Lap
+from gt7dashboard.gt7lap import DERIVED_CHANNEL_DTYPES, Lap, derive_metrics_for_range, get_number_of_derivable_samples
 
 
 def get_throttle_braking_race_line_diagram():
@@ -178,13 +179,14 @@ class RaceDiagram(object):
         self.source_last_lap = None
         self.source_reference_lap = None
         self.source_median_lap = None
+        self.source_live_lap = None
         self.sources_additional_laps = []
 
         self.additional_laps = List[Lap]
 
         # This is the number of default laps,
-        # last lap, best lap and median lap
-        self.number_of_default_laps = 3
+        # last lap, best lap, median lap and live lap
+        self.number_of_default_laps = 4
 
 
         tooltips = [
@@ -370,6 +372,10 @@ class RaceDiagram(object):
 
         self.source_median_lap = self.add_lap_to_race_diagram("green", "Median Lap", False)
 
+        # The lap in progress is streamed sample by sample, see LiveLapStream
+        self.source_live_lap = self.add_lap_to_race_diagram("darkorange", "Live Lap", True)
+        self.source_live_lap.data = LiveLapStream.get_empty_data()
+
         self.f_speed.legend.click_policy = "hide"
         self.f_throttle.legend.click_policy = self.f_speed.legend.click_policy
         self.f_braking.legend.click_policy = self.f_speed.legend.click_policy
@@ -414,7 +420,6 @@ class RaceDiagram(object):
         self.sources_additional_laps.append(source)
 
     def update_fastest_laps_variance(self, laps):
-        # FIXME, many many data points, mayabe reduce by the amount of laps?
         variance, fastest_laps = gt7helper.get_variance_for_fastest_laps(laps)
         self.source_speed_variance.data = variance
         return fastest_laps
@@ -559,6 +564,72 @@ class RaceDiagram(object):
 
 
 
+# Columns streamed for the lap in progress and the lap channels they are taken from, distance is calculated
+LIVE_LAP_COLUMNS = {
+    "speed": "data_speed",
+    "throttle": "data_throttle",
+    "brake": "data_braking",
+    "coast": "data_coasting",
+    "tires": "data_tires",
+    "gear": "data_gear",
+    "rpm": "data_rpm",
+    "boost": "data_boost",
+    "yaw_rate": "data_absolute_yaw_rate_per_second",
+    "raceline_x": "data_position_x",
+    "raceline_z": "data_position_z",
+}
+
+# Number of samples the browser keeps of the live lap, 10 minutes of packets
+LIVE_LAP_ROLLOVER = 60 * 60 * 10
+
+
+class LiveLapStream:
+    """
+    Streams the lap in progress to a ColumnDataSource with Bokeh's stream().
+    Every update only sends the samples recorded since the previous update over the websocket.
+    """
+
+    def __init__(self, source: ColumnDataSource, rollover: int = LIVE_LAP_ROLLOVER):
+        self.source = source
+        self.rollover = rollover
+        self._lap = None
+        self._number_of_samples = 0
+
+    @staticmethod
+    def get_empty_data() -> dict:
+        return {column: [] for column in ["distance"] + list(LIVE_LAP_COLUMNS)}
+
+    def update(self, lap: Lap):
+        if lap is not self._lap:
+            # A new lap started, clear the samples of the previous one
+            self._lap = lap
+            self._number_of_samples = 0
+            self.source.data = self.get_empty_data()
+
+        # The lap is recorded on another thread, only stream ticks which are logged completely
+        number_of_samples = min(
+            len(getattr(lap, attribute)) for attribute in LIVE_LAP_COLUMNS.values()
+            if attribute not in DERIVED_CHANNEL_DTYPES
+        )
+        number_of_samples = min(number_of_samples, len(lap.data_ticks), get_number_of_derivable_samples(lap))
+        if number_of_samples <= self._number_of_samples:
+            return
+
+        start = self._number_of_samples
+        # Only the new samples are derived, not the derived channels of the whole lap
+        derived = derive_metrics_for_range(lap, start, number_of_samples)
+        new_data = {
+            column: derived[attribute] if attribute in DERIVED_CHANNEL_DTYPES
+            else np.asarray(getattr(lap, attribute))[start:number_of_samples]
+            for column, attribute in LIVE_LAP_COLUMNS.items()
+        }
+        # The distance axis of the lap is extended by the new samples only, see gt7helper.get_x_axis_for_distance
+        new_data["distance"] = gt7helper.get_x_axis_for_distance(lap)[start:number_of_samples]
+        self._number_of_samples = number_of_samples
+
+        self.source.stream(new_data, rollover=self.rollover)
+
+
 def add_annotations_to_race_line(
     race_line: figure, last_lap: Lap, reference_lap: Lap
 ):
@@ -3,7 +3,7 @@ from bokeh.models import Div
 from gt7dashboard import gt7helper
 
 SPEED_VARIANCE = f"""Displays the speed deviation of the fastest laps within a {gt7helper.DEFAULT_FASTEST_LAPS_PERCENT_THRESHOLD * 100}% time difference threshold of the fastest lap.
-Replay laps are ignored. The speed deviation is calculated as the standard deviation between these fastest laps.
+Replay laps are ignored. The speed deviation is calculated as the standard deviation between these fastest laps. It is computed every {gt7helper.SPEED_VARIANCE_RESOLUTION:.0f} meters up to the end of the shortest of these laps.
 
 With a perfect driver in an ideal world, this line would be flat. In a real world situation, you will get an almost flat line, 
 with bumps at the corners and long straights. This is where even your best laps deviate.
@@ -15,8 +15,9 @@ The list on the right hand side shows your best laps that are token into conside
 
 HEADER = """The red or green button reflects the current connection status to Gran Turismo 7. i.e. if there was a packet received successfully in the last second, the button will turn green.
 
-Next is a brief description of the last and reference lap. The reference lap can be selected on the right side."""
-RACE_LINE_MINI = """This is a race line map with the last lap (blue) and the reference lap (magenta). Zoom in for more details.
+Next is a brief description of the last and reference lap. The reference lap can be selected on the right side.
+The time difference of the lap in progress to the reference lap is shown next to it, it is updated with every tick. Red means slower, green means faster than the reference lap."""
+RACE_LINE_MINI = """This is a race line map with the last lap (blue), the reference lap (magenta) and the lap in progress (orange). Zoom in for more details.
 
 This map is helpful if you are using the index number of a graph to quickly determine where in the lap a measurement was taken.
 
@@ -26,6 +27,8 @@ MANUAL_CONTROLS = """'Log Lap Now' will log a lap now even you have not crossed
 The checkbox 'Record Replays' will allow you to record replays. Be careful since also background action before and after a time trial is counted as a replay. This is when a car drives on the track in the background of the menu.
 
 In the 'Best Lap' dropdown list you can select the reference lap. Usually this will point to the best lap of the session.
+
+Below are live indicators of the last seconds: the yaw rate of the last second, how fast the throttle was applied or released in the last second and its average, and the lowest and highest speed of the last 5 seconds.
 """
 
 TIME_DIFF = """ This is a graph for showing the relative time difference between the last lap and the reference lap.
@@ -34,8 +37,10 @@ Everything under the solid bar at 0 is slower than the reference lap. Everything
 If you see a bump in this graph to the top or the bottom this means that you were slower or faster at this point respectively.
 """
 LAP_CONTROLS = """You can reset all laps with the 'Reset Laps' button. This is helpful if you are switching tracks or cars in a session. Otherwise the different tracks will mix in the dashboard.
-'Save Laps' will save your recorded laps to a file. You can load the laps afterwards with the dropdown list to the right."""
-SPEED_DIAGRAM = """The total speed of the laps selected. This value is in km/h. or mph. depending on your in-game setting"""
+'Save Laps' will save your recorded laps to a file. You can load the laps afterwards with the dropdown list to the right.
+The dropdown list shows the newest lap files, by the date of their laps, with their car, number of laps and best lap. Type a car, file name or track fingerprint into the search field next to it to find older ones. Refresh Lap Files lists lap files added to the data folder while the dashboard is running.
+Saving and loading runs in the background, the dashboard stays live meanwhile. Its progress is shown next to the search field."""
+SPEED_DIAGRAM = """The total speed of the laps selected. This value is in km/h. or mph. depending on your in-game setting. The lap in progress is shown live in orange."""
 THROTTLE_DIAGRAM = """This is the amount of throttle pressure from 0% to 100% of the laps selected."""
 BRAKING_DIAGRAM = """This is the amount of braking pressure from 0% to 100% of the laps selected."""
 COASTING_DIAGRAM = """This is the amount of coasting from 0% to 100% of the laps selected. Coasting is when neither throttle nor brake are engaged."""
@@ -58,6 +63,9 @@ Car will hold the car name. You will have to have the `db/cars.csv` file downloa
 FUEL_MAP = """This fuel map will help to determine the fuel setting of your car. The game does not report the current fuel setting, so this map is relative.
 The current fuel setting will always be at 0. If you want to change the fuel to a leaner setting count downwards with the amount of steps left. For example: If you are at fuel setting 2 in the game and want to go to the games fuel setting 5, have a look at Fuel Lvl. 3 in this map.
 It will give you a raw assumption of the laps and time remaining and the assumed time difference in lap time for the new setting."""
+CONNECTION_STATISTICS = """Statistics of the connection to Gran Turismo 7 since the last reconnect. Lost packets never arrived, which points to a weak network such as WiFi.
+Packets dropped by this host arrived, but could not be processed in time or were left from before a reconnect, which points to an overloaded computer.
+Out of order, duplicated and undecryptable packets arrived but were dropped. Jitter is the time between two packets, which should be around 17 ms."""
 TUNING_INFO = """Here is some useful information you may use for tuning. Such as Max Speed and minimal body height in relation to the track. The later seems to be helpful when determining the possible body height."""
 
 RACE_LINE_BIG = """This is a race line map with the last lap (blue) and the reference lap (magenta). This diagram does also feature spead peaks (▴) and valleys (▾) as well as throttle, brake and coasting zones.
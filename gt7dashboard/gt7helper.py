@@ -1,4 +1,5 @@
 import csv
+import functools
 import itertools
 import json
 import logging
@@ -11,13 +12,15 @@ from pathlib import Path
 from statistics import StatisticsError
 from typing import Tuple, List
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from scipy.signal import find_peaks
 from tabulate import tabulate
 
-from gt7dashboard.gt7lap import Lap
-from gt7dashboard import gt7helper
+from gt7dashboard.gt7cache import lap_cache
+from gt7dashboard.gt7channel import Channel, ENGINEERING_CHANNELS
+from gt7dashboard.gt7lap import Lap, DERIVED_CHANNEL_DTYPES
 
 
 def calculate_remaining_fuel(
@@ -35,18 +38,100 @@ def calculate_remaining_fuel(
     return fuel_consumed_per_lap, laps_remaining, time_remaining
 
 
-def get_x_axis_for_distance(lap: Lap) -> List:
-    x_axis = []
-    tick_time = 16.668  # https://www.gtplanet.net/forum/threads/gt7-is-compatible-with-motion-rig.410728/post-13806131
-    for i, s in enumerate(lap.data_speed):
-        # distance traveled + (Speed in km/h / 3.6 / 1000 = mm / ms) * tick_time
-        if i == 0:
-            x_axis.append(0)
-            continue
+# Time between two ticks in ms, https://www.gtplanet.net/forum/threads/gt7-is-compatible-with-motion-rig.410728/post-13806131
+TICK_TIME_MS = 16.668
+
+# Gaps in package_id larger than this are not lost packets but pauses or a restarted game, they count as one tick
+MAX_TICK_GAP = 30
+
+
+def get_tick_delta(previous_package_id: int, package_id: int) -> int:
+    """
+    Returns the number of ticks passed between two packets.
+    A previous package id of 0 means there was no previous packet.
+    """
+    if previous_package_id <= 0:
+        return 1
+    delta = package_id - previous_package_id
+    if delta < 1 or delta > MAX_TICK_GAP:
+        return 1
+    return delta
+
+
+def _get_tick_delta_array(lap: Lap, start: int = 0) -> np.ndarray:
+    # Ticks passed before the data points from start on, see get_tick_deltas
+    number_of_samples = len(lap.data_speed)
+    data_ticks = getattr(lap, "data_ticks", [])
+    # The tick of a data point is logged before its speed, see GT7Communication._log_data
+    if len(data_ticks) < number_of_samples:
+        return np.ones(number_of_samples - start, dtype=np.int64)
+
+    ticks = np.asarray(data_ticks, dtype=np.int64)[max(start - 1, 0):number_of_samples]
+    deltas = np.diff(ticks, prepend=ticks[:1] - 1) if start == 0 else np.diff(ticks)
+    deltas[(deltas < 1) | (deltas > MAX_TICK_GAP)] = 1
+    return deltas
+
+
+def get_tick_deltas(lap: Lap) -> List[int]:
+    """
+    Returns the number of ticks passed before every data point of a lap.
+    Laps recorded without ticks assume one tick per data point.
+    """
+    return _get_tick_delta_array(lap).tolist()
+
 
-        x_axis.append(x_axis[i - 1] + (lap.data_speed[i] / 3.6 / 1000) * tick_time)
+def _get_distance_steps(speed: np.ndarray, tick_deltas: np.ndarray, interpolate_gaps: bool) -> np.ndarray:
+    # Distance from the data point before, speed starts with that data point and tick_deltas without it
+    missing_ticks = tick_deltas - 1
+    if interpolate_gaps:
+        missing_speed = missing_ticks * (speed[:-1] + speed[1:]) / 2
+    else:
+        missing_speed = missing_ticks * speed[1:]
+    # distance traveled + (Speed in km/h / 3.6 / 1000 = mm / ms) * tick_time
+    return ((speed[1:] + missing_speed) / 3.6 / 1000) * TICK_TIME_MS
 
-    return x_axis
+
+def get_x_axis_for_distance(lap: Lap, interpolate_gaps=True) -> np.ndarray:
+    """
+    Returns the distance travelled at every data point of a lap as read-only array.
+    Ticks of lost packets are counted with the speed of the next data point
+    or, if interpolate_gaps is set, with the mean speed of the data points around the gap.
+
+    The distance is kept in the lap cache, data points added while recording only extend it.
+    """
+    kind = "distance" if interpolate_gaps else "distance_without_interpolated_gaps"
+    return lap_cache.get(lap, kind, functools.partial(_get_distance, lap, interpolate_gaps))[3]
+
+
+def _get_distance(lap: Lap, interpolate_gaps: bool, previous: tuple = None) -> tuple:
+    # The distance with the speed and tick channels it was computed from, see get_x_axis_for_distance
+    data_speed = lap.data_speed
+    data_ticks = getattr(lap, "data_ticks", None)
+    number_of_samples = len(data_speed)
+    has_ticks = data_ticks is not None and len(data_ticks) >= number_of_samples
+
+    start = 0
+    distance = np.zeros(0)
+    if previous is not None:
+        previous_speed, previous_ticks, previous_has_ticks, previous_distance = previous
+        if previous_speed is data_speed and previous_ticks is data_ticks and previous_has_ticks == has_ticks \
+                and 0 < len(previous_distance) <= number_of_samples:
+            start = len(previous_distance)
+            distance = previous_distance
+
+    speed = np.asarray(data_speed, dtype=np.float64)[max(start - 1, 0):number_of_samples]
+    if start < number_of_samples:
+        steps = _get_distance_steps(speed, _get_tick_delta_array(lap, max(start, 1)), interpolate_gaps)
+        if start == 0:
+            # The first data point of a lap is at distance 0
+            steps = np.concatenate(([0.0], steps))
+        else:
+            steps[0] += distance[-1]
+        distance = np.concatenate((distance, np.cumsum(steps)))
+    # Shared by every caller
+    distance.flags.writeable = False
+
+    return data_speed, data_ticks, has_ticks, distance
 
 
 def get_x_axis_depending_on_mode(lap: Lap, distance_mode: bool):
@@ -59,53 +144,81 @@ def get_x_axis_depending_on_mode(lap: Lap, distance_mode: bool):
     pass
 
 
-def get_time_delta_dataframe_for_lap(lap: Lap, name: str) -> DataFrame:
-    lap_distance = get_x_axis_for_distance(lap)
-    lap_time = lap.data_time
+# Distance in meters between the points laps are compared at, see get_time_diffs_by_distance
+TIME_DIFF_RESOLUTION = 1.0
 
-    # Multiply to match datatype which is nanoseconds?
-    lap_time_ms = [convert_seconds_to_milliseconds(item) for item in lap_time]
 
-    series = pd.Series(
-        lap_distance, index=pd.TimedeltaIndex(data=lap_time_ms, unit="ms")
-    )
-
-    upsample = series.resample("10ms").asfreq()
-    interpolated_upsample = upsample.interpolate()
+def get_time_at_distance(lap: Lap, distance: np.ndarray) -> np.ndarray:
+    """
+    Returns the time in ms a lap took to travel every given distance, interpolated between its data points.
+    Distances beyond the end of the lap are NaN.
+    """
+    lap_distance = get_x_axis_for_distance(lap)
+    lap_time = lap_cache.get(lap, "time_ms", functools.partial(_get_time_ms, lap))
+    number_of_samples = min(len(lap_distance), len(lap_time))
+    if number_of_samples == 0:
+        return np.full(len(distance), np.nan)
+    return np.interp(distance, lap_distance[:number_of_samples], lap_time[:number_of_samples], right=np.nan)
 
-    # Make distance to index and time to value, because we want to join on distance
-    inverted = pd.Series(
-        interpolated_upsample.index.values, index=interpolated_upsample
-    )
 
-    # Flip around, we have to convert timedelta back to integer to do this
-    s1 = pd.Series(inverted.values.astype("int64"), name=name, index=inverted.index)
+def _get_time_ms(lap: Lap, previous: np.ndarray = None) -> np.ndarray:
+    # The time of every data point in ms, see get_time_at_distance
+    lap_time = np.asarray(lap.data_time, dtype=np.float64) * 1000
+    # Shared by every caller
+    lap_time.flags.writeable = False
+    return lap_time
 
-    df1 = DataFrame(data=s1)
-    # returns a dataframe where index is distance travelled and first data field is time passed
-    return df1
 
+def get_time_diffs_by_distance(
+        reference_lap: Lap, laps: List[Lap], resolution: float = TIME_DIFF_RESOLUTION
+) -> dict:
+    """
+    Compares laps to a reference lap on a common distance grid with a point every resolution meters.
+    Returns "distance" and "reference" of the grid as arrays, "comparison" and "timedelta" as arrays
+    with one row per lap. Times are in ms, a positive timedelta means the lap was slower than the reference.
+    """
+    reference_distance = get_x_axis_for_distance(reference_lap)
+    if len(reference_distance) > 0:
+        lap_length = reference_distance[-1]
+        distance = np.append(np.arange(0, lap_length, resolution), lap_length)
+    else:
+        distance = np.zeros(0)
 
-def calculate_time_diff_by_distance(
-        reference_lap: Lap, comparison_lap: Lap
-) -> DataFrame:
-    df1 = get_time_delta_dataframe_for_lap(reference_lap, "reference")
-    df2 = get_time_delta_dataframe_for_lap(comparison_lap, "comparison")
+    reference = get_time_at_distance(reference_lap, distance)
+    comparison = np.empty((len(laps), len(distance)))
+    for i, lap in enumerate(laps):
+        comparison[i] = get_time_at_distance(lap, distance)
 
-    df = df1.join(df2, how="outer").sort_index().interpolate()
+    return {
+        "distance": distance,
+        "reference": reference,
+        "comparison": comparison,
+        "timedelta": comparison - reference,
+    }
 
-    # After interpolation, we can make the index a normal field and rename it
-    df.reset_index(inplace=True)
-    df = df.rename(columns={"index": "distance"})
 
-    # Convert integer timestamps back to timestamp format
-    s_reference_timestamped = pd.to_timedelta(getattr(df, "reference"))
-    s_comparison_timestamped = pd.to_timedelta(getattr(df, "comparison"))
+def get_time_diff_by_distance(
+        reference_lap: Lap, comparison_lap: Lap, resolution: float = TIME_DIFF_RESOLUTION
+) -> dict:
+    """
+    Compares two laps like get_time_diffs_by_distance, every column is one array.
+    It can be used as data of a ColumnDataSource.
+    """
+    time_diffs = get_time_diffs_by_distance(reference_lap, [comparison_lap], resolution)
+    time_diffs["comparison"] = time_diffs["comparison"][0]
+    time_diffs["timedelta"] = time_diffs["timedelta"][0]
+    return time_diffs
 
-    df["reference"] = s_reference_timestamped
-    df["comparison"] = s_comparison_timestamped
 
-    df["timedelta"] = df["comparison"] - df["reference"]
+def calculate_time_diff_by_distance(
+        reference_lap: Lap, comparison_lap: Lap, resolution: float = TIME_DIFF_RESOLUTION
+) -> DataFrame:
+    """
+    Returns get_time_diff_by_distance as DataFrame with the times as timedeltas.
+    """
+    df = DataFrame(get_time_diff_by_distance(reference_lap, comparison_lap, resolution))
+    for column in ["reference", "comparison", "timedelta"]:
+        df[column] = pd.to_timedelta(df[column], unit="ms")
     return df
 
 
@@ -300,16 +413,37 @@ class LapFile:
         self.name = None
         self.path = None
         self.size = None
+        # Metadata of the laps, only known for lap files of the lap catalog
+        self.car_id = None
+        self.car_name = None
+        self.number_of_laps = None
+        self.best_lap_time = None
+        self.date = None
+        self.track_fingerprint = None
+        self.replay_laps = None
+        self.manual_laps = None
 
     def __str__(self):
-        return "%s - %s" % (self.name, human_readable_size(self.size, decimal_places=0))
+        if self.number_of_laps is None:
+            return "%s - %s" % (self.name, human_readable_size(self.size, decimal_places=0))
+
+        description = "%s - %s, %d laps" % (self.name, self.car_name or "Unknown car", self.number_of_laps)
+        if self.best_lap_time:
+            description += ", best %s" % seconds_to_lap_time(self.best_lap_time / 1000)
+        if self.replay_laps:
+            description += ", replay"
+        return description
+
+
+# Lap files listed in the dashboard, JSON and the binary format of gt7lapfile
+LAP_FILE_EXTENSIONS = (".json", ".gt7laps")
 
 
 def list_lap_files_from_path(root: str):
     lap_files = []
     for path, sub_dirs, files in os.walk(root):
         for name in files:
-            if name.endswith(".json"):
+            if name.endswith(LAP_FILE_EXTENSIONS):
                 lf = LapFile()
                 lf.name = name
                 lf.path = os.path.join(path, name)
@@ -325,50 +459,77 @@ def load_laps_from_pickle(path: str) -> List[Lap]:
         return pickle.load(f)
 
 
+def _json_default(o):
+    if isinstance(o, Channel):
+        if o.dtype.kind == "f":
+            # Shortest representation of the stored float32, 0.6 instead of 0.6000000238418579
+            return o.array.astype(str).astype(float).tolist()
+        return o.tolist()
+    return str(o)
+
+
+def get_channel_dtypes(lap: Lap) -> dict:
+    """
+    Returns the dtype of every channel attribute a lap can have,
+    including engineering channels and the derived channels stored by older versions.
+    """
+    channel_dtypes = dict(DERIVED_CHANNEL_DTYPES)
+    channel_dtypes.update({channel.attribute: channel.dtype for channel in ENGINEERING_CHANNELS})
+    channel_dtypes.update({key: value.dtype for key, value in lap.__dict__.items() if isinstance(value, Channel)})
+    return channel_dtypes
+
+
+def lap_from_dict(lap_data: dict) -> Lap:
+    """
+    Returns a lap with the attributes of a saved lap, timestamps and channels are converted back.
+    """
+    lap = Lap()
+    channel_dtypes = get_channel_dtypes(lap)
+    lap.__dict__.update(lap_data)
+    for key, value in lap_data.items():
+        if key.endswith('_timestamp') and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+            setattr(lap, key, value)
+        elif key in channel_dtypes and isinstance(value, list):
+            setattr(lap, key, Channel(channel_dtypes[key], value))
+    return lap
+
+
 def load_laps_from_json(json_file):
     with open(json_file, 'r') as file:
         data = json.load(file)
 
-    laps = []
-    for lap_data in data:
-        lap = Lap()
-        lap.__dict__.update(lap_data)
-        for key, value in lap_data.items():
-            if key.endswith('_timestamp') and isinstance(value, str):
-                value = datetime.fromisoformat(value)
-                setattr(lap, key, value)
-        laps.append(lap)
+    return [lap_from_dict(lap_data) for lap_data in data]
 
-    return laps
-
-def save_laps_to_pickle(laps: List[Lap]) -> str:
+def get_lap_file_storage_path(laps: List[Lap], extension: str) -> str:
+    """
+    Returns a path in the data folder for a new lap file, named after the current time and the car.
+    """
     storage_folder = "data"
     local_timezone = datetime.now(timezone.utc).astimezone().tzinfo
     dt = datetime.now(tz=local_timezone)
     str_date_time = dt.strftime("%Y-%m-%d_%H_%M_%S")
-    storage_filename = "%s_%s.laps" % (str_date_time, get_safe_filename(laps[0].car_name()))
+    storage_filename = "%s_%s%s" % (str_date_time, get_safe_filename(laps[0].car_name()), extension)
     Path(storage_folder).mkdir(parents=True, exist_ok=True)
 
-    path = os.path.join(os.getcwd(), storage_folder, storage_filename)
+    return os.path.join(os.getcwd(), storage_folder, storage_filename)
+
+
+def save_laps_to_pickle(laps: List[Lap], path: str = None) -> str:
+    if path is None:
+        path = get_lap_file_storage_path(laps, ".laps")
 
     with open(path, "wb") as f:
         pickle.dump(laps, f)
 
     return path
 
-def save_laps_to_json(laps: List[Lap]) -> str:
-
-    storage_folder = "data"
-    local_timezone = datetime.now(timezone.utc).astimezone().tzinfo
-    dt = datetime.now(tz=local_timezone)
-    str_date_time = dt.strftime("%Y-%m-%d_%H_%M_%S")
-    storage_filename = "%s_%s.json" % (str_date_time, get_safe_filename(laps[0].car_name()))
-    Path(storage_folder).mkdir(parents=True, exist_ok=True)
-
-    path = os.path.join(os.getcwd(), storage_folder, storage_filename)
+def save_laps_to_json(laps: List[Lap], path: str = None) -> str:
+    if path is None:
+        path = get_lap_file_storage_path(laps, ".json")
 
     with open(path, "w") as f:
-        json.dump([ob.__dict__ for ob in laps], f, default=str)
+        json.dump([ob.__dict__ for ob in laps], f, default=_json_default)
 
     return path
 
@@ -444,7 +605,7 @@ def get_median_lap(laps: List[Lap]) -> Lap:
         if isinstance(getattr(laps[0], val), datetime):
             continue
 
-        if isinstance(getattr(laps[0], val), list):
+        if isinstance(getattr(laps[0], val), (list, Channel)):
             median_attribute = [
                 none_ignoring_median(k)
                 for k in itertools.zip_longest(*attributes, fillvalue=None)
@@ -540,47 +701,39 @@ RACE_LINE_THROTTLE_MODE = "RACE_LINE_THROTTLE_MODE"
 RACE_LINE_COASTING_MODE = "RACE_LINE_COASTING_MODE"
 
 
-def get_race_line_coordinates_when_mode_is_active(lap: Lap, mode: str):
-    return_y = []
-    return_x = []
-    return_z = []
-
-    for i, _ in enumerate(lap.data_braking):
-
-        if mode == RACE_LINE_BRAKING_MODE:
-
-            if lap.data_braking[i] > lap.data_throttle[i]:
-                return_y.append(lap.data_position_y[i])
-                return_x.append(lap.data_position_x[i])
-                return_z.append(lap.data_position_z[i])
-            else:
-                return_y.append("NaN")
-                return_x.append("NaN")
-                return_z.append("NaN")
-
-        elif mode == RACE_LINE_THROTTLE_MODE:
-
-            if lap.data_braking[i] < lap.data_throttle[i]:
-                return_y.append(lap.data_position_y[i])
-                return_x.append(lap.data_position_x[i])
-                return_z.append(lap.data_position_z[i])
-            else:
-                return_y.append("NaN")
-                return_x.append("NaN")
-                return_z.append("NaN")
-
-        if mode == RACE_LINE_COASTING_MODE:
+def get_race_lines(lap: Lap) -> dict:
+    """
+    Returns the race line of a lap for every race line mode as y, x and z float arrays,
+    with NaN at the data points the mode is not active.
+    All modes are computed in one vectorised pass and kept in the lap cache.
+    """
+    return lap_cache.get(lap, "race_lines", functools.partial(_get_race_lines, lap))
+
+
+def _get_race_lines(lap: Lap, previous: dict = None) -> dict:
+    number_of_samples = len(lap.data_braking)
+    channels = (lap.data_braking, lap.data_throttle, lap.data_position_y, lap.data_position_x, lap.data_position_z)
+    braking, throttle, y, x, z = (np.asarray(channel, dtype=np.float64)[:number_of_samples] for channel in channels)
+    positions = np.array([y, x, z])
+    masks = {
+        RACE_LINE_THROTTLE_MODE: braking < throttle,
+        RACE_LINE_BRAKING_MODE: braking > throttle,
+        RACE_LINE_COASTING_MODE: (braking == 0) & (throttle == 0),
+    }
+    race_lines = {}
+    for mode, mask in masks.items():
+        race_line = np.where(mask, positions, np.nan)
+        # Shared by every caller
+        race_line.flags.writeable = False
+        race_lines[mode] = tuple(race_line)
+    return race_lines
 
-            if lap.data_braking[i] == 0 and lap.data_throttle[i] == 0:
-                return_y.append(lap.data_position_y[i])
-                return_x.append(lap.data_position_x[i])
-                return_z.append(lap.data_position_z[i])
-            else:
-                return_y.append("NaN")
-                return_x.append("NaN")
-                return_z.append("NaN")
 
-    return return_y, return_x, return_z
+def get_race_line_coordinates_when_mode_is_active(lap: Lap, mode: str):
+    """
+    Returns the y, x and z coordinates of the race line of a lap, NaN where mode is not active.
+    """
+    return get_race_lines(lap)[mode]
 
 
 CARS_CSV_FILENAME = "db/cars.csv"
@@ -719,26 +872,36 @@ def get_variance_for_fastest_laps(laps: List[Lap], number_of_laps: int = 3, perc
     return variance, fastest_laps
 
 
-def get_variance_for_laps(laps: List[Lap]) -> DataFrame:
+# Distance in meters between the points the speed deviation of laps is computed at, see get_variance_for_laps
+SPEED_VARIANCE_RESOLUTION = 5.0
+
+
+def get_variance_for_laps(laps: List[Lap], resolution: float = SPEED_VARIANCE_RESOLUTION) -> DataFrame:
+    """
+    Returns the standard deviation of the speed of laps as "distance" and "speed_variance",
+    with a point every resolution meters up to the end of the shortest lap. Laps without data are ignored.
+    """
+    laps = [lap for lap in laps if len(lap.data_speed) > 0]
+    if len(laps) == 0:
+        return DataFrame({"distance": [], "speed_variance": []})
 
-    dataframe_distance_columns = []
-    merged_df = pd.DataFrame(columns=['distance'])
-    for lap in laps:
-        d = {'speed': lap.data_speed, 'distance' : gt7helper.get_x_axis_for_distance(lap)}
-        df = pd.DataFrame(data=d)
-        dataframe_distance_columns.append(df)
-        merged_df = pd.merge(merged_df, df, on='distance', how='outer')
+    lap_distances = [get_x_axis_for_distance(lap) for lap in laps]
+    shortest_lap_length = min(lap_distance[-1] for lap_distance in lap_distances)
+    distance = np.append(np.arange(0, shortest_lap_length, resolution), shortest_lap_length)
 
-    merged_df = merged_df.sort_values(by='distance')
-    merged_df = merged_df.set_index('distance')
+    # One row per lap with its speed at every point of the grid
+    speeds = np.empty((len(laps), len(distance)))
+    for i, (lap, lap_distance) in enumerate(zip(laps, lap_distances)):
+        speeds[i] = np.interp(distance, lap_distance, np.asarray(lap.data_speed, dtype=np.float64))
+
+    if len(laps) > 1:
+        speed_variance = speeds.std(axis=0, ddof=1)
+    else:
+        # Like the sample standard deviation of a single value
+        speed_variance = np.full(len(distance), np.nan)
 
-    # Interpolate missing values
-    merged_df = merged_df.interpolate()
-    dbs_df = merged_df.std(axis=1).abs()
-    dbs_df = dbs_df.reset_index().rename(columns={'index': 'distance'})
-    dbs_df.columns = ["distance", "speed_variance"]
+    return DataFrame({"distance": distance, "speed_variance": speed_variance})
 
-    return dbs_df
 
 PEAK = "PEAK"
 VALLEY = "VALLEY"
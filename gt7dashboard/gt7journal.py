@@ -0,0 +1,135 @@
+import glob
+import logging
+import os
+import struct
+import zlib
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+from gt7dashboard import gt7lapfile
+from gt7dashboard.gt7lap import Lap
+
+# A journal starts with a header of magic and version followed by one record per finished lap.
+# Each record is the length and CRC32 of its data and the lap in the lap file format.
+JOURNAL_MAGIC = b"GT7JRNL"
+JOURNAL_VERSION = 1
+JOURNAL_HEADER = struct.Struct("<7sH")
+RECORD_HEADER = struct.Struct("<QI")
+JOURNAL_EXTENSION = ".gt7journal"
+
+logger = logging.getLogger(__name__)
+
+
+class JournalFormatError(Exception):
+    pass
+
+
+def _check_header(header: bytes, path: str):
+    if len(header) < JOURNAL_HEADER.size:
+        raise JournalFormatError("%s is too short to be a journal" % path)
+    magic, version = JOURNAL_HEADER.unpack(header)
+    if magic != JOURNAL_MAGIC:
+        raise JournalFormatError("%s is not a journal" % path)
+    if version != JOURNAL_VERSION:
+        raise JournalFormatError("%s has unsupported journal version %d" % (path, version))
+
+
+def get_journal_path(folder: str) -> str:
+    return os.path.join(folder, datetime.now().strftime("%Y-%m-%d_%H_%M_%S_%f") + JOURNAL_EXTENSION)
+
+
+class SessionJournal:
+    """
+    Appends every finished lap of a session to a journal, so laps survive a crash of the dashboard.
+    Appending costs only the new lap, every record is synced to disk before append_lap returns.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.number_of_laps = 0
+
+        is_new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new_file:
+            with open(path, "rb") as f:
+                _check_header(f.read(JOURNAL_HEADER.size), path)
+            self.number_of_laps = len(read_journal(path))
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "ab")
+        if is_new_file:
+            self._write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def append_lap(self, lap: Lap):
+        data = gt7lapfile.encode_laps([lap])
+        self._write(RECORD_HEADER.pack(len(data), zlib.crc32(data)) + data)
+        self.number_of_laps += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_journal(path: str) -> List[Lap]:
+    """
+    Returns the laps of a journal in the order they were finished.
+    A record cut off or damaged at the end of the journal, e.g. after a crash, is ignored.
+    """
+    with open(path, "rb") as f:
+        _check_header(f.read(JOURNAL_HEADER.size), path)
+        laps = []
+        while True:
+            record_header = f.read(RECORD_HEADER.size)
+            if len(record_header) < RECORD_HEADER.size:
+                return laps
+            length, crc = RECORD_HEADER.unpack(record_header)
+            data = f.read(length)
+            if len(data) < length or zlib.crc32(data) != crc:
+                logger.warning("Ignoring damaged record at the end of journal %s" % path)
+                return laps
+            # A writable buffer, so channels of restored laps can be extended
+            laps.extend(gt7lapfile.decode_laps(np.frombuffer(bytearray(data), dtype=np.uint8), path))
+
+
+def compact_journal(path: str) -> Optional[str]:
+    """
+    Saves the laps of a journal as lap file next to it, newest lap first like GT7Communication.laps,
+    and removes the journal. Returns the path of the lap file, None if the journal had no laps.
+    """
+    laps = read_journal(path)
+    lap_file_path = None
+    if laps:
+        lap_file_path = path[:-len(JOURNAL_EXTENSION)] + gt7lapfile.LAP_FILE_EXTENSION
+        # Written completely before the journal is removed, so a crash in between loses nothing
+        gt7lapfile.save_laps_to_lap_file(list(reversed(laps)), lap_file_path)
+    os.remove(path)
+    return lap_file_path
+
+
+def restore_journals(folder: str) -> List[Lap]:
+    """
+    Compacts the journals left in folder by sessions which did not close, e.g. after a crash.
+    Returns the laps of the most recent of them, newest lap first, to continue that session.
+    """
+    laps = []
+    for path in sorted(glob.glob(os.path.join(folder, "*" + JOURNAL_EXTENSION))):
+        try:
+            lap_file_path = compact_journal(path)
+        except Exception as e:
+            logger.warning("Could not restore journal %s: %s" % (path, e))
+            continue
+        logger.info("Restored journal %s to %s" % (path, lap_file_path))
+        if lap_file_path:
+            laps = gt7lapfile.load_laps_from_lap_file(lap_file_path)
+    return laps
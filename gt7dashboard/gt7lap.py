@@ -1,8 +1,156 @@
 from datetime import datetime
+from typing import List
+
+import numpy as np
+
 from gt7dashboard import gt7helper
+from gt7dashboard.gt7cache import lap_cache
+from gt7dashboard.gt7channel import Channel, RecordedChannel, DEFAULT_CHANNELS, ENGINEERING_CHANNELS
+
+# Channels derived from the recorded channels of a lap, see Lap.get_derived_metrics
+DERIVED_CHANNEL_DTYPES = {
+    "data_coasting": np.uint8,
+    "data_tires": np.float32,
+    "data_absolute_yaw_rate_per_second": np.float32,
+}
+
+# The yaw rate is the difference to the yaw of one second before, 1 second has 60 ticks
+YAW_RATE_INTERVAL = 60
+
+TYRES = ["fl", "fr", "rl", "rr"]
+
+
+class DerivedMetric:
+    """
+    Metric of a lap computed from its recorded channels when first read, see Lap.get_derived_metrics.
+    A value assigned to it, e.g. when loading a lap file of an older version, is returned instead.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, lap, owner=None):
+        if lap is None:
+            return self
+        if self.name in lap.__dict__:
+            return lap.__dict__[self.name]
+        return lap.get_derived_metrics()[self.name]
+
+    def __set__(self, lap, value):
+        lap.__dict__[self.name] = value
+
+    def __delete__(self, lap):
+        del lap.__dict__[self.name]
+
+
+# Recorded channels the metrics are derived from
+DERIVED_FROM_CHANNELS = (
+    ["data_throttle", "data_braking", "data_speed", "data_rotation_yaw"]
+    + ["data_tyre_temp_" + tyre for tyre in TYRES]
+    + ["data_tyre_speed_" + tyre for tyre in TYRES]
+)
+
+
+def _get_values(lap, attribute: str, start: int, stop: int) -> np.ndarray:
+    values = np.asarray(getattr(lap, attribute, []))[start:stop].astype(np.float64)
+    if len(values) < stop - start:
+        # Channels which were not recorded, e.g. in laps of older versions, count as 0
+        values = np.concatenate([values, np.zeros(stop - start - len(values))])
+    return values
+
+
+def get_number_of_derivable_samples(lap) -> int:
+    """
+    Returns the number of data points the metrics of a lap are derived for.
+    A tick which GT7Communication._log_data is logging on another thread is left out until it appended data_time,
+    the last channel of a tick. Laps without ticks, e.g. of older versions, are derived for all data points.
+    """
+    if len(lap.data_ticks) > 0:
+        return min(len(lap.data_time), len(lap.data_speed))
+    return len(lap.data_speed)
+
+
+def derive_metrics_for_range(lap, start: int, stop: int) -> dict:
+    """
+    Computes the derived channels of the data points start to stop of a lap and the ticks aggregated over them,
+    vectorised over these data points.
+    """
+    throttle = _get_values(lap, "data_throttle", start, stop)
+    brake = _get_values(lap, "data_braking", start, stop)
+    speed = _get_values(lap, "data_speed", start, stop)
+
+    coasting = (brake == 0) & (throttle == 0)
+
+    tyre_temps = np.array([_get_values(lap, "data_tyre_temp_" + tyre, start, stop) for tyre in TYRES])
+    tires_overheated = np.any(tyre_temps > 100, axis=0)
+
+    delta_divisor = np.where(speed == 0, 1, speed)
+    tyre_deltas = np.array(
+        [_get_values(lap, "data_tyre_speed_" + tyre, start, stop) for tyre in TYRES]
+    ) / delta_divisor
+    tires_spinning = np.any(tyre_deltas > 1.1, axis=0)
+
+    # The difference to the yaw of YAW_RATE_INTERVAL - 1 data points before, the first second is zero
+    yaw_start = max(start - YAW_RATE_INTERVAL + 1, 0)
+    rotation_yaw = _get_values(lap, "data_rotation_yaw", yaw_start, stop)
+    yaw_rate_per_second = np.zeros(stop - start)
+    first = max(start, YAW_RATE_INTERVAL)
+    if first < stop:
+        yaw_rate_per_second[first - start:] = (
+                rotation_yaw[first - yaw_start:] - rotation_yaw[first - yaw_start - YAW_RATE_INTERVAL + 1:stop - yaw_start - YAW_RATE_INTERVAL + 1]
+        )
+
+    return {
+        "throttle_and_brake_ticks": int(np.count_nonzero((brake > 0) & (throttle > 0))),
+        "no_throttle_and_no_brake_ticks": int(np.count_nonzero(coasting)),
+        "full_brake_ticks": int(np.count_nonzero(brake == 100)),
+        "full_throttle_ticks": int(np.count_nonzero(throttle == 100)),
+        "tires_overheated_ticks": int(np.count_nonzero(tires_overheated)),
+        "tires_spinning_ticks": int(np.count_nonzero(tires_spinning)),
+        "data_coasting": coasting.astype(DERIVED_CHANNEL_DTYPES["data_coasting"]),
+        "data_tires": tyre_deltas.sum(axis=0).astype(DERIVED_CHANNEL_DTYPES["data_tires"]),
+        "data_absolute_yaw_rate_per_second": np.abs(yaw_rate_per_second).astype(
+            DERIVED_CHANNEL_DTYPES["data_absolute_yaw_rate_per_second"]
+        ),
+    }
+
+
+def derive_metrics(lap, previous: dict = None) -> dict:
+    """
+    Computes the derived channels and aggregated ticks of a lap from its recorded channels.
+    previous are the metrics of the lap derived before data points were added, only the added ones are derived then.
+    """
+    number_of_samples = get_number_of_derivable_samples(lap)
+    start = len(previous["data_coasting"]) if previous is not None else 0
+    if start > number_of_samples:
+        previous = None
+        start = 0
+
+    metrics = derive_metrics_for_range(lap, start, number_of_samples)
+    for key, value in metrics.items():
+        if key in DERIVED_CHANNEL_DTYPES:
+            if previous is not None:
+                # New channels, previous metrics might still be in use
+                value = np.concatenate([np.asarray(previous[key]), value])
+            metrics[key] = Channel.from_array(value)
+        elif previous is not None:
+            metrics[key] = previous[key] + value
+    return metrics
 
 
 class Lap:
+    # Aggregated number of instances where condition is true
+    throttle_and_brake_ticks = DerivedMetric()
+    no_throttle_and_no_brake_ticks = DerivedMetric()
+    full_brake_ticks = DerivedMetric()
+    full_throttle_ticks = DerivedMetric()
+    tires_overheated_ticks = DerivedMetric()
+    tires_spinning_ticks = DerivedMetric()
+    # Data points derived from the recorded channels
+    data_coasting = DerivedMetric()
+    data_tires = DerivedMetric()
+    data_absolute_yaw_rate_per_second = DerivedMetric()
+
     def __init__(self):
         # Nice title for lap
         self.title = ""
@@ -16,35 +164,17 @@ class Lap:
         self.total_laps = 0
         # Number of current lap
         self.number = 0
-        # Aggregated number of instances where condition is true
-        self.throttle_and_brake_ticks = 0
-        self.no_throttle_and_no_brake_ticks = 0
-        self.full_brake_ticks = 0
-        self.full_throttle_ticks = 0
-        self.tires_overheated_ticks = 0
-        self.tires_spinning_ticks = 0
-        # Data points with value for every tick
-        self.data_throttle = []
-        self.data_braking = []
-        self.data_coasting = []
-        self.data_speed = []
-        self.data_time = []
-        self.data_rpm = []
-        self.data_gear = []
-        self.data_tires = []
-        # Positions on x,y,z
-        self.data_position_x = []
-        self.data_position_y = []
-        self.data_position_z = []
+        # Data points with value for every tick, such as data_speed and data_throttle
+        self.add_channels(DEFAULT_CHANNELS)
+        # Data points derived by GT7Communication._log_data
+        self.data_time = Channel(np.float32)
+        # Tick of every data point since the start of the lap, derived from package_id.
+        # Gaps between consecutive ticks are packets lost on the network.
+        self.data_ticks = Channel(np.int32)
         # Fuel
         self.fuel_at_start = 0
         self.fuel_at_end = -1
         self.fuel_consumed = -1
-        # Boost
-        self.data_boost = []
-        # Yaw Rate
-        self.data_rotation_yaw = []
-        self.data_absolute_yaw_rate_per_second = []
         # Car
         self.car_id = 0
 
@@ -65,6 +195,34 @@ class Lap:
             self.no_throttle_and_no_brake_ticks,
         )
 
+    def get_derived_metrics(self) -> dict:
+        """
+        Returns the derived metrics of the lap, such as data_coasting and full_throttle_ticks.
+        They are computed for the whole lap when first read and cached in the lap cache until data points are added,
+        so they are not saved with the lap. For a lap in progress only the added data points are derived.
+        """
+        if len(self.data_ticks) > len(self.data_time):
+            # A tick is being logged on another thread, it is left out and the result is not cached
+            return derive_metrics(self)
+
+        sources = tuple(id(getattr(self, attribute, None)) for attribute in DERIVED_FROM_CHANNELS)
+
+        def compute(previous):
+            # Only extended if no channel was replaced since
+            if previous is not None and previous[0] == sources:
+                return sources, derive_metrics(self, previous[1])
+            return sources, derive_metrics(self)
+
+        return lap_cache.get(self, "derived_metrics", compute)[1]
+
+    def add_channels(self, channels: List[RecordedChannel]):
+        """
+        Adds an empty channel for every recorded channel the lap does not have yet.
+        """
+        for channel in channels:
+            if not hasattr(self, channel.attribute):
+                setattr(self, channel.attribute, Channel(channel.dtype))
+
     def format(self):
         return "Lap %2d, %s (%d Ticks)" % (
             self.number,
@@ -78,7 +236,7 @@ class Lap:
             peak_speed_data_y,
             valley_speed_data_x,
             valley_speed_data_y,
-        ) = gt7helper.get_speed_peaks_and_valleys(self)
+        ) = lap_cache.get(self, "speed_peaks_and_valleys", lambda previous: gt7helper.get_speed_peaks_and_valleys(self))
 
         return (
             peak_speed_data_x,
@@ -94,26 +252,35 @@ class Lap:
         return gt7helper.get_car_name_for_car_id(self.car_id)
 
     def get_data_dict(self, distance_mode=True) -> dict[str, list]:
+        """
+        Returns the channels of the lap as columns for a Bokeh ColumnDataSource.
+        It is computed once per version of the lap and shared by all figures and sessions, see gt7cache.
+        """
+        kind = "data_dict" if distance_mode else "data_dict_by_ticks"
+        # A copy, so callers can add columns without changing the cached dict
+        return dict(lap_cache.get(self, kind, lambda previous: self._compute_data_dict(distance_mode)))
 
-        raceline_y_throttle, raceline_x_throttle, raceline_z_throttle = gt7helper.get_race_line_coordinates_when_mode_is_active(self, mode=gt7helper.RACE_LINE_THROTTLE_MODE)
-        raceline_y_braking, raceline_x_braking, raceline_z_braking = gt7helper.get_race_line_coordinates_when_mode_is_active(self, mode=gt7helper.RACE_LINE_BRAKING_MODE)
-        raceline_y_coasting, raceline_x_coasting, raceline_z_coasting = gt7helper.get_race_line_coordinates_when_mode_is_active(self, mode=gt7helper.RACE_LINE_COASTING_MODE)
+    def _compute_data_dict(self, distance_mode: bool) -> dict[str, list]:
+        race_lines = gt7helper.get_race_lines(self)
+        raceline_y_throttle, raceline_x_throttle, raceline_z_throttle = race_lines[gt7helper.RACE_LINE_THROTTLE_MODE]
+        raceline_y_braking, raceline_x_braking, raceline_z_braking = race_lines[gt7helper.RACE_LINE_BRAKING_MODE]
+        raceline_y_coasting, raceline_x_coasting, raceline_z_coasting = race_lines[gt7helper.RACE_LINE_COASTING_MODE]
 
         data = {
-            "throttle": self.data_throttle,
-            "brake": self.data_braking,
-            "speed": self.data_speed,
-            "time": self.data_time,
-            "tires": self.data_tires,
-            "rpm": self.data_rpm,
-            "boost": self.data_boost,
-            "yaw_rate": self.data_absolute_yaw_rate_per_second,
-            "gear": self.data_gear,
-            "ticks": list(range(len(self.data_speed))),
-            "coast": self.data_coasting,
-            "raceline_y": self.data_position_y,
-            "raceline_x": self.data_position_x,
-            "raceline_z": self.data_position_z,
+            "throttle": np.asarray(self.data_throttle),
+            "brake": np.asarray(self.data_braking),
+            "speed": np.asarray(self.data_speed),
+            "time": np.asarray(self.data_time),
+            "tires": np.asarray(self.data_tires),
+            "rpm": np.asarray(self.data_rpm),
+            "boost": np.asarray(self.data_boost),
+            "yaw_rate": np.asarray(self.data_absolute_yaw_rate_per_second),
+            "gear": np.asarray(self.data_gear),
+            "ticks": np.arange(len(self.data_speed)),
+            "coast": np.asarray(self.data_coasting),
+            "raceline_y": np.asarray(self.data_position_y),
+            "raceline_x": np.asarray(self.data_position_x),
+            "raceline_z": np.asarray(self.data_position_z),
             # For a raceline when throttle is engaged
             "raceline_y_throttle": raceline_y_throttle,
             "raceline_x_throttle": raceline_x_throttle,
@@ -130,4 +297,10 @@ class Lap:
             "distance": gt7helper.get_x_axis_depending_on_mode(self, distance_mode),
         }
 
+        # Engineering channels are only there if they were recorded for the whole lap
+        for channel in ENGINEERING_CHANNELS:
+            values = getattr(self, channel.attribute, None)
+            if values is not None and len(values) == len(self.data_speed):
+                data[channel.name] = np.asarray(values)
+
         return data
@@ -0,0 +1,175 @@
+import json
+import os
+import struct
+from typing import List
+
+import numpy as np
+
+from gt7dashboard import gt7helper
+from gt7dashboard.gt7channel import Channel
+from gt7dashboard.gt7lap import Lap
+
+# A lap file starts with a header of magic, version and the length of the metadata.
+# The metadata is JSON with the attributes of every lap and the location of its channels.
+# The values of every channel follow as one contiguous little-endian array.
+LAP_FILE_MAGIC = b"GT7LAPS"
+LAP_FILE_VERSION = 1
+LAP_FILE_HEADER = struct.Struct("<7sHQ")
+LAP_FILE_EXTENSION = ".gt7laps"
+
+# Channels start at multiples of this, so memory-mapped arrays are aligned for every dtype
+CHANNEL_ALIGNMENT = 64
+
+
+class LapFileFormatError(Exception):
+    pass
+
+
+def _align(offset: int) -> int:
+    return -(-offset // CHANNEL_ALIGNMENT) * CHANNEL_ALIGNMENT
+
+
+def _is_channel(key: str, value) -> bool:
+    return key.startswith("data_") and isinstance(value, (Channel, list, np.ndarray))
+
+
+def encode_laps(laps: List[Lap]) -> bytes:
+    """
+    Returns the laps in the lap file format.
+    """
+    metadata = []
+    arrays = []
+    offset = 0
+    for lap in laps:
+        channel_dtypes = gt7helper.get_channel_dtypes(lap)
+        attributes = {}
+        channels = {}
+        for key, value in vars(lap).items():
+            if not _is_channel(key, value):
+                attributes[key] = value
+                continue
+            if isinstance(value, list):
+                # Lists of median laps may contain None, it is stored as NaN
+                dtype = np.float64 if None in value else channel_dtypes.get(key, np.float64)
+            else:
+                dtype = value.dtype
+            array = np.asarray(value, dtype=np.dtype(dtype).newbyteorder("<"))
+            offset = _align(offset)
+            channels[key] = {"dtype": array.dtype.str, "offset": offset, "length": len(array)}
+            arrays.append((offset, array))
+            offset += array.nbytes
+        metadata.append({"attributes": attributes, "channels": channels})
+
+    encoded_metadata = json.dumps(metadata, default=str).encode("utf-8")
+    data_start = _align(LAP_FILE_HEADER.size + len(encoded_metadata))
+
+    buffer = bytearray(data_start + offset)
+    LAP_FILE_HEADER.pack_into(buffer, 0, LAP_FILE_MAGIC, LAP_FILE_VERSION, len(encoded_metadata))
+    buffer[LAP_FILE_HEADER.size:LAP_FILE_HEADER.size + len(encoded_metadata)] = encoded_metadata
+    for array_offset, array in arrays:
+        start = data_start + array_offset
+        buffer[start:start + array.nbytes] = array.tobytes()
+    return bytes(buffer)
+
+
+def decode_laps(data: np.ndarray, name: str = "buffer") -> List[Lap]:
+    """
+    Returns the laps of data in the lap file format, a uint8 array. Channels are views of data.
+    name is used in error messages.
+    """
+    if len(data) < LAP_FILE_HEADER.size:
+        raise LapFileFormatError("%s is too short to be a lap file" % name)
+    magic, version, metadata_length = LAP_FILE_HEADER.unpack(data[:LAP_FILE_HEADER.size].tobytes())
+    if magic != LAP_FILE_MAGIC:
+        raise LapFileFormatError("%s is not a lap file" % name)
+    if version != LAP_FILE_VERSION:
+        raise LapFileFormatError("%s has unsupported lap file version %d" % (name, version))
+    metadata_end = LAP_FILE_HEADER.size + metadata_length
+    if len(data) < metadata_end:
+        raise LapFileFormatError("%s is cut off" % name)
+    metadata = json.loads(data[LAP_FILE_HEADER.size:metadata_end].tobytes().decode("utf-8"))
+    data_start = _align(metadata_end)
+
+    laps = []
+    for lap_metadata in metadata:
+        lap = gt7helper.lap_from_dict(lap_metadata["attributes"])
+        for key, channel in lap_metadata["channels"].items():
+            dtype = np.dtype(channel["dtype"])
+            start = data_start + channel["offset"]
+            end = start + channel["length"] * dtype.itemsize
+            if channel["length"] == 0:
+                array = np.empty(0, dtype=dtype)
+            elif end > len(data):
+                raise LapFileFormatError("%s is cut off" % name)
+            else:
+                array = data[start:end].view(dtype)
+            setattr(lap, key, Channel.from_array(array))
+        laps.append(lap)
+
+    return laps
+
+
+def save_laps_to_lap_file(laps: List[Lap], path: str):
+    """
+    Saves laps as lap file. The file is replaced only when written completely, so laps memory-mapped
+    from the file before, e.g. when saving laps loaded from it, keep their data.
+    """
+    data = encode_laps(laps)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+def load_laps_from_lap_file(path: str) -> List[Lap]:
+    """
+    Loads the laps of a lap file. Only the metadata is read, channels are memory-mapped
+    and read from disk when they are accessed. Changes to the channels are not written back.
+    """
+    if os.path.getsize(path) < LAP_FILE_HEADER.size:
+        raise LapFileFormatError("%s is too short to be a lap file" % path)
+    # Copy on write, so channels of loaded laps can be changed without changing the file.
+    # The plain ndarray view keeps the mapping open as long as a channel uses it.
+    data = np.memmap(path, dtype=np.uint8, mode="c").view(np.ndarray)
+    return decode_laps(data, path)
+
+
+def save_laps_to_binary(laps: List[Lap]) -> str:
+    """
+    Saves laps as lap file in the data folder and returns its path.
+    """
+    path = gt7helper.get_lap_file_storage_path(laps, LAP_FILE_EXTENSION)
+    save_laps_to_lap_file(laps, path)
+    return path
+
+
+def load_laps_from_file(path: str) -> List[Lap]:
+    """
+    Loads laps of a lap file, JSON or pickle file depending on its extension.
+    """
+    if path.endswith(LAP_FILE_EXTENSION):
+        return load_laps_from_lap_file(path)
+    if path.endswith(".json"):
+        return gt7helper.load_laps_from_json(path)
+    return gt7helper.load_laps_from_pickle(path)
+
+
+def save_laps_to_file(laps: List[Lap], path: str):
+    """
+    Saves laps as lap file, JSON or pickle file depending on the extension of path.
+    """
+    if path.endswith(LAP_FILE_EXTENSION):
+        save_laps_to_lap_file(laps, path)
+    elif path.endswith(".json"):
+        gt7helper.save_laps_to_json(laps, path)
+    else:
+        gt7helper.save_laps_to_pickle(laps, path)
+
+
+def convert_lap_file(source_path: str, destination_path: str):
+    """
+    Converts between lap files, JSON and pickle files, the formats are chosen by the extensions.
+    """
+    save_laps_to_file(load_laps_from_file(source_path), destination_path)
@@ -0,0 +1,146 @@
+from typing import List
+
+import numpy as np
+
+from gt7dashboard.gt7capture import read_capture
+from gt7dashboard.gt7channel import DEFAULT_CHANNELS, RecordedChannel
+from gt7dashboard.gt7communication import FIELD_CONVERSIONS, PACKET_FIELDS, PACKET_SIZE, salsa20_dec_batch
+from gt7dashboard.gt7helper import MAX_TICK_GAP
+from gt7dashboard.gt7lap import Lap
+
+_NUMPY_FORMATS = {"f": "<f4", "i": "<i4", "h": "<i2", "H": "<u2", "B": "u1"}
+
+# Mirrors the offsets of PACKET_FIELDS, so a buffer of decrypted packets
+# can be viewed as one structured array without copying
+PACKET_DTYPE = np.dtype(
+    {
+        "names": [name for name, _, _ in PACKET_FIELDS],
+        "formats": [_NUMPY_FORMATS[field_format] for _, _, field_format in PACKET_FIELDS],
+        "offsets": [offset for _, offset, _ in PACKET_FIELDS],
+        "itemsize": PACKET_SIZE,
+    }
+)
+
+
+def packets_from_buffer(buffer) -> np.ndarray:
+    """
+    Returns a structured array view on a buffer of concatenated decrypted packets.
+    Columns such as packets["car_speed"] are views into the buffer and are not copied.
+    """
+    return np.frombuffer(buffer, dtype=PACKET_DTYPE)
+
+
+def packets_from_list(ddatas: List[bytes]) -> np.ndarray:
+    """
+    Returns a structured array of a list of decrypted packets.
+    The packets are joined into one buffer first, this is the only copy.
+    """
+    return packets_from_buffer(b"".join(bytes(ddata[:PACKET_SIZE]) for ddata in ddatas))
+
+
+def packets_from_capture(path: str) -> np.ndarray:
+    """
+    Decrypts all datagrams of a capture file and returns them as a structured array.
+    Datagrams which could not be decrypted are left out.
+    """
+    return packets_from_buffer(salsa20_dec_batch([data for _, data in read_capture(path)]))
+
+
+def get_recordable_packets(packets: np.ndarray, always_record_data=False) -> np.ndarray:
+    """
+    Returns the packets GT7Communication would record, which are packets in a race that are not paused
+    """
+    is_paused = (packets["flags"] & 0b10) != 0
+    in_race = (packets["flags"] & 0b01) != 0
+    if always_record_data:
+        return packets[~is_paused]
+    return packets[in_race & ~is_paused]
+
+
+def split_packets_by_lap(packets: np.ndarray) -> List[np.ndarray]:
+    """
+    Splits packets into one array per lap number. The arrays are views on the given packets.
+    """
+    if len(packets) == 0:
+        return []
+    lap_starts = np.flatnonzero(np.diff(packets["current_lap"])) + 1
+    return np.split(packets, lap_starts)
+
+
+# Raw fields which GTData does not expose with their raw value, time_on_track is a timedelta there
+_NOT_GTDATA_ATTRIBUTES = {"flags", "gears", "time_on_track"} | {name for name in PACKET_DTYPE.names if name.startswith("wheel_rps_")}
+
+
+class _PacketColumns:
+    """
+    Returns the columns of packets as attributes, for FIELD_CONVERSIONS.
+    Floats are converted to float64 like the Python floats of GTData, so the results are the same.
+    """
+
+    __slots__ = ("_packets",)
+
+    def __init__(self, packets: np.ndarray):
+        self._packets = packets
+
+    def __getattr__(self, name):
+        column = self._packets[name]
+        if column.dtype.kind == "f":
+            return column.astype(np.float64)
+        return column
+
+
+def get_packet_values(packets: np.ndarray, source: str) -> np.ndarray:
+    """
+    Returns the values of the GTData attribute source for all packets at once, e.g. for a RecordedChannel.
+    """
+    if source in FIELD_CONVERSIONS:
+        return FIELD_CONVERSIONS[source](_PacketColumns(packets))
+    if source in PACKET_DTYPE.names and source not in _NOT_GTDATA_ATTRIBUTES:
+        return getattr(_PacketColumns(packets), source)
+    raise ValueError("%s can not be read from many packets at once" % source)
+
+
+def lap_from_packets(
+        packets: np.ndarray,
+        lap: Lap = None,
+        previous_package_id: int = 0,
+        special_packet_time: float = 0,
+        channels: List[RecordedChannel] = DEFAULT_CHANNELS,
+) -> Lap:
+    """
+    Fills the channels of a lap with the given packets in one vectorized pass.
+    The result matches a lap recorded tick by tick with GT7Communication._log_data.
+    previous_package_id is the package id of the packet logged before the given packets, 0 if there was none.
+    special_packet_time is Session.special_packet_time in ms while the packets were logged.
+    channels are the recorded channels to fill, like GT7Communication.recorded_channels.
+    Their transforms get all values at once. Derived metrics such as data_coasting are computed by the lap when read.
+    """
+    if lap is None:
+        lap = Lap()
+
+    number_of_packets = len(packets)
+    if number_of_packets == 0:
+        return lap
+
+    # Ticks passed since the previous packet, see gt7helper.get_tick_delta
+    tick_deltas = np.diff(packets["package_id"].astype(np.int64), prepend=previous_package_id)
+    tick_deltas[(tick_deltas < 1) | (tick_deltas > MAX_TICK_GAP)] = 1
+    if previous_package_id <= 0:
+        tick_deltas[0] = 1
+    ticks = lap.lap_ticks + np.cumsum(tick_deltas)
+    lap.lap_ticks = int(ticks[-1])
+    data_time = ticks / 60. - special_packet_time / 1000.
+    lap.lap_live_time = float(data_time[-1])
+
+    lap.add_channels(channels)
+    for channel in channels:
+        values = get_packet_values(packets, channel.source)
+        if channel.transform is not None:
+            values = channel.transform(values)
+        getattr(lap, channel.attribute).extend(values)
+    lap.data_time.extend(data_time)
+    lap.data_ticks.extend(ticks)
+
+    lap.car_id = int(packets["car_id"][-1])
+
+    return lap
@@ -0,0 +1,110 @@
+from collections import deque
+from threading import Condition
+from typing import Any, Optional, Tuple, Union
+
+
+class PacketRingBuffer:
+    """
+    Preallocated ring buffer of datagrams between one receiving and one processing thread.
+
+    The receiving thread receives straight into a free slot and commits it.
+    The processing thread peeks at the oldest slot and releases it when done.
+    If all slots are taken, the datagram is dropped and counted as an overflow,
+    so a slow processing thread never blocks receiving.
+
+    The receiving thread can also commit markers, e.g. when the connection was reset, which peek returns in order.
+    A marker can discard the datagrams committed before it, when they became stale.
+    """
+
+    def __init__(self, capacity: int = 1024, slot_size: int = 4096):
+        self.capacity = capacity
+        self.slot_size = slot_size
+
+        self._buffer = bytearray(capacity * slot_size)
+        view = memoryview(self._buffer)
+        self._slots = [view[i * slot_size:(i + 1) * slot_size] for i in range(capacity)]
+        self._lengths = [0] * capacity
+        self._timestamps = [0.0] * capacity
+        # Scratch slot to receive datagrams into that are dropped
+        self.overflow_slot = memoryview(bytearray(slot_size))
+
+        # Both are counting up, the difference is the number of filled slots
+        self._head = 0
+        self._tail = 0
+        self._condition = Condition()
+        # Markers with the head they were committed at and whether to discard up to it, oldest first
+        self._markers = deque()
+
+        # Number of datagrams committed to the buffer
+        self.received = 0
+        # Number of datagrams dropped because the buffer was full
+        self.overflows = 0
+        # Number of datagrams discarded because a marker was committed after them
+        self.discarded = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def write_slot(self) -> Optional[memoryview]:
+        """
+        Returns the next free slot to receive a datagram into or None if the buffer is full.
+        """
+        if self._head - self._tail >= self.capacity:
+            return None
+        return self._slots[self._head % self.capacity]
+
+    def commit(self, length: int, timestamp: float):
+        """
+        Commits the datagram received into the slot of write_slot.
+        """
+        index = self._head % self.capacity
+        self._lengths[index] = length
+        self._timestamps[index] = timestamp
+        with self._condition:
+            self._head += 1
+            self.received += 1
+            self._condition.notify()
+
+    def overflow(self):
+        """
+        Counts a datagram that was dropped because write_slot returned None.
+        """
+        self.overflows += 1
+
+    def commit_marker(self, marker: Any, discard: bool = False):
+        """
+        Commits a marker, peek returns it after the datagrams committed before.
+        If discard is True, these datagrams are discarded instead.
+        """
+        with self._condition:
+            self._markers.append((self._head, marker, discard))
+            self._condition.notify()
+
+    def peek(self, timeout: float = None) -> Optional[Union[Tuple[memoryview, float], Any]]:
+        """
+        Waits for the oldest datagram and returns it with its receive timestamp.
+        The datagram is a view into the buffer and stays valid until release is called.
+        A marker is returned as it is and must not be released.
+        Returns None on timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._head != self._tail or self._markers, timeout):
+                return None
+            if self._markers:
+                head, marker, discard = self._markers[0]
+                # A datagram peeked before the marker was committed might have been released already
+                if discard and head > self._tail:
+                    self.discarded += head - self._tail
+                    self._tail = head
+                if head <= self._tail:
+                    self._markers.popleft()
+                    return marker
+        index = self._tail % self.capacity
+        return self._slots[index][:self._lengths[index]], self._timestamps[index]
+
+    def release(self):
+        """
+        Frees the slot of the datagram returned by peek.
+        """
+        with self._condition:
+            self._tail += 1
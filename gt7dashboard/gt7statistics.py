@@ -0,0 +1,142 @@
+import bisect
+import collections
+import time
+
+# Upper bounds of the inter-arrival time histogram in ms, packets are expected every 16.7 ms
+INTER_ARRIVAL_BINS_MS = [2, 5, 10, 14, 16, 18, 20, 25, 33, 50, 100, 250, 1000, float("inf")]
+
+# A heartbeat shows an effect when it is answered by a packet,
+# this is only measurable if no packets were received for this long before the heartbeat
+HEARTBEAT_IDLE_SECONDS = 1
+
+
+class ConnectionStatistics:
+    """
+    Statistics of one connection to the PlayStation.
+    Tells apart packets lost on the network from packets dropped by this host.
+    """
+
+    def __init__(self):
+        self.connected_at = time.time()
+
+        self.packets_received = 0
+        self.packets_processed = 0
+        # Gaps in package_id, these packets never arrived
+        self.packets_lost = 0
+        # Packets dropped by this host because the ring buffer was full, they cause gaps in package_id as well
+        self.packets_overflowed = 0
+        self._unaccounted_overflows = 0
+        # Packets arriving after a newer one, they are dropped
+        self.packets_out_of_order = 0
+        self.packets_duplicated = 0
+        self.decrypt_failures = 0
+
+        self.inter_arrival_histogram = [0] * len(INTER_ARRIVAL_BINS_MS)
+        self.inter_arrival_max_ms = 0
+        self._inter_arrival_sum_ms = 0
+        self._last_arrival = None
+
+        self.heartbeats_sent = 0
+        # Seconds from sending a heartbeat to receiving the first packet after it
+        self.heartbeat_latencies = collections.deque(maxlen=20)
+        self._pending_heartbeat = None
+
+    def record_datagram(self, timestamp: float):
+        """
+        Records the arrival of a datagram at its receive timestamp.
+        """
+        self.packets_received += 1
+
+        if self._pending_heartbeat is not None and timestamp >= self._pending_heartbeat:
+            self.heartbeat_latencies.append(timestamp - self._pending_heartbeat)
+            self._pending_heartbeat = None
+
+        if self._last_arrival is not None:
+            inter_arrival_ms = (timestamp - self._last_arrival) * 1000
+            self.inter_arrival_histogram[bisect.bisect_left(INTER_ARRIVAL_BINS_MS, inter_arrival_ms)] += 1
+            self._inter_arrival_sum_ms += inter_arrival_ms
+            if inter_arrival_ms > self.inter_arrival_max_ms:
+                self.inter_arrival_max_ms = inter_arrival_ms
+        self._last_arrival = timestamp
+
+    def record_decrypt_failure(self):
+        self.decrypt_failures += 1
+
+    def record_overflows(self, count: int):
+        """
+        Records packets dropped because the ring buffer was full, so the gap they leave is not counted as lost.
+        """
+        self.packets_overflowed += count
+        self._unaccounted_overflows += count
+
+    def record_package_id(self, package_id: int, previous_package_id: int) -> bool:
+        """
+        Records the package id of a decrypted packet.
+        Returns True if the packet is newer than the previous packet.
+        A previous package id of 0 means there was no previous packet.
+        """
+        if previous_package_id > 0:
+            if package_id == previous_package_id:
+                self.packets_duplicated += 1
+                return False
+            if package_id < previous_package_id:
+                self.packets_out_of_order += 1
+                return False
+            gap = package_id - previous_package_id - 1
+            overflowed = min(gap, self._unaccounted_overflows)
+            self._unaccounted_overflows -= overflowed
+            self.packets_lost += gap - overflowed
+
+        self.packets_processed += 1
+        return True
+
+    def record_heartbeat(self, timestamp: float):
+        self.heartbeats_sent += 1
+        idle = self._last_arrival is None or timestamp - self._last_arrival >= HEARTBEAT_IDLE_SECONDS
+        if idle and self._pending_heartbeat is None:
+            self._pending_heartbeat = timestamp
+
+    def get_loss_rate(self) -> float:
+        expected = self.packets_processed + self.packets_lost
+        if expected == 0:
+            return 0
+        return self.packets_lost / expected
+
+    def get_inter_arrival_mean_ms(self) -> float:
+        number_of_intervals = sum(self.inter_arrival_histogram)
+        if number_of_intervals == 0:
+            return 0
+        return self._inter_arrival_sum_ms / number_of_intervals
+
+    def get_inter_arrival_percentile_ms(self, percentile: float) -> float:
+        """
+        Returns the upper bound of the histogram bin the percentile of inter-arrival times falls into.
+        """
+        number_of_intervals = sum(self.inter_arrival_histogram)
+        if number_of_intervals == 0:
+            return 0
+        rank = percentile / 100 * number_of_intervals
+        count = 0
+        for upper_bound, bin_count in zip(INTER_ARRIVAL_BINS_MS, self.inter_arrival_histogram):
+            count += bin_count
+            if count >= rank:
+                return min(upper_bound, self.inter_arrival_max_ms)
+        return self.inter_arrival_max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "packets_received": self.packets_received,
+            "packets_processed": self.packets_processed,
+            "packets_lost": self.packets_lost,
+            "packets_overflowed": self.packets_overflowed,
+            "packets_out_of_order": self.packets_out_of_order,
+            "packets_duplicated": self.packets_duplicated,
+            "decrypt_failures": self.decrypt_failures,
+            "loss_rate": self.get_loss_rate(),
+            "inter_arrival_mean_ms": self.get_inter_arrival_mean_ms(),
+            "inter_arrival_p95_ms": self.get_inter_arrival_percentile_ms(95),
+            "inter_arrival_max_ms": self.inter_arrival_max_ms,
+            "inter_arrival_histogram": dict(zip(INTER_ARRIVAL_BINS_MS, self.inter_arrival_histogram)),
+            "heartbeats_sent": self.heartbeats_sent,
+            "heartbeat_latencies": list(self.heartbeat_latencies),
+        }
@@ -0,0 +1,156 @@
+import collections
+import operator
+
+# Ticks of the windows of the live indicators, 1 second has 60 ticks
+YAW_RATE_WINDOW = 60
+THROTTLE_WINDOW = 60
+SPEED_WINDOW = 5 * 60
+
+
+class RollingWindow:
+    """
+    The last values of a channel in a fixed-size circular buffer.
+    Appending and all statistics take constant time, amortised for the maximum and minimum.
+    """
+
+    def __init__(self, size: int, track_extremes=False):
+        if size < 1:
+            raise ValueError("size of a rolling window must be at least 1")
+        self.size = size
+        self._values = [0.0] * size
+        # Position the next value is written to
+        self._index = 0
+        self._count = 0
+        self._sum = 0.0
+        # Number of values appended so far, it identifies values in the extreme queues
+        self._appended = 0
+        self._track_extremes = track_extremes
+        # Candidates for the maximum and minimum as (number, value), the first one is the current extreme
+        self._max_candidates = collections.deque()
+        self._min_candidates = collections.deque()
+
+    def __len__(self):
+        return self._count
+
+    def is_full(self) -> bool:
+        return self._count == self.size
+
+    def append(self, value: float):
+        if self._count == self.size:
+            self._sum -= self._values[self._index]
+        else:
+            self._count += 1
+        self._values[self._index] = value
+        self._sum += value
+        self._index += 1
+        if self._index == self.size:
+            self._index = 0
+            # Avoids the sum drifting from subtracting floats, costs O(size) once every size values
+            self._sum = sum(self._values)
+
+        if self._track_extremes:
+            self._update_candidates(self._max_candidates, value, operator.le)
+            self._update_candidates(self._min_candidates, value, operator.ge)
+        self._appended += 1
+
+    def _update_candidates(self, candidates: collections.deque, value: float, is_dominated):
+        # Values which can never be the extreme again are dropped, so the queue stays sorted
+        while candidates and is_dominated(candidates[-1][1], value):
+            candidates.pop()
+        candidates.append((self._appended, value))
+        if candidates[0][0] <= self._appended - self.size:
+            candidates.popleft()
+
+    def clear(self):
+        self.__init__(self.size, self._track_extremes)
+
+    def get_newest(self) -> float:
+        if self._count == 0:
+            return 0
+        return self._values[self._index - 1]
+
+    def get_oldest(self) -> float:
+        if self._count < self.size:
+            return self._values[0]
+        return self._values[self._index]
+
+    def get_difference(self) -> float:
+        """
+        Returns the difference from the oldest to the newest value, 0 until the window is full.
+        """
+        if self._count < self.size:
+            return 0
+        return self.get_newest() - self.get_oldest()
+
+    def get_mean(self) -> float:
+        if self._count == 0:
+            return 0
+        return self._sum / self._count
+
+    def get_max(self) -> float:
+        if not self._track_extremes:
+            raise ValueError("rolling window does not track extremes")
+        if self._count == 0:
+            return 0
+        return self._max_candidates[0][1]
+
+    def get_min(self) -> float:
+        if not self._track_extremes:
+            raise ValueError("rolling window does not track extremes")
+        if self._count == 0:
+            return 0
+        return self._min_candidates[0][1]
+
+
+class LiveIndicators:
+    """
+    Indicators of the last seconds of driving, updated by GT7Communication with every recorded tick.
+    """
+
+    def __init__(self):
+        self._yaw = RollingWindow(YAW_RATE_WINDOW)
+        self._throttle = RollingWindow(THROTTLE_WINDOW)
+        self._speed = RollingWindow(SPEED_WINDOW, track_extremes=True)
+
+    def update(self, rotation_yaw: float, throttle: float, car_speed: float):
+        self._yaw.append(rotation_yaw)
+        self._throttle.append(throttle)
+        self._speed.append(car_speed)
+
+    def clear(self):
+        self._yaw.clear()
+        self._throttle.clear()
+        self._speed.clear()
+
+    @property
+    def yaw_rate_per_second(self) -> float:
+        # Like data_absolute_yaw_rate_per_second of the lap
+        return abs(self._yaw.get_difference())
+
+    @property
+    def throttle_application_per_second(self) -> float:
+        """
+        Change of the throttle in the last second in %, negative when lifting.
+        """
+        return self._throttle.get_difference()
+
+    @property
+    def average_throttle(self) -> float:
+        return self._throttle.get_mean()
+
+    @property
+    def max_speed(self) -> float:
+        return self._speed.get_max()
+
+    @property
+    def min_speed(self) -> float:
+        return self._speed.get_min()
+
+    def to_dict(self) -> dict:
+        return {
+            "yaw_rate_per_second": self.yaw_rate_per_second,
+            "throttle_application_per_second": self.throttle_application_per_second,
+            "average_throttle": self.average_throttle,
+            "max_speed": self.max_speed,
+            "min_speed": self.min_speed,
+        }
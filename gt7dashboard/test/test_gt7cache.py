@@ -0,0 +1,113 @@
+import gc
+import unittest
+
+import numpy as np
+
+from gt7dashboard import gt7helper
+from gt7dashboard.gt7cache import LapCache, get_size, lap_cache
+from gt7dashboard.gt7channel import Channel
+from gt7dashboard.gt7lap import Lap
+
+
+def get_lap(number_of_samples: int) -> Lap:
+    lap = Lap()
+    lap.data_speed = list(range(number_of_samples))
+    return lap
+
+
+class TestLapCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = LapCache(max_bytes=10000)
+        self.computed = []
+
+    def compute(self, lap):
+        def compute(previous):
+            self.computed.append(previous)
+            return np.zeros(len(lap.data_speed))
+        return compute
+
+    def test_get_is_cached(self):
+        lap = get_lap(10)
+        value = self.cache.get(lap, "zeros", self.compute(lap))
+        self.assertIs(value, self.cache.get(lap, "zeros", self.compute(lap)))
+        self.assertEqual([None], self.computed)
+        self.assertEqual(1, self.cache.hits)
+        self.assertEqual(1, self.cache.misses)
+        self.assertEqual(80, self.cache.size)
+
+        # Other kinds and laps are cached separately
+        self.cache.get(lap, "more zeros", self.compute(lap))
+        other_lap = get_lap(10)
+        self.cache.get(other_lap, "zeros", self.compute(other_lap))
+        self.assertEqual(3, len(self.cache))
+
+    def test_changed_lap_is_computed_again(self):
+        lap = get_lap(10)
+        value = self.cache.get(lap, "zeros", self.compute(lap))
+
+        lap.data_speed.append(10)
+        self.assertEqual(11, len(self.cache.get(lap, "zeros", self.compute(lap))))
+        lap.data_throttle = [0] * 11
+        self.cache.get(lap, "zeros", self.compute(lap))
+
+        # The value of the older version is passed to be extended
+        self.assertIs(value, self.computed[1])
+        self.assertEqual(3, len(self.computed))
+        self.assertEqual(88, self.cache.size)
+
+    def test_least_recently_used_are_evicted(self):
+        laps = [get_lap(500) for _ in range(3)]
+        self.cache.get(laps[0], "zeros", self.compute(laps[0]))
+        self.cache.get(laps[1], "zeros", self.compute(laps[1]))
+        self.cache.get(laps[0], "zeros", self.compute(laps[0]))
+        self.cache.get(laps[2], "zeros", self.compute(laps[2]))
+
+        self.assertEqual(2, len(self.cache))
+        self.assertLessEqual(self.cache.size, self.cache.max_bytes)
+        self.cache.get(laps[0], "zeros", self.compute(laps[0]))
+        self.assertEqual(3, len(self.computed))
+        self.cache.get(laps[1], "zeros", self.compute(laps[1]))
+        self.assertEqual(4, len(self.computed))
+
+    def test_too_large_values_are_not_cached(self):
+        lap = get_lap(2000)
+        self.cache.get(lap, "zeros", self.compute(lap))
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(0, self.cache.size)
+
+    def test_collected_laps_are_removed(self):
+        lap = get_lap(10)
+        self.cache.get(lap, "zeros", self.compute(lap))
+        del lap
+        gc.collect()
+        self.assertEqual(0, len(self.cache))
+        self.assertEqual(0, self.cache.size)
+
+    def test_get_size(self):
+        # Arrays, three numbers in a tuple, an empty list in a tuple and the dict
+        self.assertEqual(80 + 4 * 64 + 2 * 64 + 64, get_size({"a": np.zeros(10), "b": (1, 2, 3), "c": ([],)}))
+        # Only the values of a channel, not its unused capacity
+        channel = Channel(np.float32, [1, 2, 3])
+        self.assertEqual(12 + 64, get_size(channel))
+
+
+class TestLapDataDict(unittest.TestCase):
+    def setUp(self):
+        self.lap = gt7helper.load_laps_from_json("test_data/broad_bean_raceway_time_trial_4laps.json")[0]
+
+    def test_data_dict_is_shared(self):
+        hits = lap_cache.hits
+        data = self.lap.get_data_dict()
+        self.assertEqual(data.keys(), self.lap.get_data_dict().keys())
+        self.assertGreater(lap_cache.hits, hits)
+        self.assertIs(data["distance"], self.lap.get_data_dict()["distance"])
+
+        # Columns added by callers do not change the cached dict
+        data["extra"] = []
+        self.assertNotIn("extra", self.lap.get_data_dict())
+
+    def test_data_dict_of_changed_lap(self):
+        data = self.lap.get_data_dict()
+        self.lap.data_speed.append(100)
+        self.assertEqual(len(data["speed"]) + 1, len(self.lap.get_data_dict()["speed"]))
+        self.assertEqual(len(data["ticks"]) + 1, len(self.lap.get_data_dict(distance_mode=False)["distance"]))
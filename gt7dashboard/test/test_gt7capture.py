@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+import unittest
+
+from gt7dashboard import gt7capture, gt7communication
+from gt7dashboard.test.test_gt7communication import get_test_lap_datagrams
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "session.gt7cap")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_write_and_read_capture(self):
+        with gt7capture.CaptureWriter(self.path) as writer:
+            writer.write(b"first", 1.5)
+            writer.write(b"second", 2.5)
+
+        # Appending to an existing capture keeps the records
+        with gt7capture.CaptureWriter(self.path) as writer:
+            writer.write(b"third", 3.5)
+
+        records = list(gt7capture.read_capture(self.path))
+        self.assertEqual([(1.5, b"first"), (2.5, b"second"), (3.5, b"third")], records)
+
+    def test_read_capture_ignores_cut_off_record(self):
+        with gt7capture.CaptureWriter(self.path) as writer:
+            writer.write(b"first", 1.5)
+            writer.write(b"second", 2.5)
+
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 2)
+
+        self.assertEqual([(1.5, b"first")], list(gt7capture.read_capture(self.path)))
+
+    def test_read_capture_of_wrong_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"[{}]     ")
+
+        with self.assertRaises(gt7capture.CaptureFormatError):
+            list(gt7capture.read_capture(self.path))
+
+        with self.assertRaises(gt7capture.CaptureFormatError):
+            gt7capture.CaptureWriter(self.path)
+
+    def test_stop_writes_complete_capture(self):
+        datagrams = get_test_lap_datagrams(number_of_ticks=50)
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        gt7comm.start_capture(self.path)
+        for i, datagram in enumerate(datagrams):
+            gt7comm._record_datagram(datagram, 1000 + i / 60)
+        gt7comm.stop()
+
+        records = list(gt7capture.read_capture(self.path))
+        self.assertEqual(len(datagrams), len(records))
+        self.assertEqual([bytes(datagram) for datagram in datagrams], [data for timestamp, data in records])
+
+    def test_replay_capture(self):
+        with gt7capture.CaptureWriter(self.path) as writer:
+            for i, datagram in enumerate(get_test_lap_datagrams(number_of_ticks=100)):
+                writer.write(datagram, 1000 + i / 60)
+
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        gt7comm.replay(self.path, speed=0)
+
+        self.assertEqual(1, len(gt7comm.laps))
+        self.assertEqual(100, len(gt7comm.laps[0].data_speed))
+        self.assertEqual(1, len(gt7comm.current_lap.data_speed))
+        self.assertEqual(101, gt7comm.last_data.package_id)
+
+    def test_replay_capture_in_real_time(self):
+        with gt7capture.CaptureWriter(self.path) as writer:
+            for i, datagram in enumerate(get_test_lap_datagrams(number_of_ticks=10)):
+                writer.write(datagram, 1000 + i / 60)
+
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        start = time.time()
+        gt7comm.replay(self.path, speed=2)
+        # 10 ticks of 1/60 s at double speed
+        self.assertGreaterEqual(time.time() - start, 10 / 60 / 2)
+        self.assertEqual(1, len(gt7comm.laps))
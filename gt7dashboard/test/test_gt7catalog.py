@@ -0,0 +1,126 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from gt7dashboard import gt7catalog, gt7helper, gt7lapfile
+from gt7dashboard.gt7lap import Lap
+
+TEST_LAPS_JSON = "test_data/broad_bean_raceway_time_trial_4laps.json"
+
+
+class TestLapCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+        self.json_path = os.path.join(self.root, "2023-01-01_broad_bean.json")
+        shutil.copy(TEST_LAPS_JSON, self.json_path)
+        self.catalog = gt7catalog.LapCatalog(self.root)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_update_reads_only_new_and_changed_files(self):
+        self.assertEqual(1, self.catalog.update())
+        self.assertEqual(0, self.catalog.update())
+
+        binary_path = os.path.join(self.root, "sub", "2024-01-01_session.gt7laps")
+        os.makedirs(os.path.dirname(binary_path))
+        laps = gt7helper.load_laps_from_json(TEST_LAPS_JSON)
+        gt7lapfile.save_laps_to_lap_file(laps, binary_path)
+        self.assertEqual(1, self.catalog.update())
+
+        gt7lapfile.save_laps_to_lap_file(laps[:2], binary_path)
+        os.utime(binary_path, (1, 1))
+        self.assertEqual(1, self.catalog.update())
+        # Laps of the same date, the JSON file was modified last
+        self.assertEqual([self.json_path, binary_path], [lap_file.path for lap_file in self.catalog.get_lap_files()])
+        self.assertEqual(2, self.catalog.get_lap_files()[1].number_of_laps)
+
+        os.remove(self.json_path)
+        self.assertEqual(0, self.catalog.update())
+        self.assertEqual(1, len(self.catalog.get_lap_files()))
+
+    def test_newest_lap_files_first(self):
+        laps = gt7helper.load_laps_from_json(TEST_LAPS_JSON)
+        # Laps of the same date as the JSON file, the file modified last comes first
+        copy_path = os.path.join(self.root, "2000-01-01_copy.gt7laps")
+        gt7lapfile.save_laps_to_lap_file(laps, copy_path)
+        # Sorted by the date of the laps, not by the name
+        for lap in laps:
+            lap.lap_start_timestamp = lap.lap_start_timestamp.replace(year=2030)
+        newest_path = os.path.join(self.root, "1999-01-01_session.gt7laps")
+        gt7lapfile.save_laps_to_lap_file(laps, newest_path)
+        self.catalog.update()
+
+        self.assertEqual([newest_path, copy_path, self.json_path],
+                         [lap_file.path for lap_file in self.catalog.get_lap_files()])
+
+    def test_concurrent_updates_read_files_once(self):
+        add_lap_file = self.catalog.add_lap_file
+
+        def slow_add_lap_file(path, laps=None):
+            time.sleep(0.1)
+            add_lap_file(path, laps)
+
+        results = []
+        with mock.patch.object(self.catalog, "add_lap_file", side_effect=slow_add_lap_file):
+            threads = [threading.Thread(target=lambda: results.append(self.catalog.update())) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual([0, 1], sorted(results))
+
+    def test_metadata(self):
+        self.catalog.update()
+        laps = gt7helper.load_laps_from_json(TEST_LAPS_JSON)
+        best_lap = gt7helper.get_best_lap(laps)
+
+        lap_file = self.catalog.get_lap_files()[0]
+        self.assertEqual("2023-01-01_broad_bean.json", lap_file.name)
+        self.assertEqual(os.path.getsize(self.json_path), lap_file.size)
+        self.assertEqual(4, lap_file.number_of_laps)
+        self.assertEqual(best_lap.lap_finish_time, lap_file.best_lap_time)
+        self.assertEqual(laps[0].car_id, lap_file.car_id)
+        self.assertEqual(gt7catalog.get_track_fingerprint(best_lap), lap_file.track_fingerprint)
+        self.assertEqual(laps[0].lap_start_timestamp.isoformat(), lap_file.date)
+        self.assertEqual(0, lap_file.replay_laps)
+        self.assertIn("4 laps", str(lap_file))
+
+    def test_catalog_persists(self):
+        self.catalog.update()
+        catalog = gt7catalog.LapCatalog(self.root)
+        self.assertEqual(0, catalog.update())
+        self.assertEqual(1, len(catalog.get_lap_files()))
+
+    def test_search(self):
+        self.catalog.update()
+        lap = Lap()
+        lap.car_id = 1448
+        lap.is_replay = True
+        saved_path = os.path.join(self.root, "replay.gt7laps")
+        gt7lapfile.save_laps_to_lap_file([lap], saved_path)
+        self.catalog.add_lap_file(saved_path, [lap])
+
+        self.assertEqual(2, len(self.catalog.get_lap_files()))
+        self.assertEqual(1, len(self.catalog.get_lap_files(limit=1)))
+        self.assertEqual([saved_path], [lap_file.path for lap_file in self.catalog.get_lap_files("replay")])
+        self.assertEqual(1, self.catalog.get_lap_files("replay")[0].replay_laps)
+        car_name = gt7helper.get_car_name_for_car_id(1448)
+        self.assertEqual([saved_path], [lap_file.path for lap_file in self.catalog.get_lap_files(car_name)])
+
+        fingerprint = self.catalog.get_lap_files("broad")[0].track_fingerprint
+        self.assertNotEqual("", fingerprint)
+        self.assertEqual([self.json_path], [lap_file.path for lap_file in self.catalog.get_lap_files(fingerprint)])
+
+    def test_unreadable_lap_file(self):
+        with open(os.path.join(self.root, "broken.gt7laps"), "wb") as f:
+            f.write(b"broken")
+        self.assertEqual(2, self.catalog.update())
+        self.assertEqual(0, self.catalog.update())
+        self.assertEqual(0, self.catalog.get_lap_files("broken")[0].number_of_laps)
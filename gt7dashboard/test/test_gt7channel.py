@@ -0,0 +1,60 @@
+import copy
+import pickle
+import unittest
+
+import numpy as np
+
+from gt7dashboard.gt7channel import Channel, MIN_CAPACITY
+
+
+class TestChannel(unittest.TestCase):
+    def test_append_and_list_access(self):
+        channel = Channel(np.float32)
+        for i in range(MIN_CAPACITY * 3):
+            channel.append(i / 2)
+
+        self.assertEqual(MIN_CAPACITY * 3, len(channel))
+        self.assertEqual(1.5, channel[3])
+        self.assertEqual((MIN_CAPACITY * 3 - 1) / 2, channel[-1])
+        self.assertListEqual([0, 0.5, 1], channel[:3])
+        self.assertEqual(sum(i / 2 for i in range(MIN_CAPACITY * 3)), sum(channel))
+        self.assertIsInstance(channel[0], float)
+        with self.assertRaises(IndexError):
+            channel[MIN_CAPACITY * 3]
+
+    def test_extend(self):
+        channel = Channel(np.uint8, [1, 2])
+        channel.extend([3, 4])
+        channel.extend(np.array([5, 6]))
+        self.assertListEqual([1, 2, 3, 4, 5, 6], channel.tolist())
+        self.assertEqual(np.uint8, channel.dtype)
+
+    def test_array_is_a_view(self):
+        channel = Channel(np.float32, [1, 2, 3])
+        array = np.asarray(channel)
+        self.assertEqual(np.float32, array.dtype)
+
+        channel[0] = 10
+        self.assertEqual(10, array[0])
+
+        # Growing moves the values to a new buffer, but the view stays valid
+        channel.extend(range(MIN_CAPACITY * 2))
+        self.assertListEqual([10, 2, 3], array.tolist())
+
+    def test_eq(self):
+        channel = Channel(np.float32, [0.6, 0.7])
+        self.assertEqual(channel, [0.6, 0.7])
+        self.assertEqual([0.6, 0.7], channel)
+        self.assertEqual(channel, Channel(np.float32, [0.6, 0.7]))
+        self.assertNotEqual(channel, [0.6])
+        self.assertNotEqual(channel, [0.6, 0.8])
+        self.assertEqual(Channel(np.float32), [])
+
+    def test_pickle_and_copy(self):
+        channel = Channel(np.float32, [1.5, 2.5])
+        self.assertEqual(channel, pickle.loads(pickle.dumps(channel)))
+
+        copied_channel = copy.deepcopy(channel)
+        copied_channel.append(3.5)
+        self.assertEqual(2, len(channel))
+        self.assertEqual(3, len(copied_channel))
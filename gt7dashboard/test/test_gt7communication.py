@@ -1,13 +1,160 @@
+import asyncio
+import json
 import os
+import socket
+import struct
+import tempfile
+import threading
 import time
 import unittest
+from unittest import mock
 
-from gt7dashboard import gt7communication
+import numpy as np
+from Crypto.Cipher import Salsa20
+
+from gt7dashboard import gt7channel, gt7communication, gt7journal, gt7lapfile
 from gt7dashboard.gt7lap import Lap
 
 PLAYSTATION_IP = "ps5wifi"
 
 
+def get_test_packet(package_id=1, car_speed=50.0, throttle=255, brake=0, flags=0b01, gears=0x43) -> bytearray:
+    ddata = bytearray(gt7communication.PACKET_SIZE)
+    struct.pack_into("<i", ddata, 0x00, 0x47375330)
+    struct.pack_into("<fff", ddata, 0x04, 1.5, 2.5, 3.5)
+    struct.pack_into("<f", ddata, 0x38, 0.1)
+    struct.pack_into("<f", ddata, 0x3C, 7000)
+    struct.pack_into("<f", ddata, 0x44, 80)
+    struct.pack_into("<f", ddata, 0x48, 100)
+    struct.pack_into("<f", ddata, 0x4C, car_speed / 3.6)
+    struct.pack_into("<f", ddata, 0x50, 1.5)
+    struct.pack_into("<f", ddata, 0x58, 85)
+    struct.pack_into("<i", ddata, 0x70, package_id)
+    struct.pack_into("<hh", ddata, 0x74, 2, 5)
+    struct.pack_into("<ii", ddata, 0x78, 60000, 61000)
+    struct.pack_into("<B", ddata, 0x8E, flags)
+    struct.pack_into("<BBB", ddata, 0x90, gears, throttle, brake)
+    struct.pack_into("<ffff", ddata, 0xA4, 10, 10, 10, 10)
+    struct.pack_into("<ffff", ddata, 0xB4, 0.3, 0.3, 0.3, 0.3)
+    struct.pack_into("<i", ddata, 0x124, 1448)
+    return ddata
+
+
+def encrypt_test_packet(ddata, iv1=0x12345678) -> bytes:
+    """Encrypts a packet so that salsa20_dec finds the seed iv1 at 0x40 of the encrypted datagram"""
+    iv = ((iv1 ^ 0xDEADBEAF).to_bytes(4, "little") + iv1.to_bytes(4, "little"))
+    key = b'Simulator Interface Packet GT7 ver 0.0'[0:32]
+    key_stream = Salsa20.new(key, iv).encrypt(bytes(len(ddata)))
+    plain = bytearray(ddata)
+    plain[0x40:0x44] = bytes(a ^ b for a, b in zip(iv1.to_bytes(4, "little"), key_stream[0x40:0x44]))
+    return Salsa20.new(key, iv).encrypt(bytes(plain))
+
+
+def get_test_lap_datagrams(number_of_ticks=100, lap=1):
+    """Returns encrypted datagrams of one lap followed by the first datagram of the next lap"""
+    datagrams = []
+    for i in range(number_of_ticks + 1):
+        ddata = get_test_packet(package_id=i + 1, car_speed=100 + i % 20)
+        struct.pack_into("<h", ddata, 0x74, lap if i < number_of_ticks else lap + 1)
+        datagrams.append(encrypt_test_packet(ddata, iv1=i))
+    return datagrams
+
+
+class GTDataTest(unittest.TestCase):
+    def test_decode_packet(self):
+        packet = gt7communication.decode_packet(get_test_packet(package_id=42))
+        self.assertEqual(42, packet.package_id)
+        self.assertEqual(1448, packet.car_id)
+        self.assertEqual(0x43, packet.gears)
+        self.assertEqual(gt7communication.PACKET_SIZE, gt7communication.PACKET_STRUCT.size)
+
+    def test_gt_data(self):
+        data = gt7communication.GTData(get_test_packet(package_id=42))
+        self.assertEqual(42, data.package_id)
+        self.assertEqual(2, data.current_lap)
+        self.assertEqual(5, data.total_laps)
+        self.assertEqual(60000, data.best_lap)
+        self.assertEqual(61000, data.last_lap)
+        self.assertEqual(3, data.current_gear)
+        self.assertEqual(4, data.suggested_gear)
+        self.assertAlmostEqual(50, data.car_speed, places=3)
+        self.assertAlmostEqual(100, data.throttle)
+        self.assertEqual(0, data.brake)
+        self.assertAlmostEqual(0.5, data.boost)
+        self.assertAlmostEqual(100, data.ride_height, places=3)
+        self.assertEqual(85, data.water_temp)
+        self.assertEqual(1.5, data.position_x)
+        self.assertTrue(data.in_race)
+        self.assertFalse(data.is_paused)
+        self.assertEqual("  0.22", data.tyre_slip_ratio_FL)
+
+    def test_salsa20_dec(self):
+        ddata = get_test_packet(package_id=42)
+        datagram = encrypt_test_packet(ddata)
+        self.assertNotEqual(bytes(ddata[0:4]), datagram[0:4])
+        decrypted = gt7communication.salsa20_dec(datagram)
+        self.assertEqual(42, gt7communication.GTData(decrypted).package_id)
+        self.assertEqual(bytes(ddata[0x44:]), bytes(decrypted[0x44:]))
+
+        self.assertEqual(0, len(gt7communication.salsa20_dec(bytes(len(datagram)))))
+        self.assertEqual(0, len(gt7communication.salsa20_dec(b"A")))
+
+    def test_salsa20_dec_batch(self):
+        datagrams = [encrypt_test_packet(get_test_packet(package_id=i), iv1=i) for i in range(5)]
+        # Invalid datagrams are left out
+        datagrams.insert(2, bytes(gt7communication.PACKET_SIZE))
+        datagrams.insert(0, b"too short")
+
+        buffer = gt7communication.salsa20_dec_batch(datagrams)
+
+        self.assertEqual(5 * gt7communication.PACKET_SIZE, len(buffer))
+        for i in range(5):
+            self.assertEqual(gt7communication.salsa20_dec(datagrams[i + 1 if i < 2 else i + 2])[:gt7communication.PACKET_SIZE],
+                             buffer[i * gt7communication.PACKET_SIZE:(i + 1) * gt7communication.PACKET_SIZE])
+
+    def test_gt_data_flags(self):
+        data = gt7communication.GTData(get_test_packet(flags=0b10))
+        self.assertFalse(data.in_race)
+        self.assertTrue(data.is_paused)
+
+
+    def test_lazy_gt_data(self):
+        for car_speed in [50.0, 0.0]:
+            ddata = get_test_packet(package_id=42, car_speed=car_speed)
+            self.assertDictEqual(vars(gt7communication.GTData(ddata)), gt7communication.LazyGTData(ddata).to_dict())
+
+        data = gt7communication.LazyGTData(get_test_packet(package_id=42, flags=0b10))
+        self.assertFalse(hasattr(data, "__dict__"))
+        self.assertTrue(data.is_paused)
+        self.assertEqual(3, data.current_gear)
+        self.assertAlmostEqual(50, data.car_speed, places=3)
+        self.assertEqual("  0.22", data.tyre_slip_ratio_FL)
+
+        # Decoded fields are cached and not decoded again
+        data._ddata = bytes(gt7communication.PACKET_SIZE)
+        self.assertAlmostEqual(50, data.car_speed, places=3)
+        self.assertEqual(0, data.package_id)
+
+        with self.assertRaises(AttributeError):
+            data.unknown_field
+        with self.assertRaises(AttributeError):
+            gt7communication.LazyGTData(get_test_packet(car_speed=0)).tyre_slip_ratio_FL
+        with self.assertRaises(AttributeError):
+            gt7communication.LazyGTData(None).car_speed
+
+    def test_gt_data_to_json(self):
+        data = json.loads(gt7communication.GTData(get_test_packet(package_id=42, car_speed=36)).to_json())
+        self.assertEqual(42, data["package_id"])
+        self.assertAlmostEqual(36, data["car_speed"], places=4)
+        self.assertEqual("0:00:00", data["time_on_track"])
+        self.assertEqual(sorted(vars(gt7communication.GTData(get_test_packet())).keys()), sorted(data.keys()))
+
+    def test_lazy_gt_data_to_json(self):
+        data = json.loads(gt7communication.LazyGTData(get_test_packet(package_id=42)).to_json())
+        self.assertEqual(42, data["package_id"])
+        self.assertEqual("0:00:00", data["time_on_track"])
+        self.assertEqual(sorted(vars(gt7communication.GTData(get_test_packet())).keys()), sorted(data.keys()))
+
 # check if host is up
 def is_host_up(ip: str) -> bool:
     response = os.system("ping -c 1 " + PLAYSTATION_IP)
@@ -67,3 +214,308 @@ class GT7CommunicationTest(unittest.TestCase):
         self.gt7comm.load_laps(laps, replace_other_laps=True)
         self.assertEqual(2, len(self.gt7comm.laps))
         self.assertEqual(1, self.gt7comm.laps[0].number)
+
+
+def get_free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class GT7CommunicationAsyncTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        # Stands in for the PlayStation and receives heartbeats
+        self.playstation = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.playstation.bind(("127.0.0.1", 0))
+        self.playstation.settimeout(5)
+
+        self.gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        self.gt7comm.send_port = self.playstation.getsockname()[1]
+        self.gt7comm.receive_port = get_free_udp_port()
+
+    async def asyncTearDown(self):
+        self.gt7comm.stop()
+        self.playstation.close()
+
+    async def test_run_async(self):
+        received = []
+        all_received = asyncio.Event()
+
+        def subscriber(data):
+            received.append(data.package_id)
+            if len(received) == 101:
+                all_received.set()
+
+        self.gt7comm.subscribe(subscriber)
+        await self.gt7comm.start_async()
+
+        heartbeat, _ = await asyncio.get_running_loop().run_in_executor(None, self.playstation.recvfrom, 16)
+        self.assertEqual(b"A", heartbeat)
+
+        for datagram in get_test_lap_datagrams(number_of_ticks=100):
+            self.playstation.sendto(datagram, ("127.0.0.1", self.gt7comm.receive_port))
+
+        await asyncio.wait_for(all_received.wait(), timeout=5)
+
+        self.assertListEqual(list(range(1, 102)), received)
+        self.assertTrue(self.gt7comm.is_connected())
+        self.assertEqual(1, len(self.gt7comm.laps))
+        self.assertEqual(100, len(self.gt7comm.laps[0].data_speed))
+
+        self.gt7comm.unsubscribe(subscriber)
+        self.assertEqual(0, len(self.gt7comm._subscribers))
+
+
+    async def test_check_async_connection_resets_package_ids(self):
+        await self.gt7comm.start_async()
+        await asyncio.get_running_loop().run_in_executor(None, self.playstation.recvfrom, 16)
+        for package_id in [1, 2, 3]:
+            self.gt7comm._on_async_datagram(encrypt_test_packet(get_test_packet(package_id=package_id)))
+
+        self.gt7comm._last_time_datagram_received -= gt7communication.ASYNC_RECEIVE_TIMEOUT
+        self.gt7comm._check_async_connection()
+        heartbeat, _ = await asyncio.get_running_loop().run_in_executor(None, self.playstation.recvfrom, 16)
+        self.assertEqual(b"A", heartbeat)
+
+        # The first packet of the new connection is no tick gap to the last packet of the lost connection
+        self.gt7comm._on_async_datagram(encrypt_test_packet(get_test_packet(package_id=5)))
+        self.assertEqual([2, 3, 4, 5], self.gt7comm.current_lap.data_ticks.tolist())
+
+    async def test_wait_for_data_async(self):
+        self.assertIsNone(await self.gt7comm.wait_for_data_async(timeout=0.01))
+
+        waiting = asyncio.ensure_future(self.gt7comm.wait_for_data_async(newer_than=1, timeout=5))
+        await asyncio.sleep(0)
+        self.gt7comm._process_datagram(encrypt_test_packet(get_test_packet(package_id=1)))
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiting.done())
+
+        # Processing on another thread wakes the waiter as well
+        thread = threading.Thread(target=self.gt7comm._process_datagram,
+                                  args=[encrypt_test_packet(get_test_packet(package_id=2))])
+        thread.start()
+        data = await waiting
+        thread.join()
+        self.assertEqual(2, data.package_id)
+        self.assertEqual(0, len(self.gt7comm._data_waiters))
+
+
+class GT7CommunicationThreadTest(unittest.TestCase):
+    def setUp(self):
+        # Stands in for the PlayStation and receives heartbeats
+        self.playstation = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.playstation.bind(("127.0.0.1", 0))
+        self.playstation.settimeout(5)
+
+        self.gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        self.gt7comm.send_port = self.playstation.getsockname()[1]
+        self.gt7comm.receive_port = get_free_udp_port()
+
+    def tearDown(self):
+        self.gt7comm.stop()
+        self.playstation.close()
+
+    def test_log_data_with_lost_packets(self):
+        for package_id in [1, 2, 3, 6, 7]:
+            self.gt7comm._log_data(gt7communication.GTData(get_test_packet(package_id=package_id)))
+
+        lap = self.gt7comm.current_lap
+        self.assertListEqual([2, 3, 4, 7, 8], lap.data_ticks.tolist())
+        self.assertEqual(8, lap.lap_ticks)
+        self.assertAlmostEqual(8 / 60, lap.data_time[-1])
+
+    def test_log_data_updates_live_indicators(self):
+        for package_id, throttle in enumerate([0, 51, 102, 153], start=1):
+            self.gt7comm._log_data(gt7communication.GTData(get_test_packet(package_id=package_id, throttle=throttle)))
+
+        self.assertAlmostEqual(30, self.gt7comm.live_indicators.average_throttle)
+        self.assertAlmostEqual(50, self.gt7comm.live_indicators.max_speed, places=4)
+
+        self.gt7comm._reset_stream()
+        self.assertEqual(0, self.gt7comm.live_indicators.average_throttle)
+
+    def test_connection_markers_reset_on_processing_thread(self):
+        ring_buffer = self.gt7comm._ring_buffer
+
+        def commit(package_id):
+            datagram = encrypt_test_packet(get_test_packet(package_id=package_id))
+            ring_buffer.write_slot()[:len(datagram)] = datagram
+            ring_buffer.commit(len(datagram), time.time())
+
+        for package_id in [100, 101]:
+            commit(package_id)
+        old_statistics = self.gt7comm.statistics
+        ring_buffer.commit_marker(gt7communication.CONNECTION_STARTED, discard=True)
+        # A new connection starts with lower package ids
+        for package_id in [1, 2]:
+            commit(package_id)
+        ring_buffer.commit_marker(gt7communication.CONNECTION_LOST)
+        commit(1)
+
+        self.gt7comm._start_processing_thread()
+        timeout = time.time() + 5
+        while len(ring_buffer) or self.gt7comm._package_id != 1:
+            self.assertLess(time.time(), timeout)
+            time.sleep(0.01)
+
+        # The datagrams before the new connection were discarded, not processed after the reset
+        self.assertEqual(2, ring_buffer.discarded)
+        self.assertEqual(0, old_statistics.packets_processed)
+        self.assertIsNot(old_statistics, self.gt7comm.statistics)
+        self.assertEqual(3, self.gt7comm.statistics.packets_processed)
+        self.assertEqual(0, self.gt7comm.statistics.packets_out_of_order)
+
+    def test_ring_buffer_overflows_are_not_lost(self):
+        ring_buffer = self.gt7comm._ring_buffer
+
+        def commit(package_id):
+            datagram = encrypt_test_packet(get_test_packet(package_id=package_id))
+            ring_buffer.write_slot()[:len(datagram)] = datagram
+            ring_buffer.commit(len(datagram), time.time())
+
+        def wait_for_processed(number_of_packets):
+            timeout = time.time() + 5
+            while self.gt7comm.statistics.packets_processed < number_of_packets:
+                self.assertLess(time.time(), timeout)
+                time.sleep(0.01)
+
+        self.gt7comm._start_processing_thread()
+        commit(1)
+        wait_for_processed(1)
+        # The buffer was full for package 2 and 3, 5 was lost on the network
+        ring_buffer.overflow()
+        ring_buffer.overflow()
+        commit(4)
+        commit(6)
+        wait_for_processed(3)
+
+        self.assertEqual(2, self.gt7comm.statistics.packets_overflowed)
+        self.assertEqual(1, self.gt7comm.statistics.packets_lost)
+
+    def test_finished_laps_are_journaled(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "session" + gt7journal.JOURNAL_EXTENSION)
+            self.gt7comm.start_journal(path)
+            for package_id in [1, 2, 3]:
+                self.gt7comm.last_data = gt7communication.GTData(get_test_packet(package_id=package_id))
+                self.gt7comm._log_data(self.gt7comm.last_data)
+            self.gt7comm.finish_lap(manual=True)
+            # Laps without data are not journaled
+            self.gt7comm.finish_lap(manual=True)
+
+            self.gt7comm.flush_journal()
+            laps = gt7journal.read_journal(path)
+            self.assertEqual(1, len(laps))
+            self.assertListEqual([2, 3, 4], laps[0].data_ticks.tolist())
+
+            lap_file_path = self.gt7comm.reset()
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(1, len(gt7lapfile.load_laps_from_lap_file(lap_file_path)))
+            self.assertEqual([], self.gt7comm.laps)
+
+            self.gt7comm.stop()
+            self.assertEqual([os.path.basename(lap_file_path)], os.listdir(tmp_dir))
+
+    def test_journal_appends_do_not_block_finish_lap(self):
+        appending = threading.Event()
+        append_lap = gt7journal.SessionJournal.append_lap
+
+        def slow_append_lap(journal, lap):
+            appending.wait(5)
+            append_lap(journal, lap)
+
+        with tempfile.TemporaryDirectory() as tmp_dir, \
+                mock.patch.object(gt7journal.SessionJournal, "append_lap", slow_append_lap):
+            path = os.path.join(tmp_dir, "session" + gt7journal.JOURNAL_EXTENSION)
+            self.gt7comm.start_journal(path)
+            package_id = 1
+            # Lap i has i data points
+            for number_of_ticks in [1, 2, 3, 4]:
+                for _ in range(number_of_ticks):
+                    self.gt7comm.last_data = gt7communication.GTData(get_test_packet(package_id=package_id))
+                    self.gt7comm._log_data(self.gt7comm.last_data)
+                    package_id += 1
+                self.gt7comm.finish_lap(manual=True)
+
+            # All laps are finished while the first one is still being appended
+            self.assertEqual(4, len(self.gt7comm.laps))
+            self.assertEqual(0, len(gt7journal.read_journal(path)))
+
+            appending.set()
+            # Closing waits for the pending appends, which keep the order the laps were finished in
+            lap_file_path = self.gt7comm.stop_journal()
+            laps = gt7lapfile.load_laps_from_lap_file(lap_file_path)
+            self.assertListEqual([4, 3, 2, 1], [len(lap.data_speed) for lap in laps])
+
+    def test_log_data_with_engineering_channels(self):
+        self.assertFalse(hasattr(self.gt7comm.current_lap, "data_water_temp"))
+
+        self.gt7comm.set_recorded_channels(gt7channel.ENGINEERING_CHANNELS + [
+            gt7channel.RecordedChannel("water_temp_fahrenheit", "water_temp", np.float32, lambda c: c * 9 / 5 + 32),
+        ])
+        for package_id in [1, 2, 3]:
+            self.gt7comm._log_data(gt7communication.GTData(get_test_packet(package_id=package_id)))
+
+        lap = self.gt7comm.current_lap
+        self.assertListEqual([85, 85, 85], lap.data_water_temp.tolist())
+        self.assertListEqual([185, 185, 185], lap.data_water_temp_fahrenheit.tolist())
+        self.assertEqual(3, len(lap.data_speed))
+        self.assertIn("water_temp", lap.get_data_dict())
+
+    def test_process_datagram_decodes_lazily_outside_race(self):
+        self.assertTrue(self.gt7comm._process_datagram(encrypt_test_packet(get_test_packet(package_id=1, flags=0))))
+        self.assertIsInstance(self.gt7comm.last_data, gt7communication.LazyGTData)
+
+        self.assertTrue(self.gt7comm._process_datagram(encrypt_test_packet(get_test_packet(package_id=2, flags=0b01))))
+        self.assertIsInstance(self.gt7comm.last_data, gt7communication.GTData)
+        self.assertEqual(1, len(self.gt7comm.current_lap.data_speed))
+
+    def test_wait_for_data(self):
+        self.assertIsNone(self.gt7comm.wait_for_data(timeout=0.01))
+
+        def process(package_id):
+            self.gt7comm._process_datagram(encrypt_test_packet(get_test_packet(package_id=package_id)))
+
+        threading.Timer(0.05, process, [1]).start()
+        data = self.gt7comm.wait_for_data(timeout=5)
+        self.assertEqual(1, data.package_id)
+        self.assertEqual(1, self.gt7comm.get_last_data().package_id)
+
+        # Returns immediately, a packet newer than 0 was processed already
+        self.assertEqual(1, self.gt7comm.wait_for_data(newer_than=0, timeout=0).package_id)
+
+        threading.Timer(0.05, process, [2]).start()
+        self.assertEqual(2, self.gt7comm.wait_for_data(newer_than=1, timeout=5).package_id)
+        self.assertIsNone(self.gt7comm.wait_for_data(newer_than=2, timeout=0.01))
+
+    def test_receive_and_process(self):
+        self.gt7comm.start()
+        heartbeat, _ = self.playstation.recvfrom(16)
+        self.assertEqual(b"A", heartbeat)
+
+        datagrams = get_test_lap_datagrams(number_of_ticks=100)
+        # Not decryptable and older packets are dropped by the processing stage
+        datagrams.append(bytes(gt7communication.PACKET_SIZE))
+        datagrams.append(datagrams[0])
+        for datagram in datagrams:
+            self.playstation.sendto(datagram, ("127.0.0.1", self.gt7comm.receive_port))
+
+        timeout = time.time() + 5
+        while self.gt7comm.get_ingest_counters()["processed"] + self.gt7comm.get_ingest_counters()["dropped"] < 103:
+            self.assertLess(time.time(), timeout)
+            time.sleep(0.01)
+
+        counters = self.gt7comm.get_ingest_counters()
+        self.assertEqual(103, counters["received"])
+        self.assertEqual(0, counters["overflows"])
+        self.assertEqual(101, counters["processed"])
+        self.assertEqual(2, counters["dropped"])
+
+        statistics = self.gt7comm.get_statistics()
+        self.assertEqual(103, statistics.packets_received)
+        self.assertEqual(0, statistics.packets_lost)
+        self.assertEqual(1, statistics.packets_out_of_order)
+        self.assertEqual(1, statistics.decrypt_failures)
+        self.assertLessEqual(1, statistics.heartbeats_sent)
+        self.assertEqual(1, len(self.gt7comm.laps))
+        self.assertEqual(100, len(self.gt7comm.laps[0].data_speed))
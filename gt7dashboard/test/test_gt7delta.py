@@ -0,0 +1,97 @@
+import unittest
+
+from gt7dashboard import gt7helper
+from gt7dashboard.gt7cache import lap_cache
+from gt7dashboard.gt7delta import LiveTimeDelta
+from gt7dashboard.gt7lap import Lap
+
+TICK_TIME = gt7helper.TICK_TIME_MS / 1000
+
+
+def add_tick(lap: Lap, speed: float, tick: int):
+    lap.data_speed.append(speed)
+    lap.data_ticks.append(tick)
+    lap.data_time.append(tick * TICK_TIME)
+
+
+def get_lap(speed: float, ticks) -> Lap:
+    lap = Lap()
+    for tick in ticks:
+        add_tick(lap, speed, tick)
+    return lap
+
+
+class TestLiveTimeDelta(unittest.TestCase):
+    def setUp(self):
+        self.live_time_delta = LiveTimeDelta()
+
+    def test_no_reference_lap(self):
+        self.assertIsNone(self.live_time_delta.update(get_lap(36, range(1, 10))))
+        self.live_time_delta.set_reference_lap(Lap())
+        self.assertIsNone(self.live_time_delta.update(get_lap(36, range(1, 10))))
+
+    def test_same_pace_as_reference(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 100)))
+
+        lap = Lap()
+        for tick in range(1, 50):
+            add_tick(lap, 36, tick)
+            self.assertAlmostEqual(0, self.live_time_delta.update(lap), places=3)
+
+    def test_half_the_speed_of_reference(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 100)))
+
+        lap = Lap()
+        for tick in range(1, 50):
+            add_tick(lap, 18, tick)
+            self.live_time_delta.update(lap)
+
+        # The reference lap needed half the time for the same distance
+        self.assertAlmostEqual(48 / 2 * TICK_TIME * 1000, self.live_time_delta.delta_ms, places=3)
+
+    def test_lost_ticks_and_batches(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 100)))
+
+        # Ticks 4 to 9 were lost, they still count as distance and time
+        lap = get_lap(36, [1, 2, 3, 10, 11])
+        self.assertAlmostEqual(0, self.live_time_delta.update(lap), places=3)
+        add_tick(lap, 36, 12)
+        add_tick(lap, 36, 13)
+        self.assertAlmostEqual(0, self.live_time_delta.update(lap), places=3)
+
+    def test_longer_than_reference(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 10)))
+        self.assertIsNone(self.live_time_delta.update(get_lap(36, range(1, 20))))
+
+    def test_new_lap_resets_distance(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 100)))
+        self.live_time_delta.update(get_lap(18, range(1, 50)))
+
+        lap = get_lap(36, range(1, 10))
+        self.assertAlmostEqual(0, self.live_time_delta.update(lap), places=3)
+
+    def test_get_reference_time(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 4)))
+        tick_distance = 36 / 3.6 / 1000 * gt7helper.TICK_TIME_MS
+
+        self.assertAlmostEqual(TICK_TIME, self.live_time_delta.get_reference_time(0))
+        self.assertAlmostEqual(2.5 * TICK_TIME, self.live_time_delta.get_reference_time(1.5 * tick_distance))
+        self.assertIsNone(self.live_time_delta.get_reference_time(3 * tick_distance))
+
+    def test_tick_in_progress_is_ignored(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 100)))
+
+        lap = get_lap(18, range(1, 10))
+        # Another thread logged the speed of the next tick, but not its time yet
+        lap.data_ticks.append(10)
+        lap.data_speed.append(1000)
+        self.assertAlmostEqual(8 / 2 * TICK_TIME * 1000, self.live_time_delta.update(lap), places=3)
+
+    def test_shares_distance_with_lap_cache(self):
+        self.live_time_delta.set_reference_lap(get_lap(36, range(1, 100)))
+
+        lap = get_lap(36, range(1, 10))
+        self.live_time_delta.update(lap)
+        hits = lap_cache.hits
+        gt7helper.get_x_axis_for_distance(lap)
+        self.assertEqual(hits + 1, lap_cache.hits)
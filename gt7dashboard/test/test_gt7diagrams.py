@@ -1,10 +1,13 @@
 import os
 import pickle
 import unittest
+from unittest import mock
+
+import numpy as np
 
 from bokeh.io import output_file, show
 from bokeh.layouts import layout
-from bokeh.models import Div, Plot, Scatter, Label
+from bokeh.models import ColumnDataSource, Div, Plot, Scatter, Label
 from bokeh.plotting import save, figure
 
 import gt7dashboard.gt7diagrams
@@ -13,7 +16,7 @@ from gt7dashboard import gt7diagrams, gt7helper
 from gt7dashboard.gt7diagrams import (
     get_throttle_braking_race_line_diagram,
 )
-from gt7dashboard.gt7lap import Lap
+from gt7dashboard.gt7lap import Lap, DERIVED_CHANNEL_DTYPES
 
 
 class TestHelper(unittest.TestCase):
@@ -81,9 +84,9 @@ class TestHelper(unittest.TestCase):
         output_file(out_file)
         save(rd.get_layout())
 
-        # get file size, should be about 5MB
+        # get file size, the time diff has one point per meter instead of one per 10 ms since it is interpolated by numpy
         file_size = os.path.getsize(out_file)
-        self.assertAlmostEqual(file_size, 2500000, delta=1000000)
+        self.assertAlmostEqual(file_size, 1300000, delta=500000)
 
     def test_add_5_additional_laps_to_race_diagram(self):
 
@@ -177,9 +180,9 @@ class TestHelper(unittest.TestCase):
         output_file(out_file)
         save(rd.get_layout())
 
-        # get file size, should be about 5MB
+        # get file size, should be about 2MB since channels are embedded as binary float32
         file_size = os.path.getsize(out_file)
-        self.assertAlmostEqual(file_size, 3000000, delta=1000000)
+        self.assertAlmostEqual(file_size, 2000000, delta=1000000)
 
     def test_display_flat_line_variance(self):
         rd = self.helper_get_race_diagram()
@@ -216,3 +219,73 @@ class TestHelper(unittest.TestCase):
         print("View file for reference at %s" % out_file)
         output_file(out_file)
         save(layout(div))
+
+
+class TestLiveLapStream(unittest.TestCase):
+    def setUp(self) -> None:
+        self.source = ColumnDataSource(data=gt7diagrams.LiveLapStream.get_empty_data())
+        stream_patcher = mock.patch.object(ColumnDataSource, "stream", autospec=True, side_effect=ColumnDataSource.stream)
+        self.stream = stream_patcher.start()
+        self.addCleanup(stream_patcher.stop)
+        self.live_lap_stream = gt7diagrams.LiveLapStream(self.source, rollover=5)
+
+    def add_samples(self, lap: Lap, ticks):
+        for tick in ticks:
+            for attribute in gt7diagrams.LIVE_LAP_COLUMNS.values():
+                # Derived channels follow the recorded channels
+                if attribute not in DERIVED_CHANNEL_DTYPES:
+                    getattr(lap, attribute).append(1)
+            lap.data_speed[-1] = 36
+            lap.data_ticks.append(tick)
+            # Appended last for every tick, like GT7Communication._log_data
+            lap.data_time.append(tick / 60)
+
+    def test_streams_only_new_samples(self):
+        lap = Lap()
+        self.add_samples(lap, [2, 3])
+        self.live_lap_stream.update(lap)
+        self.live_lap_stream.update(lap)
+        self.add_samples(lap, [4, 6])
+        self.live_lap_stream.update(lap)
+
+        self.assertListEqual([2, 2], [len(call.args[1]["speed"]) for call in self.stream.call_args_list])
+        self.assertEqual(4, len(self.source.data["speed"]))
+
+        # Distance continues across updates, the lost tick 5 counts as well
+        tick_distance = 36 / 3.6 / 1000 * gt7helper.TICK_TIME_MS
+        for expected, actual in zip([0, 1, 2, 4], self.source.data["distance"]):
+            self.assertAlmostEqual(expected * tick_distance, actual)
+
+        self.assertListEqual(list(gt7helper.get_x_axis_for_distance(lap)), list(self.source.data["distance"]))
+
+    def test_derives_only_new_samples(self):
+        self.live_lap_stream.rollover = 1000
+        lap = Lap()
+        with mock.patch.object(Lap, "get_derived_metrics", side_effect=AssertionError("whole lap derived")):
+            for ticks in [range(1, 40), range(40, 100), range(100, 150)]:
+                self.add_samples(lap, ticks)
+                for tick in ticks:
+                    lap.data_rotation_yaw.append((tick % 13) / 10)
+                    lap.data_throttle[tick - 1] = 0 if tick % 5 else 100
+                self.live_lap_stream.update(lap)
+
+            # A tick being logged is streamed once it is complete
+            lap.data_ticks.append(150)
+            lap.data_speed.append(36)
+            self.live_lap_stream.update(lap)
+        self.assertEqual(149, len(self.source.data["speed"]))
+
+        metrics = lap.get_derived_metrics()
+        for column in ["coast", "tires", "yaw_rate"]:
+            np.testing.assert_array_almost_equal(
+                np.asarray(metrics[gt7diagrams.LIVE_LAP_COLUMNS[column]]), self.source.data[column], err_msg=column
+            )
+
+    def test_rollover_and_new_lap(self):
+        lap = Lap()
+        self.add_samples(lap, range(1, 8))
+        self.live_lap_stream.update(lap)
+        self.assertEqual(5, len(self.source.data["speed"]))
+
+        self.live_lap_stream.update(Lap())
+        self.assertEqual(0, len(self.source.data["speed"]))
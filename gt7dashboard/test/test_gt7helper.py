@@ -2,6 +2,8 @@ import pickle
 import unittest
 import os
 
+import numpy as np
+
 from gt7dashboard.gt7helper import calculate_remaining_fuel, format_laps_to_table, calculate_time_diff_by_distance, \
     get_n_fastest_laps_within_percent_threshold_ignoring_replays
 from gt7dashboard.gt7lap import Lap
@@ -102,6 +104,148 @@ class TestHelper(unittest.TestCase):
 
         print(len(df))
 
+    def test_get_time_diffs_by_distance(self):
+        tick_time = gt7helper.TICK_TIME_MS / 1000
+        reference_lap = Lap()
+        reference_lap.data_speed = [36] * 100
+        reference_lap.data_time = [i * tick_time for i in range(100)]
+        slow_lap = Lap()
+        slow_lap.data_speed = [18] * 100
+        slow_lap.data_time = [i * tick_time for i in range(100)]
+
+        time_diffs = gt7helper.get_time_diffs_by_distance(reference_lap, [reference_lap, slow_lap], resolution=2)
+
+        # A point every 2 m up to the end of the reference lap at 99 ticks of 0.16668 m
+        distance = time_diffs["distance"]
+        self.assertAlmostEqual(0, distance[0])
+        self.assertAlmostEqual(2, distance[1])
+        self.assertAlmostEqual(99 * 0.16668, distance[-1])
+        self.assertEqual((2, len(distance)), time_diffs["timedelta"].shape)
+
+        np.testing.assert_allclose(np.zeros(len(distance)), time_diffs["timedelta"][0], atol=1e-9)
+        # The slow lap takes twice the time, but ends after half the distance
+        half = distance <= 99 * 0.16668 / 2
+        np.testing.assert_allclose(time_diffs["reference"][half], time_diffs["timedelta"][1][half])
+        self.assertTrue(np.all(np.isnan(time_diffs["timedelta"][1][~half])))
+
+    def test_get_time_diff_by_distance(self):
+        path = os.path.join(os.getcwd(), 'test_data', 'broad_bean_raceway_time_trial_4laps.json')
+        laps = gt7helper.load_laps_from_json(path)
+
+        time_diff = gt7helper.get_time_diff_by_distance(laps[0], laps[1], resolution=10)
+        self.assertEqual(1, time_diff["timedelta"].ndim)
+        self.assertEqual(len(time_diff["distance"]), len(time_diff["timedelta"]))
+        self.assertAlmostEqual(time_diff["distance"][-1], gt7helper.get_x_axis_for_distance(laps[0])[-1])
+        self.assertLess(len(time_diff["distance"]), len(gt7helper.get_time_diff_by_distance(laps[0], laps[1])["distance"]))
+
+    def test_get_tick_delta(self):
+        self.assertEqual(1, gt7helper.get_tick_delta(0, 500))
+        self.assertEqual(1, gt7helper.get_tick_delta(499, 500))
+        self.assertEqual(3, gt7helper.get_tick_delta(497, 500))
+        # Restarts and pauses are not lost packets
+        self.assertEqual(1, gt7helper.get_tick_delta(600, 500))
+        self.assertEqual(1, gt7helper.get_tick_delta(500 - gt7helper.MAX_TICK_GAP - 1, 500))
+
+    def test_get_x_axis_for_distance_with_lost_packets(self):
+        lap = Lap()
+        lap.data_speed = [36, 36, 72, 72]
+        lap.data_ticks = [1, 2, 4, 5]
+
+        tick_distance = 36 / 3.6 / 1000 * 16.668
+        distance = gt7helper.get_x_axis_for_distance(lap)
+        self.assertEqual(4, len(distance))
+        self.assertAlmostEqual(tick_distance, distance[1])
+        # The lost tick is driven at the mean speed of the ticks around it
+        self.assertAlmostEqual(tick_distance * (1 + 1.5 + 2), distance[2])
+        self.assertAlmostEqual(tick_distance * (1 + 1.5 + 2 + 2), distance[3])
+
+        distance = gt7helper.get_x_axis_for_distance(lap, interpolate_gaps=False)
+        self.assertAlmostEqual(tick_distance * (1 + 2 + 2), distance[2])
+
+    def test_get_x_axis_for_distance_with_tick_logged_ahead_of_speed(self):
+        lap = Lap()
+        lap.data_speed = [36, 36, 72]
+        # The tick of the next sample is already logged, its speed not yet
+        lap.data_ticks = [1, 2, 4, 5]
+
+        tick_distance = 36 / 3.6 / 1000 * 16.668
+        distance = gt7helper.get_x_axis_for_distance(lap)
+        self.assertEqual(3, len(distance))
+        self.assertAlmostEqual(tick_distance * (1 + 1.5 + 2), distance[2])
+
+    def test_get_x_axis_for_distance_without_ticks(self):
+        lap = Lap()
+        lap.data_speed = [36, 36, 72]
+        del lap.data_ticks
+
+        self.assertListEqual([1, 1, 1], gt7helper.get_tick_deltas(lap))
+        self.assertAlmostEqual(36 / 3.6 / 1000 * 16.668 * 3, gt7helper.get_x_axis_for_distance(lap)[2])
+
+    def test_get_x_axis_for_distance_is_cached(self):
+        lap = Lap()
+        lap.data_speed = [36, 36, 72]
+        lap.data_ticks = [1, 2, 4]
+
+        distance = gt7helper.get_x_axis_for_distance(lap)
+        self.assertIs(distance, gt7helper.get_x_axis_for_distance(lap))
+        self.assertFalse(distance.flags.writeable)
+        self.assertIsNot(distance, gt7helper.get_x_axis_for_distance(lap, interpolate_gaps=False))
+
+        # Replacing the speed channel invalidates the distance
+        lap.data_speed = [72, 72, 72]
+        self.assertAlmostEqual(72 / 3.6 / 1000 * 16.668 * 3, gt7helper.get_x_axis_for_distance(lap)[2])
+
+    def test_get_x_axis_for_distance_while_recording(self):
+        laps = gt7helper.load_laps_from_json("test_data/broad_bean_raceway_time_trial_4laps.json")
+        ticks = list(range(1, len(laps[0].data_speed) + 1))
+        # Lost packets
+        del ticks[100:103]
+        speed = list(laps[0].data_speed)[:len(ticks)]
+
+        lap = Lap()
+        for i in range(0, len(speed), 50):
+            lap.data_speed.extend(speed[i:i + 50])
+            lap.data_ticks.extend(ticks[i:i + 50])
+            gt7helper.get_x_axis_for_distance(lap)
+
+        full_lap = Lap()
+        full_lap.data_speed = speed
+        full_lap.data_ticks = ticks
+        self.assertListEqual(
+            gt7helper.get_x_axis_for_distance(full_lap).tolist(), gt7helper.get_x_axis_for_distance(lap).tolist()
+        )
+        self.assertEqual(len(speed), len(gt7helper.get_x_axis_for_distance(lap)))
+
+    def test_get_race_lines(self):
+        lap = Lap()
+        lap.data_throttle = [100, 0, 0, 50]
+        lap.data_braking = [0, 80, 0, 50]
+        lap.data_position_x = [1, 2, 3, 4]
+        lap.data_position_y = [5, 6, 7, 8]
+        lap.data_position_z = [9, 10, 11, 12]
+
+        race_lines = gt7helper.get_race_lines(lap)
+        nan = float("nan")
+        y, x, z = race_lines[gt7helper.RACE_LINE_THROTTLE_MODE]
+        np.testing.assert_array_equal([5, nan, nan, nan], y)
+        np.testing.assert_array_equal([1, nan, nan, nan], x)
+        np.testing.assert_array_equal([9, nan, nan, nan], z)
+        np.testing.assert_array_equal([nan, 2, nan, nan], race_lines[gt7helper.RACE_LINE_BRAKING_MODE][1])
+        np.testing.assert_array_equal([nan, nan, 3, nan], race_lines[gt7helper.RACE_LINE_COASTING_MODE][1])
+        self.assertEqual(np.float64, x.dtype)
+
+        self.assertIs(race_lines, gt7helper.get_race_lines(lap))
+        self.assertIs(
+            race_lines[gt7helper.RACE_LINE_BRAKING_MODE],
+            gt7helper.get_race_line_coordinates_when_mode_is_active(lap, gt7helper.RACE_LINE_BRAKING_MODE),
+        )
+
+        # Replaced channels invalidate the race lines
+        lap.data_throttle = [0, 0, 0, 0]
+        np.testing.assert_array_equal(
+            [1, nan, 3, nan], gt7helper.get_race_lines(lap)[gt7helper.RACE_LINE_COASTING_MODE][1]
+        )
+
     def test_convert_seconds_to_milliseconds(self):
         seconds = 10000
         ms = gt7helper.convert_seconds_to_milliseconds(seconds)
@@ -265,6 +409,36 @@ class TestLaps(unittest.TestCase):
     def test_get_safe_filename(self):
         self.assertEqual("Cio_123_98", gt7helper.get_safe_filename("Cio 123 '98"))
 
+    def test_get_variance_for_laps_on_distance_grid(self):
+        path = os.path.join(os.getcwd(), 'test_data', 'broad_bean_raceway_time_trial_4laps.json')
+        laps = gt7helper.load_laps_from_json(path)
+
+        variance = gt7helper.get_variance_for_laps(laps, resolution=10)
+        shortest_lap_length = min(gt7helper.get_x_axis_for_distance(lap)[-1] for lap in laps)
+        self.assertEqual(int(np.ceil(shortest_lap_length / 10)) + 1, len(variance))
+        self.assertAlmostEqual(10, variance.distance[1])
+        self.assertAlmostEqual(shortest_lap_length, variance.distance.iloc[-1])
+        self.assertFalse(variance.speed_variance.isna().any())
+
+        # The size does not depend on the number of laps
+        self.assertEqual(len(variance), len(gt7helper.get_variance_for_laps(laps[:2], resolution=10)))
+
+        # The same lap does not deviate
+        same_laps_variance = gt7helper.get_variance_for_laps([laps[0], laps[0]])
+        np.testing.assert_array_equal(np.zeros(len(same_laps_variance)), same_laps_variance.speed_variance)
+
+    def test_get_variance_for_laps_without_laps(self):
+        self.assertEqual(0, len(gt7helper.get_variance_for_laps([])))
+        self.assertEqual(0, len(gt7helper.get_variance_for_laps([Lap()])))
+        self.assertTrue(gt7helper.get_variance_for_laps([Lap(), self.get_lap_with_speed([10, 20])]).speed_variance.isna().all())
+
+    @staticmethod
+    def get_lap_with_speed(speed) -> Lap:
+        lap = Lap()
+        lap.data_speed = speed
+        lap.data_time = list(range(len(speed)))
+        return lap
+
     def test_get_n_fastest_laps_within_percent_threshold_ignoring_replays(self):
         l1 = Lap()
         l1.lap_finish_time = 1005  # second best
@@ -371,3 +545,14 @@ class TestLaps(unittest.TestCase):
         self.assertEqual(len(laps), len(laps_read))
         for obj1, obj2 in zip(laps, laps_read):
             self.assertEqual(obj1.__dict__, obj2.__dict__)
+
+    def test_save_laps_to_json_keeps_channels(self):
+        lap = Lap()
+        lap.data_speed.extend([100.1, 120.2, 140.3])
+        lap.data_gear.extend([2, 3, 3])
+
+        laps_read = gt7helper.load_laps_from_json(gt7helper.save_laps_to_json([lap]))
+
+        self.assertEqual(lap.data_speed, laps_read[0].data_speed)
+        self.assertEqual(lap.data_speed.dtype, laps_read[0].data_speed.dtype)
+        self.assertListEqual([2, 3, 3], laps_read[0].data_gear.tolist())
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from gt7dashboard import gt7helper, gt7journal, gt7lapfile
+
+TEST_LAPS_JSON = "test_data/broad_bean_raceway_time_trial_4laps.json"
+
+
+class TestSessionJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "session" + gt7journal.JOURNAL_EXTENSION)
+        # Oldest lap first, the order laps are finished in
+        self.test_laps = list(reversed(gt7helper.load_laps_from_json(TEST_LAPS_JSON)))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_journal(self, laps):
+        with gt7journal.SessionJournal(self.path) as journal:
+            for lap in laps:
+                journal.append_lap(lap)
+
+    def assertSameLaps(self, laps, other_laps):
+        self.assertEqual([lap.lap_finish_time for lap in laps], [lap.lap_finish_time for lap in other_laps])
+        for lap, other_lap in zip(laps, other_laps):
+            np.testing.assert_array_equal(np.asarray(lap.data_speed), np.asarray(other_lap.data_speed))
+
+    def test_append_and_read(self):
+        self.write_journal(self.test_laps)
+        laps = gt7journal.read_journal(self.path)
+        self.assertSameLaps(self.test_laps, laps)
+
+        # Restored laps can be extended
+        laps[0].data_speed.append(10)
+        self.assertEqual(10, laps[0].data_speed[-1])
+
+    def test_append_to_existing_journal(self):
+        self.write_journal(self.test_laps[:2])
+        journal = gt7journal.SessionJournal(self.path)
+        self.assertEqual(2, journal.number_of_laps)
+        journal.append_lap(self.test_laps[2])
+        journal.close()
+
+        self.assertSameLaps(self.test_laps[:3], gt7journal.read_journal(self.path))
+
+    def test_not_a_journal(self):
+        gt7lapfile.save_laps_to_lap_file(self.test_laps, self.path)
+        with self.assertRaises(gt7journal.JournalFormatError):
+            gt7journal.read_journal(self.path)
+
+    def test_cut_off_record_is_ignored(self):
+        self.write_journal(self.test_laps[:2])
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 100)
+
+        self.assertSameLaps(self.test_laps[:1], gt7journal.read_journal(self.path))
+
+    def test_damaged_record_is_ignored(self):
+        self.write_journal(self.test_laps[:2])
+        with open(self.path, "r+b") as f:
+            f.seek(-100, os.SEEK_END)
+            f.write(b"\xff" * 10)
+
+        self.assertSameLaps(self.test_laps[:1], gt7journal.read_journal(self.path))
+
+    def test_compact_journal(self):
+        self.write_journal(self.test_laps)
+        lap_file_path = gt7journal.compact_journal(self.path)
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertTrue(lap_file_path.endswith(gt7lapfile.LAP_FILE_EXTENSION))
+        # Newest lap first, like the laps of GT7Communication
+        self.assertSameLaps(list(reversed(self.test_laps)), gt7lapfile.load_laps_from_lap_file(lap_file_path))
+
+    def test_compact_empty_journal(self):
+        self.write_journal([])
+        self.assertIsNone(gt7journal.compact_journal(self.path))
+        self.assertEqual([], os.listdir(self.tmp_dir.name))
+
+    def test_restore_journals(self):
+        self.write_journal(self.test_laps[:1])
+        self.path = os.path.join(self.tmp_dir.name, "session2" + gt7journal.JOURNAL_EXTENSION)
+        self.write_journal(self.test_laps[1:3])
+
+        laps = gt7journal.restore_journals(self.tmp_dir.name)
+
+        self.assertSameLaps(list(reversed(self.test_laps[1:3])), laps)
+        self.assertEqual(
+            ["session" + gt7lapfile.LAP_FILE_EXTENSION, "session2" + gt7lapfile.LAP_FILE_EXTENSION],
+            sorted(os.listdir(self.tmp_dir.name)),
+        )
+        self.assertEqual([], gt7journal.restore_journals(self.tmp_dir.name))
@@ -0,0 +1,144 @@
+import unittest
+
+from gt7dashboard import gt7helper
+from gt7dashboard.gt7cache import lap_cache
+from gt7dashboard.gt7lap import Lap, YAW_RATE_INTERVAL, derive_metrics
+
+
+def add_tick(lap: Lap, throttle=0, brake=0, speed=100, tyre_speeds=(100, 100, 100, 100), tyre_temp=80, yaw=0):
+    lap.data_ticks.append(len(lap.data_ticks) + 1)
+    lap.data_throttle.append(throttle)
+    lap.data_braking.append(brake)
+    lap.data_speed.append(speed)
+    lap.data_rotation_yaw.append(yaw)
+    for tyre, tyre_speed in zip(["fl", "fr", "rl", "rr"], tyre_speeds):
+        getattr(lap, "data_tyre_speed_" + tyre).append(tyre_speed)
+        getattr(lap, "data_tyre_temp_" + tyre).append(tyre_temp)
+    # Appended last for every tick, like GT7Communication._log_data
+    lap.data_time.append(len(lap.data_ticks) / 60)
+
+
+class TestDerivedMetrics(unittest.TestCase):
+    def test_pedal_ticks(self):
+        lap = Lap()
+        add_tick(lap, throttle=100)
+        add_tick(lap, throttle=100)
+        add_tick(lap, brake=100)
+        add_tick(lap, throttle=50, brake=20)
+        add_tick(lap)
+
+        self.assertEqual(2, lap.full_throttle_ticks)
+        self.assertEqual(1, lap.full_brake_ticks)
+        self.assertEqual(1, lap.throttle_and_brake_ticks)
+        self.assertEqual(1, lap.no_throttle_and_no_brake_ticks)
+        self.assertListEqual([0, 0, 0, 0, 1], lap.data_coasting.tolist())
+
+    def test_tires(self):
+        lap = Lap()
+        add_tick(lap)
+        add_tick(lap, tyre_temp=101)
+        # Only the rear right tyre spins
+        add_tick(lap, tyre_speeds=(100, 100, 100, 120))
+        # Standing still
+        add_tick(lap, speed=0, tyre_speeds=(0, 0, 0, 0))
+
+        self.assertEqual(1, lap.tires_overheated_ticks)
+        self.assertEqual(1, lap.tires_spinning_ticks)
+        for expected, actual in zip([4, 4, 4.2, 0], lap.data_tires):
+            self.assertAlmostEqual(expected, actual, places=5)
+
+    def test_yaw_rate(self):
+        lap = Lap()
+        for i in range(YAW_RATE_INTERVAL + 2):
+            add_tick(lap, yaw=-i / 100)
+
+        yaw_rate = lap.data_absolute_yaw_rate_per_second
+        self.assertEqual(len(lap.data_speed), len(yaw_rate))
+        self.assertTrue(all(value == 0 for value in yaw_rate[:YAW_RATE_INTERVAL]))
+        self.assertAlmostEqual((YAW_RATE_INTERVAL - 1) / 100, yaw_rate[YAW_RATE_INTERVAL], places=5)
+
+    def test_cached_until_data_points_are_added(self):
+        lap = Lap()
+        add_tick(lap, throttle=100)
+        metrics = lap.get_derived_metrics()
+        hits = lap_cache.hits
+        self.assertIs(metrics, lap.get_derived_metrics())
+        self.assertIs(lap.data_coasting, lap.data_coasting)
+        self.assertEqual(hits + 3, lap_cache.hits)
+
+        add_tick(lap, throttle=100)
+        self.assertIsNot(metrics, lap.get_derived_metrics())
+        self.assertEqual(2, lap.full_throttle_ticks)
+
+    def test_tick_being_logged_is_left_out(self):
+        lap = Lap()
+        add_tick(lap, throttle=100)
+        # The next tick is logged on another thread up to the speed
+        lap.data_ticks.append(2)
+        lap.data_throttle.append(100)
+        lap.data_braking.append(0)
+        lap.data_speed.append(100)
+
+        self.assertEqual(1, lap.full_throttle_ticks)
+        self.assertEqual(1, len(lap.data_tires))
+
+        for tyre in ["fl", "fr", "rl", "rr"]:
+            getattr(lap, "data_tyre_speed_" + tyre).append(100)
+            getattr(lap, "data_tyre_temp_" + tyre).append(80)
+        lap.data_rotation_yaw.append(0)
+        lap.data_time.append(2 / 60)
+
+        self.assertEqual(2, lap.full_throttle_ticks)
+        self.assertListEqual([4, 4], lap.data_tires.tolist())
+
+    def test_added_data_points_are_derived_incrementally(self):
+        lap = Lap()
+        for i in range(3 * YAW_RATE_INTERVAL):
+            add_tick(lap, throttle=100 if i % 3 else 0, brake=100 if i % 7 == 0 else 0, yaw=(i % 17) / 10)
+            if i % 11 == 0:
+                lap.get_derived_metrics()
+
+        metrics = lap.get_derived_metrics()
+        for key, value in derive_metrics(lap).items():
+            self.assertEqual(value, metrics[key], key)
+
+    def test_replaced_channel_is_derived_again(self):
+        lap = Lap()
+        add_tick(lap, throttle=100)
+        self.assertEqual(1, lap.full_throttle_ticks)
+
+        lap.data_throttle = [0]
+        self.assertEqual(0, lap.full_throttle_ticks)
+
+    def test_without_tyre_channels(self):
+        lap = Lap()
+        lap.data_speed.extend([100, 100])
+        self.assertEqual(0, lap.tires_spinning_ticks)
+        self.assertListEqual([0, 0], lap.data_tires.tolist())
+        self.assertListEqual([1, 1], lap.data_coasting.tolist())
+
+    def test_assigned_values_are_kept(self):
+        lap = Lap()
+        add_tick(lap, throttle=100)
+        lap.full_throttle_ticks = 500
+        lap.data_coasting = [1]
+
+        self.assertEqual(500, lap.full_throttle_ticks)
+        self.assertListEqual([1], lap.data_coasting)
+
+        del lap.full_throttle_ticks
+        self.assertEqual(1, lap.full_throttle_ticks)
+
+    def test_not_saved_with_lap(self):
+        lap = Lap()
+        add_tick(lap, throttle=100)
+        self.assertEqual(1, lap.full_throttle_ticks)
+        self.assertNotIn("full_throttle_ticks", vars(lap))
+        self.assertNotIn("data_coasting", vars(lap))
+
+    def test_laps_of_older_versions(self):
+        laps = gt7helper.load_laps_from_json("test_data/broad_bean_raceway_time_trial_4laps.json")
+        lap = laps[0]
+        self.assertIn("data_coasting", vars(lap))
+        self.assertEqual(len(lap.data_speed), len(lap.data_coasting))
+        self.assertEqual(lap.__dict__["full_throttle_ticks"], lap.full_throttle_ticks)
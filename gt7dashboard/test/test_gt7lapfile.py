@@ -0,0 +1,114 @@
+import mmap
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from gt7dashboard import gt7helper, gt7lapfile
+from gt7dashboard.gt7lap import Lap
+
+TEST_LAPS_JSON = "test_data/broad_bean_raceway_time_trial_4laps.json"
+
+
+class TestLapFile(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "laps" + gt7lapfile.LAP_FILE_EXTENSION)
+        self.test_laps = gt7helper.load_laps_from_json(TEST_LAPS_JSON)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assertLapsEqual(self, laps, other_laps):
+        self.assertEqual(len(laps), len(other_laps))
+        for lap, other_lap in zip(laps, other_laps):
+            self.assertEqual(sorted(vars(lap)), sorted(vars(other_lap)))
+            for key, value in vars(lap).items():
+                if key.startswith("data_"):
+                    np.testing.assert_array_equal(np.asarray(value), np.asarray(getattr(other_lap, key)), err_msg=key)
+                else:
+                    self.assertEqual(value, getattr(other_lap, key), key)
+
+    def test_save_and_load(self):
+        gt7lapfile.save_laps_to_lap_file(self.test_laps, self.path)
+        laps = gt7lapfile.load_laps_from_lap_file(self.path)
+
+        self.assertLapsEqual(self.test_laps, laps)
+        self.assertEqual(self.test_laps[0].data_speed.dtype, laps[0].data_speed.dtype)
+        self.assertEqual(self.test_laps[0].full_throttle_ticks, laps[0].full_throttle_ticks)
+        self.assertLess(os.path.getsize(self.path), os.path.getsize(TEST_LAPS_JSON) / 2)
+
+    def test_channels_are_memory_mapped(self):
+        gt7lapfile.save_laps_to_lap_file(self.test_laps, self.path)
+        laps = gt7lapfile.load_laps_from_lap_file(self.path)
+
+        speed = laps[0].data_speed
+        base = speed.array
+        while not isinstance(base, mmap.mmap) and base is not None:
+            base = base.base
+        self.assertIsInstance(base, mmap.mmap)
+
+        # Changes are not written to the file
+        first_speed = speed[0]
+        speed[0] = 1000
+        speed.append(10)
+        self.assertEqual(len(self.test_laps[0].data_speed) + 1, len(speed))
+        self.assertEqual(first_speed, gt7lapfile.load_laps_from_lap_file(self.path)[0].data_speed[0])
+
+    def test_overwrite_mapped_lap_file(self):
+        gt7lapfile.save_laps_to_lap_file(self.test_laps, self.path)
+        laps = gt7lapfile.load_laps_from_lap_file(self.path)
+
+        # The laps are read from the mapped file while it is saved
+        gt7lapfile.convert_lap_file(self.path, self.path)
+        gt7lapfile.save_laps_to_lap_file(laps[:2], self.path)
+
+        self.assertLapsEqual(self.test_laps, laps)
+        self.assertLapsEqual(self.test_laps[:2], gt7lapfile.load_laps_from_lap_file(self.path))
+        self.assertEqual(["laps" + gt7lapfile.LAP_FILE_EXTENSION], os.listdir(self.tmp_dir.name))
+
+    def test_save_and_load_recorded_laps(self):
+        lap = Lap()
+        lap.data_speed.extend([100.5, 120.25])
+        lap.data_gear.extend([2, 3])
+        lap.data_ticks.extend([1, 3])
+        median_lap = Lap()
+        median_lap.data_speed = [100.0, None]
+
+        gt7lapfile.save_laps_to_lap_file([lap, median_lap, Lap()], self.path)
+        laps = gt7lapfile.load_laps_from_lap_file(self.path)
+
+        self.assertListEqual([100.5, 120.25], laps[0].data_speed.tolist())
+        self.assertEqual(np.uint8, laps[0].data_gear.dtype)
+        self.assertListEqual([1, 3], laps[0].data_ticks.tolist())
+        self.assertEqual(100, laps[1].data_speed[0])
+        self.assertTrue(np.isnan(laps[1].data_speed[1]))
+        self.assertEqual(0, len(laps[2].data_speed))
+        self.assertEqual(lap.lap_start_timestamp, laps[0].lap_start_timestamp)
+
+    def test_not_a_lap_file(self):
+        with open(self.path, "wb") as f:
+            f.write(b"GT7CAP")
+        self.assertRaises(gt7lapfile.LapFileFormatError, gt7lapfile.load_laps_from_lap_file, self.path)
+
+        with open(self.path, "wb") as f:
+            f.write(gt7lapfile.LAP_FILE_HEADER.pack(gt7lapfile.LAP_FILE_MAGIC, 99, 0))
+        self.assertRaises(gt7lapfile.LapFileFormatError, gt7lapfile.load_laps_from_lap_file, self.path)
+
+    def test_convert_lap_file(self):
+        pickle_path = os.path.join(self.tmp_dir.name, "laps.laps")
+        json_path = os.path.join(self.tmp_dir.name, "laps.json")
+
+        gt7lapfile.convert_lap_file(TEST_LAPS_JSON, self.path)
+        gt7lapfile.convert_lap_file(self.path, pickle_path)
+        gt7lapfile.convert_lap_file(pickle_path, json_path)
+
+        self.assertLapsEqual(self.test_laps, gt7lapfile.load_laps_from_file(self.path))
+        self.assertLapsEqual(self.test_laps, gt7lapfile.load_laps_from_file(pickle_path))
+        self.assertLapsEqual(self.test_laps, gt7lapfile.load_laps_from_file(json_path))
+
+    def test_list_lap_files(self):
+        gt7lapfile.save_laps_to_lap_file(self.test_laps, self.path)
+        lap_files = gt7helper.list_lap_files_from_path(self.tmp_dir.name)
+        self.assertEqual([self.path], [lap_file.path for lap_file in lap_files])
@@ -0,0 +1,124 @@
+import os
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from gt7dashboard import gt7capture, gt7communication, gt7packets
+from gt7dashboard.gt7channel import DEFAULT_CHANNELS, ENGINEERING_CHANNELS, RecordedChannel
+from gt7dashboard.test.test_gt7communication import get_test_packet, get_test_lap_datagrams
+
+
+def get_test_packets(number_of_packets=200):
+    ddatas = []
+    for i in range(number_of_packets):
+        ddata = get_test_packet(
+            package_id=i + 1,
+            car_speed=i % 120,
+            throttle=(i * 7) % 256 if i % 5 else 0,
+            brake=255 if i % 11 == 0 else 0,
+            flags=0b10 if i % 50 == 49 else 0b01,
+        )
+        struct.pack_into("<f", ddata, 0x20, (i % 30) / 30)
+        struct.pack_into("<f", ddata, 0xA8, i % 13)
+        ddatas.append(ddata)
+    return ddatas
+
+
+class TestPackets(unittest.TestCase):
+    def test_packets_from_buffer_is_a_view(self):
+        ddatas = get_test_packets(10)
+        buffer = bytearray(b"".join(ddatas))
+        packets = gt7packets.packets_from_buffer(buffer)
+
+        self.assertEqual(10, len(packets))
+        self.assertListEqual(list(range(1, 11)), packets["package_id"].tolist())
+
+        struct.pack_into("<i", buffer, 0x70, 99)
+        self.assertEqual(99, packets["package_id"][0])
+
+    def test_packets_match_gt_data(self):
+        ddatas = get_test_packets(10)
+        packets = gt7packets.packets_from_list(ddatas)
+        for ddata, packet in zip(ddatas, packets):
+            data = gt7communication.GTData(ddata)
+            self.assertEqual(data.package_id, packet["package_id"])
+            self.assertEqual(data.car_id, packet["car_id"])
+            self.assertEqual(data.rpm, packet["rpm"])
+            self.assertEqual(data.current_gear, packet["gears"] & 0b00001111)
+
+    def test_split_packets_by_lap(self):
+        ddatas = get_test_packets(10)
+        for i in range(4, 10):
+            struct.pack_into("<h", ddatas[i], 0x74, 3)
+        laps = gt7packets.split_packets_by_lap(gt7packets.packets_from_list(ddatas))
+        self.assertEqual([4, 6], [len(lap) for lap in laps])
+        self.assertEqual([], gt7packets.split_packets_by_lap(gt7packets.packets_from_list([])))
+
+    def test_lap_from_packets_matches_log_data(self):
+        ddatas = get_test_packets()
+
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        # Time lost to the packets between laps, see GT7Communication._process_datagram
+        gt7comm.session.special_packet_time = 250
+        for ddata in ddatas:
+            gt7comm._log_data(gt7communication.GTData(ddata))
+        logged_lap = gt7comm.current_lap
+
+        packets = gt7packets.get_recordable_packets(gt7packets.packets_from_list(ddatas))
+        lap = gt7packets.lap_from_packets(packets, special_packet_time=gt7comm.session.special_packet_time)
+
+        self.assertEqual(len(logged_lap.data_speed), len(lap.data_speed))
+        for key, value in vars(logged_lap).items():
+            if key.startswith("data_"):
+                np.testing.assert_array_equal(value, getattr(lap, key), err_msg=key)
+            elif key != "lap_start_timestamp":
+                self.assertEqual(value, getattr(lap, key), key)
+
+        for key, value in logged_lap.get_derived_metrics().items():
+            np.testing.assert_array_equal(value, getattr(lap, key), err_msg=key)
+
+    def test_lap_from_packets_with_recorded_channels(self):
+        ddatas = get_test_packets()
+        channels = DEFAULT_CHANNELS + ENGINEERING_CHANNELS + [
+            RecordedChannel("velocity_x", "velocity_x", np.float32),
+            RecordedChannel("speed_mph", "car_speed", np.float32, lambda speed: speed / 1.609344),
+        ]
+
+        gt7comm = gt7communication.GT7Communication("127.0.0.1")
+        gt7comm.set_recorded_channels(channels)
+        for ddata in ddatas:
+            gt7comm._log_data(gt7communication.GTData(ddata))
+
+        packets = gt7packets.get_recordable_packets(gt7packets.packets_from_list(ddatas))
+        lap = gt7packets.lap_from_packets(packets, channels=channels)
+
+        for channel in channels:
+            np.testing.assert_array_equal(
+                getattr(gt7comm.current_lap, channel.attribute), getattr(lap, channel.attribute), err_msg=channel.name
+            )
+
+    def test_get_packet_values(self):
+        ddatas = get_test_packets(10)
+        packets = gt7packets.packets_from_list(ddatas)
+        for name in ["car_speed", "current_gear", "in_race", "type_speed_FL", "rpm"]:
+            self.assertListEqual(
+                [getattr(gt7communication.GTData(ddata), name) for ddata in ddatas],
+                gt7packets.get_packet_values(packets, name).tolist(),
+                name,
+            )
+        with self.assertRaises(ValueError):
+            gt7packets.get_packet_values(packets, "time_on_track")
+
+    def test_packets_from_capture(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "session.gt7cap")
+            with gt7capture.CaptureWriter(path) as writer:
+                for i, datagram in enumerate(get_test_lap_datagrams(number_of_ticks=100)):
+                    writer.write(datagram, i / 60)
+
+            packets = gt7packets.packets_from_capture(path)
+
+        self.assertEqual(101, len(packets))
+        self.assertListEqual([100, 1], [len(lap) for lap in gt7packets.split_packets_by_lap(packets)])
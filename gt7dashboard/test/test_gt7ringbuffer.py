@@ -0,0 +1,111 @@
+import threading
+import unittest
+
+from gt7dashboard.gt7ringbuffer import PacketRingBuffer
+
+
+def write(ring_buffer: PacketRingBuffer, data: bytes, timestamp: float) -> bool:
+    slot = ring_buffer.write_slot()
+    if slot is None:
+        ring_buffer.overflow()
+        return False
+    slot[:len(data)] = data
+    ring_buffer.commit(len(data), timestamp)
+    return True
+
+
+class TestPacketRingBuffer(unittest.TestCase):
+    def test_write_and_read(self):
+        ring_buffer = PacketRingBuffer(capacity=4, slot_size=16)
+        write(ring_buffer, b"first", 1.0)
+        write(ring_buffer, b"second", 2.0)
+        self.assertEqual(2, len(ring_buffer))
+
+        data, timestamp = ring_buffer.peek()
+        self.assertEqual(b"first", bytes(data))
+        self.assertEqual(1.0, timestamp)
+        ring_buffer.release()
+
+        data, timestamp = ring_buffer.peek()
+        self.assertEqual(b"second", bytes(data))
+        ring_buffer.release()
+
+        self.assertEqual(0, len(ring_buffer))
+        self.assertIsNone(ring_buffer.peek(timeout=0.01))
+
+    def test_wrap_around(self):
+        ring_buffer = PacketRingBuffer(capacity=3, slot_size=16)
+        for i in range(10):
+            write(ring_buffer, b"packet %d" % i, i)
+            data, timestamp = ring_buffer.peek()
+            self.assertEqual(b"packet %d" % i, bytes(data))
+            self.assertEqual(i, timestamp)
+            ring_buffer.release()
+
+        self.assertEqual(10, ring_buffer.received)
+        self.assertEqual(0, ring_buffer.overflows)
+
+    def test_overflow(self):
+        ring_buffer = PacketRingBuffer(capacity=2, slot_size=16)
+        self.assertTrue(write(ring_buffer, b"1", 1))
+        self.assertTrue(write(ring_buffer, b"2", 2))
+        self.assertFalse(write(ring_buffer, b"3", 3))
+
+        self.assertEqual(2, ring_buffer.received)
+        self.assertEqual(1, ring_buffer.overflows)
+
+        # The oldest packets are kept
+        data, _ = ring_buffer.peek()
+        self.assertEqual(b"1", bytes(data))
+
+    def test_peek_waits_for_writer(self):
+        ring_buffer = PacketRingBuffer(capacity=2, slot_size=16)
+        writer = threading.Timer(0.05, write, args=(ring_buffer, b"late", 1))
+        writer.start()
+
+        data, _ = ring_buffer.peek(timeout=5)
+        self.assertEqual(b"late", bytes(data))
+        writer.join()
+
+    def test_marker_discards_older_datagrams(self):
+        ring_buffer = PacketRingBuffer(capacity=4, slot_size=16)
+        write(ring_buffer, b"old 1", 1)
+        write(ring_buffer, b"old 2", 2)
+        data, _ = ring_buffer.peek()
+        self.assertEqual(b"old 1", bytes(data))
+
+        ring_buffer.commit_marker("reset", discard=True)
+        write(ring_buffer, b"new", 3)
+
+        # The datagram peeked before the marker is released as usual
+        ring_buffer.release()
+        self.assertEqual("reset", ring_buffer.peek())
+        self.assertEqual(1, ring_buffer.discarded)
+
+        data, timestamp = ring_buffer.peek()
+        self.assertEqual(b"new", bytes(data))
+        self.assertEqual(3, timestamp)
+        ring_buffer.release()
+        self.assertEqual(0, len(ring_buffer))
+
+    def test_marker_after_older_datagrams(self):
+        ring_buffer = PacketRingBuffer(capacity=4, slot_size=16)
+        write(ring_buffer, b"old", 1)
+        ring_buffer.commit_marker("lost")
+        write(ring_buffer, b"new", 2)
+
+        data, _ = ring_buffer.peek()
+        self.assertEqual(b"old", bytes(data))
+        ring_buffer.release()
+        self.assertEqual("lost", ring_buffer.peek())
+        data, _ = ring_buffer.peek()
+        self.assertEqual(b"new", bytes(data))
+        self.assertEqual(0, ring_buffer.discarded)
+
+    def test_peek_waits_for_marker(self):
+        ring_buffer = PacketRingBuffer(capacity=2, slot_size=16)
+        writer = threading.Timer(0.05, ring_buffer.commit_marker, args=("reset",))
+        writer.start()
+
+        self.assertEqual("reset", ring_buffer.peek(timeout=5))
+        writer.join()
@@ -0,0 +1,76 @@
+import unittest
+
+from gt7dashboard.gt7statistics import ConnectionStatistics, INTER_ARRIVAL_BINS_MS
+
+
+class TestConnectionStatistics(unittest.TestCase):
+    def setUp(self):
+        self.statistics = ConnectionStatistics()
+
+    def record_package_ids(self, package_ids):
+        previous_package_id = 0
+        for package_id in package_ids:
+            if self.statistics.record_package_id(package_id, previous_package_id):
+                previous_package_id = package_id
+
+    def test_record_package_id_in_order(self):
+        self.record_package_ids([10, 11, 12, 13])
+        self.assertEqual(4, self.statistics.packets_processed)
+        self.assertEqual(0, self.statistics.packets_lost)
+        self.assertEqual(0, self.statistics.get_loss_rate())
+
+    def test_record_package_id_lost(self):
+        self.record_package_ids([1, 2, 5, 6, 10])
+        self.assertEqual(5, self.statistics.packets_processed)
+        self.assertEqual(5, self.statistics.packets_lost)
+        self.assertEqual(0.5, self.statistics.get_loss_rate())
+
+    def test_record_package_id_out_of_order_and_duplicated(self):
+        self.record_package_ids([1, 3, 2, 3, 4])
+        self.assertEqual(3, self.statistics.packets_processed)
+        # 2 arrived late, but it did arrive and is not counted as lost
+        self.assertEqual(1, self.statistics.packets_lost)
+        self.assertEqual(1, self.statistics.packets_out_of_order)
+        self.assertEqual(1, self.statistics.packets_duplicated)
+
+    def test_overflows_are_not_lost(self):
+        self.record_package_ids([1, 2])
+        # 3 and 4 were dropped by the ring buffer, 6 was lost on the network
+        self.statistics.record_overflows(2)
+        self.statistics.record_package_id(5, 2)
+        self.statistics.record_package_id(7, 5)
+
+        self.assertEqual(2, self.statistics.packets_overflowed)
+        self.assertEqual(1, self.statistics.packets_lost)
+        self.assertEqual(2, self.statistics.to_dict()["packets_overflowed"])
+
+    def test_inter_arrival(self):
+        for i in range(61):
+            self.statistics.record_datagram(100 + i / 60)
+        self.statistics.record_datagram(100 + 1 + 0.1)
+
+        self.assertEqual(62, self.statistics.packets_received)
+        self.assertEqual(61, sum(self.statistics.inter_arrival_histogram))
+        self.assertEqual(60, self.statistics.inter_arrival_histogram[INTER_ARRIVAL_BINS_MS.index(18)])
+        self.assertAlmostEqual(100, self.statistics.inter_arrival_max_ms, places=3)
+        self.assertAlmostEqual(1100 / 61, self.statistics.get_inter_arrival_mean_ms(), places=3)
+        self.assertEqual(18, self.statistics.get_inter_arrival_percentile_ms(95))
+        self.assertAlmostEqual(100, self.statistics.get_inter_arrival_percentile_ms(100), places=3)
+
+    def test_heartbeat_latency(self):
+        self.statistics.record_heartbeat(10.0)
+        self.statistics.record_datagram(10.25)
+        self.assertEqual([0.25], list(self.statistics.heartbeat_latencies))
+
+        # Heartbeats while packets are flowing are not measurable
+        self.statistics.record_heartbeat(10.3)
+        self.statistics.record_datagram(10.31)
+        self.assertEqual([0.25], list(self.statistics.heartbeat_latencies))
+        self.assertEqual(2, self.statistics.heartbeats_sent)
+
+    def test_to_dict(self):
+        self.record_package_ids([1, 3])
+        statistics = self.statistics.to_dict()
+        self.assertEqual(1, statistics["packets_lost"])
+        self.assertEqual(2, statistics["packets_processed"])
+        self.assertEqual(len(INTER_ARRIVAL_BINS_MS), len(statistics["inter_arrival_histogram"]))
@@ -0,0 +1,88 @@
+import random
+import unittest
+
+from gt7dashboard.gt7window import RollingWindow, LiveIndicators, YAW_RATE_WINDOW
+
+
+class TestRollingWindow(unittest.TestCase):
+    def test_empty(self):
+        window = RollingWindow(3, track_extremes=True)
+        self.assertEqual(0, len(window))
+        self.assertEqual(0, window.get_difference())
+        self.assertEqual(0, window.get_mean())
+        self.assertEqual(0, window.get_max())
+        self.assertEqual(0, window.get_min())
+
+    def test_not_full(self):
+        window = RollingWindow(3)
+        window.append(2)
+        window.append(4)
+        self.assertFalse(window.is_full())
+        self.assertEqual(0, window.get_difference())
+        self.assertEqual(3, window.get_mean())
+        self.assertEqual(2, window.get_oldest())
+        self.assertEqual(4, window.get_newest())
+
+    def test_matches_statistics_of_last_values(self):
+        random.seed(7)
+        values = []
+        window = RollingWindow(10, track_extremes=True)
+        for _ in range(1000):
+            value = random.uniform(-100, 100)
+            values.append(value)
+            window.append(value)
+
+            last_values = values[-10:]
+            self.assertEqual(len(last_values), len(window))
+            self.assertAlmostEqual(sum(last_values) / len(last_values), window.get_mean())
+            self.assertEqual(max(last_values), window.get_max())
+            self.assertEqual(min(last_values), window.get_min())
+            if len(values) >= 10:
+                self.assertEqual(last_values[-1] - last_values[0], window.get_difference())
+
+    def test_size_one(self):
+        window = RollingWindow(1, track_extremes=True)
+        for value in [3, 1, 2]:
+            window.append(value)
+            self.assertEqual(value, window.get_max())
+            self.assertEqual(value, window.get_min())
+            self.assertEqual(0, window.get_difference())
+
+    def test_extremes_not_tracked(self):
+        window = RollingWindow(3)
+        window.append(1)
+        self.assertRaises(ValueError, window.get_max)
+        self.assertRaises(ValueError, RollingWindow, 0)
+
+    def test_clear(self):
+        window = RollingWindow(2, track_extremes=True)
+        window.append(5)
+        window.append(6)
+        window.clear()
+        self.assertEqual(0, len(window))
+        window.append(1)
+        self.assertEqual(1, window.get_max())
+
+
+class TestLiveIndicators(unittest.TestCase):
+    def test_yaw_rate(self):
+        indicators = LiveIndicators()
+        yaws = [(i % 100) / 100 for i in range(YAW_RATE_WINDOW * 3)]
+        for i, yaw in enumerate(yaws):
+            indicators.update(yaw, 100, 150)
+            if i < YAW_RATE_WINDOW - 1:
+                self.assertEqual(0, indicators.yaw_rate_per_second)
+
+        # Like data_absolute_yaw_rate_per_second of a lap
+        self.assertAlmostEqual(abs(yaws[-1] - yaws[-YAW_RATE_WINDOW]), indicators.yaw_rate_per_second)
+
+    def test_throttle_and_speed(self):
+        indicators = LiveIndicators()
+        for i in range(120):
+            indicators.update(0, min(i, 100), 100 + i)
+
+        self.assertEqual(100 - 60, indicators.throttle_application_per_second)
+        self.assertAlmostEqual(sum(min(i, 100) for i in range(60, 120)) / 60, indicators.average_throttle)
+        self.assertEqual(219, indicators.max_speed)
+        self.assertEqual(100, indicators.min_speed)
+        self.assertEqual(5, len(indicators.to_dict()))
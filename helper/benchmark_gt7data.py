@@ -0,0 +1,149 @@
+"""
+Benchmark for decoding GT7 telemetry packets.
+
+Compares the per-field struct.unpack decoder that GTData used before against the
+precompiled single-pass decoder and LazyGTData, which decodes fields on first access.
+Run from the repository root:
+
+    PYTHONPATH=. python3 helper/benchmark_gt7data.py [number_of_packets]
+"""
+import random
+import struct
+import sys
+import timeit
+from datetime import timedelta
+
+from gt7dashboard.gt7communication import GTData, LazyGTData, PACKET_FIELDS, PACKET_SIZE, decode_packet
+
+
+class LegacyGTData:
+    def __init__(self, ddata):
+        if not ddata:
+            return
+        self.package_id = struct.unpack('i', ddata[0x70:0x70 + 4])[0]
+        self.best_lap = struct.unpack('i', ddata[0x78:0x78 + 4])[0]
+        self.last_lap = struct.unpack('i', ddata[0x7C:0x7C + 4])[0]
+        self.current_lap = struct.unpack('h', ddata[0x74:0x74 + 2])[0]
+        self.current_gear = struct.unpack('B', ddata[0x90:0x90 + 1])[0] & 0b00001111
+        self.suggested_gear = struct.unpack('B', ddata[0x90:0x90 + 1])[0] >> 4
+        self.fuel_capacity = struct.unpack('f', ddata[0x48:0x48 + 4])[0]
+        self.current_fuel = struct.unpack('f', ddata[0x44:0x44 + 4])[0]
+        self.boost = struct.unpack('f', ddata[0x50:0x50 + 4])[0] - 1
+        self.tyre_diameter_FL = struct.unpack('f', ddata[0xB4:0xB4 + 4])[0]
+        self.tyre_diameter_FR = struct.unpack('f', ddata[0xB8:0xB8 + 4])[0]
+        self.tyre_diameter_RL = struct.unpack('f', ddata[0xBC:0xBC + 4])[0]
+        self.tyre_diameter_RR = struct.unpack('f', ddata[0xC0:0xC0 + 4])[0]
+        self.type_speed_FL = abs(3.6 * self.tyre_diameter_FL * struct.unpack('f', ddata[0xA4:0xA4 + 4])[0])
+        self.type_speed_FR = abs(3.6 * self.tyre_diameter_FR * struct.unpack('f', ddata[0xA8:0xA8 + 4])[0])
+        self.type_speed_RL = abs(3.6 * self.tyre_diameter_RL * struct.unpack('f', ddata[0xAC:0xAC + 4])[0])
+        self.tyre_speed_RR = abs(3.6 * self.tyre_diameter_RR * struct.unpack('f', ddata[0xB0:0xB0 + 4])[0])
+        self.car_speed = 3.6 * struct.unpack('f', ddata[0x4C:0x4C + 4])[0]
+        if self.car_speed > 0:
+            self.tyre_slip_ratio_FL = '{:6.2f}'.format(self.type_speed_FL / self.car_speed)
+            self.tyre_slip_ratio_FR = '{:6.2f}'.format(self.type_speed_FR / self.car_speed)
+            self.tyre_slip_ratio_RL = '{:6.2f}'.format(self.type_speed_RL / self.car_speed)
+            self.tyre_slip_ratio_RR = '{:6.2f}'.format(self.tyre_speed_RR / self.car_speed)
+        self.time_on_track = timedelta(
+            seconds=round(struct.unpack('i', ddata[0x80:0x80 + 4])[0] / 1000))
+        self.total_laps = struct.unpack('h', ddata[0x76:0x76 + 2])[0]
+        self.current_position = struct.unpack('h', ddata[0x84:0x84 + 2])[0]
+        self.total_positions = struct.unpack('h', ddata[0x86:0x86 + 2])[0]
+        self.car_id = struct.unpack('i', ddata[0x124:0x124 + 4])[0]
+        self.throttle = struct.unpack('B', ddata[0x91:0x91 + 1])[0] / 2.55
+        self.rpm = struct.unpack('f', ddata[0x3C:0x3C + 4])[0]
+        self.rpm_rev_warning = struct.unpack('H', ddata[0x88:0x88 + 2])[0]
+        self.brake = struct.unpack('B', ddata[0x92:0x92 + 1])[0] / 2.55
+        self.boost = struct.unpack('f', ddata[0x50:0x50 + 4])[0] - 1
+        self.rpm_rev_limiter = struct.unpack('H', ddata[0x8A:0x8A + 2])[0]
+        self.estimated_top_speed = struct.unpack('h', ddata[0x8C:0x8C + 2])[0]
+        self.clutch = struct.unpack('f', ddata[0xF4:0xF4 + 4])[0]
+        self.clutch_engaged = struct.unpack('f', ddata[0xF8:0xF8 + 4])[0]
+        self.rpm_after_clutch = struct.unpack('f', ddata[0xFC:0xFC + 4])[0]
+        self.oil_temp = struct.unpack('f', ddata[0x5C:0x5C + 4])[0]
+        self.water_temp = struct.unpack('f', ddata[0x58:0x58 + 4])[0]
+        self.oil_pressure = struct.unpack('f', ddata[0x54:0x54 + 4])[0]
+        self.ride_height = 1000 * struct.unpack('f', ddata[0x38:0x38 + 4])[0]
+        self.tyre_temp_FL = struct.unpack('f', ddata[0x60:0x60 + 4])[0]
+        self.tyre_temp_FR = struct.unpack('f', ddata[0x64:0x64 + 4])[0]
+        self.suspension_fl = struct.unpack('f', ddata[0xC4:0xC4 + 4])[0]
+        self.suspension_fr = struct.unpack('f', ddata[0xC8:0xC8 + 4])[0]
+        self.tyre_temp_rl = struct.unpack('f', ddata[0x68:0x68 + 4])[0]
+        self.tyre_temp_rr = struct.unpack('f', ddata[0x6C:0x6C + 4])[0]
+        self.suspension_rl = struct.unpack('f', ddata[0xCC:0xCC + 4])[0]
+        self.suspension_rr = struct.unpack('f', ddata[0xD0:0xD0 + 4])[0]
+        self.gear_1 = struct.unpack('f', ddata[0x104:0x104 + 4])[0]
+        self.gear_2 = struct.unpack('f', ddata[0x108:0x108 + 4])[0]
+        self.gear_3 = struct.unpack('f', ddata[0x10C:0x10C + 4])[0]
+        self.gear_4 = struct.unpack('f', ddata[0x110:0x110 + 4])[0]
+        self.gear_5 = struct.unpack('f', ddata[0x114:0x114 + 4])[0]
+        self.gear_6 = struct.unpack('f', ddata[0x118:0x118 + 4])[0]
+        self.gear_7 = struct.unpack('f', ddata[0x11C:0x11C + 4])[0]
+        self.gear_8 = struct.unpack('f', ddata[0x120:0x120 + 4])[0]
+        self.position_x = struct.unpack('f', ddata[0x04:0x04 + 4])[0]
+        self.position_y = struct.unpack('f', ddata[0x08:0x08 + 4])[0]
+        self.position_z = struct.unpack('f', ddata[0x0C:0x0C + 4])[0]
+        self.velocity_x = struct.unpack('f', ddata[0x10:0x10 + 4])[0]
+        self.velocity_y = struct.unpack('f', ddata[0x14:0x14 + 4])[0]
+        self.velocity_z = struct.unpack('f', ddata[0x18:0x18 + 4])[0]
+        self.rotation_pitch = struct.unpack('f', ddata[0x1C:0x1C + 4])[0]
+        self.rotation_yaw = struct.unpack('f', ddata[0x20:0x20 + 4])[0]
+        self.rotation_roll = struct.unpack('f', ddata[0x24:0x24 + 4])[0]
+        self.angular_velocity_x = struct.unpack('f', ddata[0x2C:0x2C + 4])[0]
+        self.angular_velocity_y = struct.unpack('f', ddata[0x30:0x30 + 4])[0]
+        self.angular_velocity_z = struct.unpack('f', ddata[0x34:0x34 + 4])[0]
+        self.is_paused = bin(struct.unpack('B', ddata[0x8E:0x8E + 1])[0])[-2] == '1'
+        self.in_race = bin(struct.unpack('B', ddata[0x8E:0x8E + 1])[0])[-1] == '1'
+
+
+def generate_packet_corpus(number_of_packets: int, seed: int = 7) -> list:
+    """Generates decrypted packets with random but plausible values for every known field"""
+    rnd = random.Random(seed)
+    corpus = []
+    for package_id in range(number_of_packets):
+        ddata = bytearray(PACKET_SIZE)
+        struct.pack_into("<i", ddata, 0, 0x47375330)
+        for name, offset, field_format in PACKET_FIELDS:
+            if field_format == "f":
+                value = rnd.uniform(-100, 400)
+            elif field_format in "bB":
+                value = rnd.randint(0, 255)
+            elif field_format in "hH":
+                value = rnd.randint(0, 100)
+            else:
+                value = rnd.randint(0, 100000)
+            struct.pack_into("<" + field_format, ddata, offset, value)
+        struct.pack_into("<i", ddata, 0x70, package_id + 1)
+        corpus.append(bytes(ddata))
+    return corpus
+
+
+def read_status_fields(ddata):
+    """Reads the fields a consumer reads that is not recording, e.g. in menus"""
+    data = LazyGTData(ddata)
+    return data.in_race, data.is_paused, data.package_id, data.current_lap, data.car_speed, data.current_fuel
+
+
+def benchmark(name, decoder, corpus, repeat=5):
+    timings = timeit.repeat(lambda: [decoder(ddata) for ddata in corpus], number=1, repeat=repeat)
+    best = min(timings)
+    print("%-20s %8.2f ms per %d packets, %6.2f us per packet" % (
+        name, best * 1000, len(corpus), best / len(corpus) * 1000000))
+    return best
+
+
+if __name__ == '__main__':
+    number_of_packets = int(sys.argv[1]) if len(sys.argv) > 1 else 60 * 60 * 2
+    corpus = generate_packet_corpus(number_of_packets)
+
+    # Both paths have to agree before comparing their speed
+    for ddata in corpus[:100]:
+        assert vars(LegacyGTData(ddata)) == vars(GTData(ddata)) == LazyGTData(ddata).to_dict()
+
+    legacy = benchmark("LegacyGTData", LegacyGTData, corpus)
+    record = benchmark("decode_packet", decode_packet, corpus)
+    current = benchmark("GTData", GTData, corpus)
+    lazy = benchmark("LazyGTData status", read_status_fields, corpus)
+
+    print("GTData is %.1fx faster than LegacyGTData, raw decode_packet is %.1fx faster" % (
+        legacy / current, legacy / record))
+    print("Reading status fields with LazyGTData is %.1fx faster than GTData" % (current / lazy))
@@ -0,0 +1,83 @@
+"""
+Benchmark for comparing laps by distance.
+
+Compares the pandas path that calculate_time_diff_by_distance used before, which resamples both laps
+to 10 ms and joins them on distance, against the numpy interpolation on a common distance grid.
+Run from the repository root:
+
+    PYTHONPATH=. python3 helper/benchmark_time_diff.py [lap_file]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from gt7dashboard import gt7helper
+from gt7dashboard.gt7cache import lap_cache
+from gt7dashboard.gt7delta import LiveTimeDelta
+from gt7dashboard.gt7lap import Lap
+
+DEFAULT_LAP_FILE = "test_data/broad_bean_raceway_time_trial_4laps.json"
+
+
+def legacy_time_delta_dataframe_for_lap(lap: Lap, name: str) -> DataFrame:
+    lap_distance = gt7helper.get_x_axis_for_distance(lap)
+    lap_time_ms = [gt7helper.convert_seconds_to_milliseconds(item) for item in lap.data_time]
+    series = pd.Series(lap_distance, index=pd.to_timedelta(lap_time_ms, unit="ms"))
+    interpolated_upsample = series.resample("10ms").asfreq().interpolate()
+    inverted = pd.Series(interpolated_upsample.index.values, index=interpolated_upsample)
+    return DataFrame(data=pd.Series(inverted.values.astype("int64"), name=name, index=inverted.index))
+
+
+def legacy_calculate_time_diff_by_distance(reference_lap: Lap, comparison_lap: Lap) -> DataFrame:
+    df1 = legacy_time_delta_dataframe_for_lap(reference_lap, "reference")
+    df2 = legacy_time_delta_dataframe_for_lap(comparison_lap, "comparison")
+    df = df1.join(df2, how="outer").sort_index().interpolate()
+    df.reset_index(inplace=True)
+    df = df.rename(columns={"index": "distance"})
+    df["reference"] = pd.to_timedelta(df["reference"])
+    df["comparison"] = pd.to_timedelta(df["comparison"])
+    df["timedelta"] = df["comparison"] - df["reference"]
+    return df
+
+
+def benchmark(name, function, repeat=5, number=10):
+    # Distance axes are cached, so clearing it makes every run compute them like a changed lap
+    best = min(timeit.repeat(lambda: lap_cache.clear() or function(), number=number, repeat=repeat)) / number
+    print("%-40s %8.2f ms" % (name, best * 1000))
+    return best
+
+
+if __name__ == '__main__':
+    laps = gt7helper.load_laps_from_json(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_LAP_FILE)
+    reference_lap, comparison_lap = laps[0], laps[1]
+
+    legacy_df = legacy_calculate_time_diff_by_distance(reference_lap, comparison_lap)
+    time_diff = gt7helper.get_time_diff_by_distance(reference_lap, comparison_lap)
+
+    # The numpy path has to be right before comparing its speed. The legacy path is no reference, resampling with
+    # asfreq() only keeps data points exactly on the 10 ms grid, so most of its distances are interpolated.
+    # The time diff at every data point of the comparison lap is looked up with a binary search instead.
+    live_time_delta = LiveTimeDelta()
+    live_time_delta.set_reference_lap(reference_lap)
+    comparison_distance = gt7helper.get_x_axis_for_distance(comparison_lap)
+    deviations = []
+    for distance, time in zip(comparison_distance, comparison_lap.data_time):
+        reference_time = live_time_delta.get_reference_time(distance)
+        if reference_time is not None:
+            expected = (time - reference_time) * 1000
+            deviations.append(abs(expected - np.interp(distance, time_diff["distance"], time_diff["timedelta"])))
+    deviation = max(deviations)
+    assert deviation < 5, "time diffs deviate by %.1f ms" % deviation
+    print("%d rows with pandas, %d rows with numpy, max. deviation %.2f ms" % (
+        len(legacy_df), len(time_diff["distance"]), deviation))
+
+    legacy = benchmark("pandas resample and join", lambda: legacy_calculate_time_diff_by_distance(reference_lap, comparison_lap))
+    current = benchmark("get_time_diff_by_distance", lambda: gt7helper.get_time_diff_by_distance(reference_lap, comparison_lap))
+    batch = benchmark("get_time_diffs_by_distance, %d laps" % len(laps), lambda: gt7helper.get_time_diffs_by_distance(reference_lap, laps))
+    legacy_batch = benchmark("pandas, %d laps" % len(laps), lambda: [legacy_calculate_time_diff_by_distance(reference_lap, lap) for lap in laps])
+
+    print("numpy is %.1fx faster for two laps and %.1fx faster for %d laps" % (
+        legacy / current, legacy_batch / batch, len(laps)))
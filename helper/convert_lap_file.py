@@ -0,0 +1,18 @@
+"""
+Converts lap files between the binary lap file format (.gt7laps), JSON (.json) and pickle (.laps).
+The formats are chosen by the file extensions. Run from the repository root:
+
+    PYTHONPATH=. python3 helper/convert_lap_file.py <source> <destination>
+"""
+import sys
+
+from gt7dashboard import gt7lapfile
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: %s <source> <destination>" % sys.argv[0])
+        sys.exit(1)
+
+    source_path, destination_path = sys.argv[1], sys.argv[2]
+    gt7lapfile.convert_lap_file(source_path, destination_path)
+    print("Converted %s to %s" % (source_path, destination_path))
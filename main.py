@@ -1,8 +1,11 @@
+import atexit
+import concurrent.futures
 import copy
 import itertools
 import logging
 import os
 import time
+from functools import partial
 from typing import List
 
 import bokeh.application
@@ -15,28 +18,28 @@ from bokeh.models import (
     TableColumn,
     DataTable,
     Button,
-    Div, CheckboxGroup, TabPanel, Tabs,
+    Div, CheckboxGroup, TabPanel, Tabs, TextInput,
 )
 from bokeh.palettes import Plasma11 as palette
 from bokeh.plotting import curdoc
 from bokeh.plotting import figure
 
-from gt7dashboard import gt7communication, gt7diagrams, gt7help, gt7helper, gt7lap
+from gt7dashboard import gt7catalog, gt7channel, gt7communication, gt7delta, gt7diagrams, gt7help, gt7helper, gt7journal, gt7lap, gt7lapfile
 from gt7dashboard.gt7diagrams import get_speed_peak_and_valley_diagram
 
 from gt7dashboard.gt7help import get_help_div
-from gt7dashboard.gt7helper import (
-    load_laps_from_pickle,
-    save_laps_to_pickle,
-    list_lap_files_from_path,
-    calculate_time_diff_by_distance, save_laps_to_json, load_laps_from_json,
-)
 from gt7dashboard.gt7lap import Lap
 
 # set logging level to debug
 logger = logging.getLogger('main.py')
 logger.setLevel(logging.DEBUG)
 
+# Newest lap files shown in the "Load Laps" select, older ones are found with the search
+MAX_LAP_FILES_IN_SELECT = 200
+
+# Lap files are saved and loaded by these threads, so no session waits for the file I/O
+LAP_FILE_WORKERS = 2
+
 
 def update_connection_info():
     div_connection_info.text = ""
@@ -46,6 +49,52 @@ def update_connection_info():
         div_connection_info.text += "<p title='Disconnected'>🔴</p>"
 
 
+def update_connection_statistics():
+    statistics = app.gt7comm.get_statistics()
+    div_connection_statistics.text = """<h4>Connection</h4>
+    <p>Received: <b>%d</b> Lost: <b>%d</b> (%.1f%%)</p>
+    <p>Dropped by this host: <b>%d</b> overflowed, <b>%d</b> discarded</p>
+    <p>Out of Order: <b>%d</b> Duplicated: <b>%d</b> Undecryptable: <b>%d</b></p>
+    <p>Jitter: <b>%.1f</b> ms mean, <b>%.0f</b> ms p95, <b>%.0f</b> ms max</p>""" % (
+        statistics.packets_received,
+        statistics.packets_lost,
+        statistics.get_loss_rate() * 100,
+        statistics.packets_overflowed,
+        app.gt7comm.get_ingest_counters()["discarded"],
+        statistics.packets_out_of_order,
+        statistics.packets_duplicated,
+        statistics.decrypt_failures,
+        statistics.get_inter_arrival_mean_ms(),
+        statistics.get_inter_arrival_percentile_ms(95),
+        statistics.inter_arrival_max_ms,
+    )
+
+
+def update_live_lap():
+    live_lap_stream.update(app.gt7comm.current_lap)
+
+
+def update_live_time_delta_div():
+    delta_ms = app.live_time_delta.delta_ms
+    if delta_ms is None:
+        div_live_time_delta.text = "<p title='Time difference to the reference lap'><b>Δ --</b></p>"
+        return
+    color = "red" if delta_ms > 0 else "green"
+    div_live_time_delta.text = f"<p title='Time difference to the reference lap'>" \
+                               f"<b style='color:{color}'>Δ {delta_ms / 1000:+.3f}s</b></p>"
+
+
+def update_live_indicators():
+    indicators = app.gt7comm.live_indicators
+    div_live_indicators.text = "<p>Yaw Rate: %.2f/s<br>Throttle: %+.0f%%/s (avg. %.0f%%)<br>Speed 5s: %.0f - %.0f</p>" % (
+        indicators.yaw_rate_per_second,
+        indicators.throttle_application_per_second,
+        indicators.average_throttle,
+        indicators.min_speed,
+        indicators.max_speed,
+    )
+
+
 def update_reference_lap_select(laps):
     reference_lap_select.options = [
         tuple(("-1", "Best Lap"))
@@ -118,6 +167,7 @@ def update_lap_change():
     global g_connection_status_stored
     global g_telemetry_update_needed
     global g_reference_lap_selected
+    global g_live_time_delta_reference_lap
 
     update_start_time = time.time()
 
@@ -152,6 +202,11 @@ def update_lap_change():
 
         update_header_line(div_header_line, last_lap, reference_lap)
 
+    # The live time delta is shared, it follows the session which changed its reference lap last
+    if reference_lap is not g_live_time_delta_reference_lap:
+        app.live_time_delta.set_reference_lap(reference_lap)
+        g_live_time_delta_reference_lap = reference_lap
+
     logger.debug("Updating of %d laps" % len(laps))
 
     start_time = time.time()
@@ -188,7 +243,7 @@ def update_speed_velocity_graph(laps: List[Lap]):
 
         if reference_lap and len(reference_lap.data_speed) > 0:
             reference_lap_data = reference_lap.get_data_dict()
-            race_diagram.source_time_diff.data = calculate_time_diff_by_distance(reference_lap, last_lap)
+            race_diagram.source_time_diff.data = gt7helper.get_time_diff_by_distance(reference_lap, last_lap)
             race_diagram.source_reference_lap.data = reference_lap_data
             reference_lap_race_line.data_source.data = reference_lap_data
 
@@ -245,7 +300,11 @@ def reset_button_handler(event):
     race_diagram.delete_all_additional_laps()
 
     app.gt7comm.load_laps([], replace_other_laps=True)
-    app.gt7comm.reset()
+    lap_file_path = app.gt7comm.reset()
+    if lap_file_path:
+        logger.info("Saved the laps of the session journal as %s" % lap_file_path)
+        app.lap_catalog.add_lap_file(lap_file_path)
+        update_lap_file_select(search_lap_files_input.value)
     g_telemetry_update_needed = True
 
 
@@ -263,16 +322,94 @@ def log_lap_button_handler(event):
     logger.info("Added a lap manually to the list of laps: %s" % app.gt7comm.laps[0])
 
 
+def set_lap_file_status(text: str):
+    div_lap_file_status.text = "<p>%s</p>" % text
+
+
+def run_lap_file_task(function, on_done, *args):
+    """
+    Runs function with args in the lap file pool and calls on_done with its future
+    in the next tick of the document of this session.
+    """
+    doc = curdoc()
+    future = app.lap_file_executor.submit(function, *args)
+    future.add_done_callback(lambda f: doc.add_next_tick_callback(partial(on_done, f)))
+
+
+def save_and_index_laps(laps: List[Lap]) -> str:
+    path = gt7lapfile.save_laps_to_binary(laps)
+    app.lap_catalog.add_lap_file(path, laps)
+    return path
+
+
 def save_button_handler(event):
     if len(app.gt7comm.laps) > 0:
-        path = save_laps_to_json(app.gt7comm.laps)
-        logger.info("Saved %d laps as %s" % (len(app.gt7comm.laps), path))
+        laps = list(app.gt7comm.laps)
+        save_button.disabled = True
+        set_lap_file_status("Saving %d laps ..." % len(laps))
+        run_lap_file_task(save_and_index_laps, partial(save_laps_done, len(laps)), laps)
+
+
+def save_laps_done(number_of_laps: int, future: concurrent.futures.Future):
+    save_button.disabled = False
+    try:
+        path = future.result()
+    except Exception as e:
+        logger.error("Could not save laps: %s" % e)
+        set_lap_file_status("Could not save laps: %s" % e)
+        return
+    logger.info("Saved %d laps as %s" % (number_of_laps, path))
+    set_lap_file_status("Saved %d laps" % number_of_laps)
+    update_lap_file_select(search_lap_files_input.value)
+
+
+def update_lap_file_select(search: str):
+    select.options = gt7helper.bokeh_tuple_for_list_of_lapfiles(
+        app.lap_catalog.get_lap_files(search=search, limit=MAX_LAP_FILES_IN_SELECT)
+    )
+
+
+def refresh_lap_files_button_handler(event):
+    # Indexes lap files added to the data folder since the server started, e.g. copied from another computer
+    refresh_lap_files_button.disabled = True
+    set_lap_file_status("Indexing lap files ...")
+    run_lap_file_task(app.lap_catalog.update, refresh_lap_files_done)
+
+
+def refresh_lap_files_done(future: concurrent.futures.Future):
+    refresh_lap_files_button.disabled = False
+    try:
+        number_of_read_files = future.result()
+    except Exception as e:
+        logger.error("Could not index lap files: %s" % e)
+        set_lap_file_status("Could not index lap files: %s" % e)
+        return
+    set_lap_file_status("Indexed %d new or changed lap files" % number_of_read_files)
+    update_lap_file_select(search_lap_files_input.value)
+
+
+def search_lap_files_handler(attr, old, new):
+    update_lap_file_select(new)
 
 
 def load_laps_handler(attr, old, new):
     logger.info("Loading %s" % new)
+    select.disabled = True
+    set_lap_file_status("Loading %s ..." % os.path.basename(new))
+    run_lap_file_task(gt7lapfile.load_laps_from_file, partial(load_laps_done, new), new)
+
+
+def load_laps_done(path: str, future: concurrent.futures.Future):
+    select.disabled = False
+    try:
+        laps = future.result()
+    except Exception as e:
+        logger.error("Could not load %s: %s" % (path, e))
+        set_lap_file_status("Could not load %s: %s" % (os.path.basename(path), e))
+        return
+    set_lap_file_status("Loaded %d laps" % len(laps))
     race_diagram.delete_all_additional_laps()
-    app.gt7comm.load_laps(load_laps_from_json(new), replace_other_laps=True)
+    app.gt7comm.load_laps(laps, replace_other_laps=True)
 
 
 def load_reference_lap_handler(attr, old, new):
@@ -337,12 +474,44 @@ if not hasattr(app, "gt7comm"):
 
     app.gt7comm = gt7communication.GT7Communication(playstation_ip)
 
+    if os.environ.get("GT7_RECORD_ENGINEERING_CHANNELS") == "true":
+        logger.info("Recording engineering channels")
+        app.gt7comm.set_recorded_channels(gt7channel.ENGINEERING_CHANNELS)
+
+    capture_path = os.environ.get("GT7_CAPTURE_PATH")
+    if capture_path:
+        logger.info(f"Recording all received packets to {capture_path}")
+        app.gt7comm.start_capture(capture_path)
+        # Writes the buffered end of the capture
+        atexit.register(app.gt7comm.stop_capture)
+
+    replay_path = os.environ.get("GT7_REPLAY_PATH")
+    if replay_path:
+        app.gt7comm.replay_path = replay_path
+        app.gt7comm.replay_speed = float(os.environ.get("GT7_REPLAY_SPEED", "1"))
+        logger.info(f"Replaying packets from {replay_path} at speed {app.gt7comm.replay_speed}")
+
     if load_laps_path:
         app.gt7comm.load_laps(
-            load_laps_from_pickle(load_laps_path), replace_other_laps=True
+            gt7lapfile.load_laps_from_file(load_laps_path), replace_other_laps=True
         )
 
-    app.gt7comm.start()
+    # Finished laps are appended to a session journal, it is compacted into a lap file when the server stops.
+    # Journals left by a crash are compacted on the next start and the laps of the last one are loaded again.
+    journal_folder = os.environ.get("GT7_JOURNAL_PATH", os.path.join(os.getcwd(), "data", "journal"))
+    restored_laps = gt7journal.restore_journals(journal_folder)
+    if restored_laps and not load_laps_path:
+        logger.info(f"Restored {len(restored_laps)} laps of the last session")
+        app.gt7comm.load_laps(restored_laps, replace_other_laps=True)
+    app.gt7comm.start_journal(gt7journal.get_journal_path(journal_folder))
+    atexit.register(app.gt7comm.stop_journal)
+
+    if os.environ.get("GT7_ASYNC_INGEST") == "true":
+        # Receive packets on the event loop of the Bokeh server instead of an own thread
+        logger.info("Receiving packets on the Bokeh event loop")
+        app.gt7comm.start_async()
+    else:
+        app.gt7comm.start()
 else:
     # Reuse existing thread
     if not app.gt7comm.is_connected():
@@ -363,11 +532,28 @@ g_laps_stored = []
 g_session_stored = None
 g_connection_status_stored = None
 g_reference_lap_selected = None
+g_live_time_delta_reference_lap = None
 g_stored_fuel_map = None
 g_telemetry_update_needed = False
 
+# Share the lap catalog between sessions, lap files are only read when the server starts, laps are saved or lap files are refreshed
+if not hasattr(app, "lap_file_executor"):
+    app.lap_file_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=LAP_FILE_WORKERS, thread_name_prefix="lap_files"
+    )
+
+# Share the live time delta between sessions, so it is computed once for every tick
+if not hasattr(app, "live_time_delta"):
+    app.live_time_delta = gt7delta.LiveTimeDelta()
+    # Runs on the thread receiving the packets
+    app.gt7comm.subscribe(lambda data: app.live_time_delta.update(app.gt7comm.current_lap))
+
+if not hasattr(app, "lap_catalog"):
+    app.lap_catalog = gt7catalog.LapCatalog(os.path.join(os.getcwd(), "data"))
+    logger.info("Indexed %d new or changed lap files" % app.lap_catalog.update())
+
 stored_lap_files = gt7helper.bokeh_tuple_for_list_of_lapfiles(
-    list_lap_files_from_path(os.path.join(os.getcwd(), "data"))
+    app.lap_catalog.get_lap_files(limit=MAX_LAP_FILES_IN_SELECT)
 )
 
 race_diagram = gt7diagrams.RaceDiagram(width=1000)
@@ -441,11 +627,27 @@ reference_lap_race_line = s_race_line.line(
     color="magenta",
     source=ColumnDataSource(data={"raceline_x": [], "raceline_z": []})
 )
+live_lap_race_line = s_race_line.line(
+    x="raceline_x",
+    y="raceline_z",
+    legend_label="Live Lap",
+    line_width=1,
+    color="darkorange",
+    source=race_diagram.source_live_lap
+)
+
+live_lap_stream = gt7diagrams.LiveLapStream(race_diagram.source_live_lap)
 
 select_title = Paragraph(text="Load Laps:", align="center")
 select = Select(value="laps", options=stored_lap_files)
 select.on_change("value", load_laps_handler)
 
+search_lap_files_input = TextInput(placeholder="Search car, file or track")
+search_lap_files_input.on_change("value", search_lap_files_handler)
+
+refresh_lap_files_button = Button(label="Refresh Lap Files")
+refresh_lap_files_button.on_click(refresh_lap_files_button_handler)
+
 reference_lap_select = Select(value="laps")
 reference_lap_select.on_change("value", load_reference_lap_handler)
 
@@ -459,12 +661,16 @@ reset_button = Button(label="Reset Laps")
 reset_button.on_click(reset_button_handler)
 
 div_tuning_info = Div(width=200, height=100)
+div_connection_statistics = Div(width=250, height=120)
 
 # div_last_lap = Div(width=200, height=125)
 # div_reference_lap = Div(width=200, height=125)
 div_speed_peak_valley_diagram = Div(width=200, height=125)
 div_gt7_dashboard = Div(width=120, height=30)
 div_header_line = Div(width=400, height=30)
+div_live_time_delta = Div(width=100, height=30)
+div_lap_file_status = Div(width=150, height=30)
+div_live_indicators = Div(width=200, height=60)
 div_connection_info = Div(width=30, height=30)
 div_deviance_laps_on_display = Div(width=200, height=race_diagram.f_speed_variance.height)
 
@@ -481,8 +687,8 @@ race_time_table.t_lap_times.width=900
 
 l1 = layout(
     children=[
-        [get_help_div(gt7help.HEADER), div_connection_info, div_gt7_dashboard, div_header_line, reset_button, save_button, select_title, select, get_help_div(gt7help.LAP_CONTROLS)],
-        [get_help_div(gt7help.TIME_DIFF), race_diagram.f_time_diff, layout(children=[manual_log_button, checkbox_group, reference_lap_select]), get_help_div(gt7help.MANUAL_CONTROLS)],
+        [get_help_div(gt7help.HEADER), div_connection_info, div_gt7_dashboard, div_header_line, div_live_time_delta, reset_button, save_button, select_title, select, search_lap_files_input, refresh_lap_files_button, div_lap_file_status, get_help_div(gt7help.LAP_CONTROLS)],
+        [get_help_div(gt7help.TIME_DIFF), race_diagram.f_time_diff, layout(children=[manual_log_button, checkbox_group, reference_lap_select, div_live_indicators]), get_help_div(gt7help.MANUAL_CONTROLS)],
         [get_help_div(gt7help.SPEED_DIAGRAM), race_diagram.f_speed, s_race_line, get_help_div(gt7help.RACE_LINE_MINI)],
         [get_help_div(gt7help.SPEED_VARIANCE), race_diagram.f_speed_variance, div_deviance_laps_on_display, get_help_div(gt7help.SPEED_VARIANCE)],
         [get_help_div(gt7help.THROTTLE_DIAGRAM), race_diagram.f_throttle, div_speed_peak_valley_diagram, get_help_div(gt7help.SPEED_PEAKS_AND_VALLEYS)],
@@ -493,7 +699,7 @@ l1 = layout(
         [get_help_div(gt7help.RPM_DIAGRAM), race_diagram.f_rpm],
         [get_help_div(gt7help.BOOST_DIAGRAM), race_diagram.f_boost],
         [get_help_div(gt7help.TIRE_DIAGRAM), race_diagram.f_tires],
-        [get_help_div(gt7help.TIME_TABLE), race_time_table.t_lap_times, get_help_div(gt7help.FUEL_MAP), div_fuel_map, get_help_div(gt7help.TUNING_INFO), div_tuning_info],
+        [get_help_div(gt7help.TIME_TABLE), race_time_table.t_lap_times, get_help_div(gt7help.FUEL_MAP), div_fuel_map, get_help_div(gt7help.TUNING_INFO), div_tuning_info, get_help_div(gt7help.CONNECTION_STATISTICS), div_connection_statistics],
     ]
 )
 
@@ -522,3 +728,13 @@ curdoc().title = "GT7 Dashboard"
 # This will only trigger once per lap, but we check every second if anything happened
 curdoc().add_periodic_callback(update_lap_change, 1000)
 curdoc().add_periodic_callback(update_fuel_map, 5000)
+curdoc().add_periodic_callback(update_connection_statistics, 1000)
+
+# Streams the lap in progress, rate is in updates per second
+live_lap_rate = float(os.environ.get("GT7_LIVE_LAP_RATE", "10"))
+if live_lap_rate > 0:
+    curdoc().add_periodic_callback(update_live_lap, int(1000 / live_lap_rate))
+
+# The delta is computed for every tick, but only displayed 10 times per second
+curdoc().add_periodic_callback(update_live_time_delta_div, 100)
+curdoc().add_periodic_callback(update_live_indicators, 250)